@@ -2,10 +2,14 @@
 import customtkinter as ctk
 import pyautogui as pag
 import threading
-import time
 from typing import Callable
 
-from utils import KEY_LIST, flush_modifiers, busy_wait
+from utils import KEY_LIST
+import calibration
+import keymap
+import scheduler
+
+RECENT_KEYS = 10
 
 class ActionPanel(ctk.CTkFrame):
     """
@@ -18,6 +22,7 @@ class ActionPanel(ctk.CTkFrame):
         self.stop_flag_ref = stop_flag_ref  # lambda: bool
         self.use_follow_mouse = True
         self.selected_key = "enter"
+        self.recent_keys = []
 
         # UI
         ctk.CTkLabel(self, text="アクションを選んでください").pack(padx=20, pady=(20, 6))
@@ -58,6 +63,9 @@ class ActionPanel(ctk.CTkFrame):
         self.entry_repeat_count = ctk.CTkEntry(self.frame_repeat); self.entry_repeat_count.insert(0, "1"); self.entry_repeat_count.pack(padx=10, pady=(0,10))
         ctk.CTkLabel(self.frame_repeat, text="間隔（秒・0.001〜OK）").pack(padx=10, pady=(8,6))
         self.entry_repeat_interval = ctk.CTkEntry(self.frame_repeat); self.entry_repeat_interval.insert(0, "0.005"); self.entry_repeat_interval.pack(padx=10, pady=(0,10))
+        ctk.CTkLabel(self.frame_repeat, text="間隔に遅れたとき").pack(padx=10, pady=(8,6))
+        self.policy_option = ctk.CTkOptionMenu(self.frame_repeat, values=list(scheduler.OVERRUN_POLICIES))
+        self.policy_option.set(scheduler.DEFAULT_POLICY); self.policy_option.pack(padx=10, pady=(0,10))
         self.frame_repeat.pack(padx=20, pady=(10,10))
 
         # 長押し設定
@@ -66,31 +74,46 @@ class ActionPanel(ctk.CTkFrame):
         self.entry_seconds = ctk.CTkEntry(self.frame_long); self.entry_seconds.insert(0, "2"); self.entry_seconds.pack(padx=10, pady=(0,10))
         self.frame_long.pack_forget()
 
-        # キー選択（キー入力時のみ表示）
+        # キー選択（キー入力時のみ表示。KEY_LIST のコンボは初めて表示するときに作る）
+        self.frame_key = None
+
+        # 実行ボタン
+        self.btn_start = ctk.CTkButton(self, text="Start (⌘+Shift: mac / Alt+Shift: Win)", command=self.on_start)
+        self.btn_start.pack(padx=20, pady=(10,10))
+        ctk.CTkLabel(self, text="※実行中は ESC でキャンセルできます", text_color="gray").pack(padx=20, pady=(0,10))
+
+        # 送出コスト（ホストごとのキャッシュを表示するだけ。計測はキー・マウスを送るので「再計測」を押したときだけ）
+        fr_cal = ctk.CTkFrame(self); fr_cal.pack(padx=20, pady=(0,20))
+        self.lbl_calibration = ctk.CTkLabel(fr_cal, text=calibration.format_profile(calibration.current()), text_color="gray")
+        self.lbl_calibration.pack(side="left", padx=(10,6), pady=6)
+        self.btn_calibrate = ctk.CTkButton(fr_cal, text="再計測", width=70, command=self._calibrate)
+        self.btn_calibrate.pack(side="left", padx=(0,10), pady=6)
+        self._calibration_job = None
+
+    def _build_key_frame(self):
         self.frame_key = ctk.CTkFrame(self)
         ctk.CTkLabel(self.frame_key, text="キーを検索・選択").pack(padx=20, pady=(10,6))
         # ComboBox が使える環境
         try:
             from customtkinter import CTkComboBox
-            self.key_combo = CTkComboBox(self.frame_key, values=KEY_LIST, command=self._on_key_select)
+            self.key_combo = CTkComboBox(self.frame_key, values=[], command=self._on_key_select)
             self.key_combo.set(self.selected_key)
             self.key_combo.pack(padx=20, pady=(0,12), fill="x")
+            # 打つたびに候補を絞り込む（最近選んだキーを上位に）
+            keymap.bind_filter(self.key_combo, recent=lambda: self.recent_keys, on_change=self._on_key_typed)
         except Exception:
             # フォールバック: Entry + 簡易
             self.key_combo = ctk.CTkEntry(self.frame_key); self.key_combo.insert(0, self.selected_key)
             self.key_combo.pack(padx=20, pady=(0,12), fill="x")
             self.key_combo.bind("<FocusOut>", lambda e: self._on_key_select(self.key_combo.get()))
-        self.frame_key.pack_forget()
-
-        # 実行ボタン
-        ctk.CTkButton(self, text="Start (⌘+Shift: mac / Alt+Shift: Win)", command=self.on_start).pack(padx=20, pady=(10,10))
-        ctk.CTkLabel(self, text="※実行中は ESC でキャンセルできます", text_color="gray").pack(padx=20, pady=(0,20))
 
     # ===== UIハンドラ =====
     def _on_action_change(self, choice):
         if choice == "キー入力":
-            self.frame_key.pack(padx=20, pady=(10,20))
-        else:
+            if self.frame_key is None:
+                self._build_key_frame()
+            self.frame_key.pack(padx=20, pady=(10,20), before=self.btn_start)
+        elif self.frame_key is not None:
             self.frame_key.pack_forget()
 
     def _on_press_change(self, choice):
@@ -115,14 +138,49 @@ class ActionPanel(ctk.CTkFrame):
 
     def _on_key_select(self, value):
         self.selected_key = (value or "enter").strip()
+        if self.selected_key in self.recent_keys:
+            self.recent_keys.remove(self.selected_key)
+        self.recent_keys.insert(0, self.selected_key)
+        del self.recent_keys[RECENT_KEYS:]
+
+    def _on_key_typed(self, value):
+        """入力中の値も実行に使う（確定は選択時 / フォーカスアウト時）"""
+        value = (value or "").strip()
+        if value in KEY_LIST:
+            self.selected_key = value
+
+    # ===== 送出コスト =====
+    def _calibrate(self):
+        """計測はスレッドで行い、after で結果を拾う"""
+        if self._calibration_job is not None:
+            return
+        box = {}
+        def _work():
+            try:
+                box['prof'] = calibration.load_or_calibrate(force=True)
+            except Exception as e:
+                box['error'] = e
+        self._calibration_job = (threading.Thread(target=_work, daemon=True), box)
+        self._calibration_job[0].start()
+        self.btn_calibrate.configure(state="disabled")
+        self.lbl_calibration.configure(text="送出コスト: 計測中…")
+        self.after(50, self._poll_calibration)
+
+    def _poll_calibration(self):
+        th, box = self._calibration_job
+        if th.is_alive():
+            self.after(50, self._poll_calibration)
+            return
+        self._calibration_job = None
+        self.btn_calibrate.configure(state="normal")
+        if 'error' in box:
+            self.lbl_calibration.configure(text=f"送出コスト: 計測失敗 ({box['error']})")
+        else:
+            self.lbl_calibration.configure(text=calibration.format_profile(box['prof']))
 
     # ===== 実行ロジック（ホットキーから呼び出される想定） =====
-    def run_worker(self):
-        """Alt+Shift(macは⌘+Shift)の起動後に実行される処理本体"""
-        action = self.action_option.get()
-        press  = self.press_option.get()
-
-        # vals
+    def _settings(self):
+        """入力欄の値（不正な値は既定値）: (action, press, seconds, count, interval, policy, 座標 or None)"""
         def _f(txt, default):
             try:
                 v = float(txt.get()); return max(0.0, v)
@@ -132,57 +190,36 @@ class ActionPanel(ctk.CTkFrame):
                 v = int(txt.get()); return max(0, v)
             except: return default
 
-        seconds = _f(self.entry_seconds, 1.0)
-        count   = _i(self.entry_repeat_count, 1)
-        interval= _f(self.entry_repeat_interval, 0.005)
-
+        xy = None
         if not self.use_follow_mouse:
             try:
-                fx = int(self.entry_x.get()); fy = int(self.entry_y.get())
+                xy = (int(self.entry_x.get()), int(self.entry_y.get()))
             except:
-                fx, fy = 960, 540
-
-        # 修飾キー離れ待ち（対策）
-        flush_modifiers()
-
-        stop = self.stop_flag_ref
-
-        # クリック
-        if action in ("左クリック","右クリック","ダブルクリック"):
-            if press == "短押し":
-                for _ in range(max(1, count)):
-                    if stop(): break
-                    x, y = pag.position() if self.use_follow_mouse else (fx, fy)
-                    if action == "左クリック": pag.click(x, y)
-                    elif action == "右クリック": pag.rightClick(x, y)
-                    else: pag.doubleClick(x, y)
-                    if busy_wait(interval, stop): break
-            else:
-                x, y = pag.position() if self.use_follow_mouse else (fx, fy)
-                pag.moveTo(x, y); pag.mouseDown()
-                t0 = time.time()
-                while time.time() - t0 < seconds:
-                    if stop():
-                        pag.mouseUp(); break
-                    time.sleep(0.01)
-                else:
-                    pag.mouseUp()
-
-        # キー
-        else:
-            key = self.selected_key or "enter"
-            if press == "短押し":
-                for _ in range(max(1, count)):
-                    if stop(): break
-                    pag.press(key)
-                    if busy_wait(interval, stop): break
-            else:
-                pag.keyDown(key)
-                t0 = time.time()
-                while time.time() - t0 < seconds:
-                    if stop():
-                        pag.keyUp(key); break
-                    time.sleep(0.01)
-                else:
-                    pag.keyUp(key)
-        print("完了！")
+                xy = (960, 540)
+        return (self.action_option.get(), self.press_option.get(),
+                _f(self.entry_seconds, 1.0), _i(self.entry_repeat_count, 1),
+                _f(self.entry_repeat_interval, 0.005), self.policy_option.get(), xy)
+
+    def to_plan(self) -> list:
+        """
+        現在の設定を macro_engine のプランにする（run_worker と実行専用プロセスで共用）。
+        座標指定なら先に絶対座標へ移動する。追従モードの位置はブロック開始時に1度だけ読む
+        """
+        from macro_engine import normalize_config
+        action, press, seconds, count, interval, policy, xy = self._settings()
+        plan = []
+        if xy is not None:
+            plan.append(("座標", normalize_config({'action': "マウス移動", 'move_mode': "絶対座標",
+                                                  'move_x': xy[0], 'move_y': xy[1]})))
+        plan.append((action, normalize_config({
+            'action': action, 'press_type': press, 'seconds': seconds,
+            'repeat_count': count, 'repeat_interval': interval, 'overrun_policy': policy,
+            'key': self.selected_key or "enter",
+        })))
+        return plan
+
+    def run_worker(self):
+        """Alt+Shift(macは⌘+Shift)の起動後に実行される処理本体（エディタと同じ exec_block で実行）"""
+        from macro_engine import run_plan
+        ok = run_plan(self.to_plan(), self.stop_flag_ref)
+        print("完了！" if ok else "停止しました")
@@ -0,0 +1,228 @@
+# batch_runner.py
+"""
+複数マクロの並列バッチ実行（ヘッドレス）
+- ジョブ（マクロファイル）をプロセスプールへ分配
+- ワーカープロセスごとに専用の DISPLAY（Xvfb）を割り当て
+- キャンセルは共有メモリ上のフラグで全ワーカーへ即時伝播
+- ジョブごとの所要時間・結果を1つのレポート(JSON)へ集約
+- コンパイル済みプランは plan_cache で共有（同じマクロの2回目以降はコンパイル不要）
+- --watch: 繰り返し中にマクロファイルが変わったら、次の繰り返しから新しいプランで実行
+
+使い方:
+    python batch_runner.py a.json b.json --displays :101 :102 --report report.json
+    python batch_runner.py jobs/*.json --xvfb 4      # Xvfb を4つ起動して並列実行
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ワーカー側のグローバル（initializer で設定）
+_CANCEL = None
+_DISPLAY = None
+
+
+# ==== ワーカー ====
+def _init_worker(display_queue, cancel_flag):
+    """ワーカー起動時に DISPLAY を1つ確保する（pyautogui の import より前）"""
+    global _CANCEL, _DISPLAY
+    _CANCEL = cancel_flag
+    _DISPLAY = display_queue.get()
+    if _DISPLAY:
+        os.environ["DISPLAY"] = _DISPLAY
+    # Ctrl+C は親だけが受け、キャンセルフラグ経由で止める
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _cancelled() -> bool:
+    return bool(_CANCEL.value)
+
+
+def _run_job(index: int, path: str, repeat: int, use_cache: bool = True, watch: bool = False) -> dict:
+    started = time.time()
+    t0 = time.perf_counter()
+    result = {
+        "index": index, "macro": path, "display": _DISPLAY, "pid": os.getpid(),
+        "status": "ok", "error": None, "steps": 0, "started_at": started, "cache": None,
+        "reloads": 0,
+    }
+    reloading = None
+    try:
+        # DISPLAY 確定後に import（pyautogui は import 時に X へ接続する）
+        from macro_engine import load_macro, compile_plan, run_plan
+        if watch:
+            from hot_reload import ReloadingPlan
+            reloading = ReloadingPlan(path).start()
+            plan = reloading.current()
+        elif use_cache:
+            import plan_cache
+            cache = plan_cache.default_cache()
+            hits = cache.stats()["hits"]
+            plan = cache.load_plan(path)
+            result["cache"] = "hit" if cache.stats()["hits"] > hits else "miss"
+        else:
+            plan = compile_plan(load_macro(path))
+
+        def _on_step(i, bid):
+            result["steps"] += 1
+
+        for _ in range(max(1, repeat)):
+            if reloading is not None:
+                plan = reloading.current()      # 繰り返しの境界で最新のプランへ
+            if not run_plan(plan, _cancelled, on_step=_on_step):
+                result["status"] = "cancelled"
+                break
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if reloading is not None:
+            reloading.stop()
+            result["reloads"] = reloading.version
+    result["elapsed"] = time.perf_counter() - t0
+    return result
+
+
+# ==== Xvfb ====
+def start_xvfb(count: int, base: int = 100, screen: str = "1280x800x24"):
+    """Xvfb を count 個起動し (displays, procs) を返す"""
+    if not shutil.which("Xvfb"):
+        raise RuntimeError("Xvfb が見つかりません")
+    displays, procs = [], []
+    for n in range(base, base + count):
+        d = f":{n}"
+        procs.append(subprocess.Popen(
+            ["Xvfb", d, "-screen", "0", screen, "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        displays.append(d)
+    # ソケットが出来るまで待つ
+    deadline = time.time() + 5.0
+    for n in range(base, base + count):
+        while not os.path.exists(f"/tmp/.X11-unix/X{n}") and time.time() < deadline:
+            time.sleep(0.05)
+    return displays, procs
+
+
+def stop_xvfb(procs):
+    for p in procs:
+        try:
+            p.terminate()
+            p.wait(timeout=2)
+        except Exception:
+            p.kill()
+
+
+# ==== ランナー ====
+class BatchRunner:
+    """
+    displays の数だけワーカープロセスを立て、ジョブを分配する。
+    displays に None を渡すと親の DISPLAY をそのまま使う。
+    """
+    def __init__(self, displays, repeat: int = 1, use_cache: bool = True, watch: bool = False):
+        self.displays = list(displays) or [None]
+        self.repeat = repeat
+        self.use_cache = use_cache
+        self.watch = watch
+        self._ctx = mp.get_context("spawn")
+        self._cancel = self._ctx.Value("b", 0, lock=False)
+
+    def cancel(self):
+        self._cancel.value = 1
+
+    def run(self, macro_paths, on_result=None) -> dict:
+        self._cancel.value = 0
+        display_queue = self._ctx.Queue()
+        for d in self.displays:
+            display_queue.put(d)
+
+        started = time.time()
+        t0 = time.perf_counter()
+        jobs = []
+        with ProcessPoolExecutor(
+            max_workers=len(self.displays), mp_context=self._ctx,
+            initializer=_init_worker, initargs=(display_queue, self._cancel),
+        ) as pool:
+            futures = [pool.submit(_run_job, i, p, self.repeat, self.use_cache, self.watch) for i, p in enumerate(macro_paths)]
+            pending = set(futures)
+            try:
+                for fut in as_completed(futures):
+                    pending.discard(fut)
+                    res = fut.result()
+                    jobs.append(res)
+                    if on_result:
+                        on_result(res)
+            except KeyboardInterrupt:
+                # 未着手は取り消し、実行中はフラグで止めて結果を回収
+                self.cancel()
+                for fut in pending:
+                    if not fut.cancel():
+                        jobs.append(fut.result())
+        wall = time.perf_counter() - t0
+
+        jobs.sort(key=lambda r: r["index"])
+        summary = {s: sum(1 for r in jobs if r["status"] == s) for s in ("ok", "cancelled", "error")}
+        summary["not_started"] = len(macro_paths) - len(jobs)
+        summary["cache_hits"] = sum(1 for r in jobs if r["cache"] == "hit")
+        summary["cache_misses"] = sum(1 for r in jobs if r["cache"] == "miss")
+        summary["job_seconds"] = sum(r["elapsed"] for r in jobs)
+        summary["jobs_per_second"] = (len(jobs) / wall) if wall > 0 else 0.0
+        # 並列効率：ジョブ時間の合計 / (壁時計 × ワーカー数)
+        summary["parallel_efficiency"] = (
+            summary["job_seconds"] / (wall * len(self.displays)) if wall > 0 else 0.0
+        )
+        return {
+            "started_at": started,
+            "wall_seconds": wall,
+            "workers": len(self.displays),
+            "displays": self.displays,
+            "summary": summary,
+            "jobs": jobs,
+        }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AuterGUI マクロのバッチ並列実行")
+    ap.add_argument("macros", nargs="+", help="マクロファイル(JSON)")
+    ap.add_argument("--displays", nargs="*", default=None, help="ワーカーに割り当てる DISPLAY（例 :101 :102）")
+    ap.add_argument("--xvfb", type=int, default=0, help="Xvfb を N 個起動して使う")
+    ap.add_argument("--xvfb-base", type=int, default=100, help="Xvfb のディスプレイ番号の開始値")
+    ap.add_argument("--repeat", type=int, default=1, help="各ジョブの繰り返し回数")
+    ap.add_argument("--no-cache", action="store_true", help="プランキャッシュを使わない")
+    ap.add_argument("--watch", action="store_true", help="繰り返し中のマクロ変更を次の繰り返しから反映")
+    ap.add_argument("--report", default=None, help="レポート出力先(JSON)。省略時は標準出力")
+    args = ap.parse_args(argv)
+
+    procs = []
+    if args.xvfb:
+        displays, procs = start_xvfb(args.xvfb, base=args.xvfb_base)
+    elif args.displays:
+        displays = args.displays
+    else:
+        displays = [None]
+
+    try:
+        runner = BatchRunner(displays, repeat=args.repeat, use_cache=not args.no_cache, watch=args.watch)
+        report = runner.run(
+            args.macros,
+            on_result=lambda r: print(f"[{r['display']}] {r['macro']}: {r['status']} ({r['elapsed']:.3f}s)"),
+        )
+    finally:
+        stop_xvfb(procs)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if report["summary"]["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
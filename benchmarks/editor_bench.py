@@ -0,0 +1,267 @@
+# benchmarks/editor_bench.py
+"""
+マクロエディタのスケーラビリティ計測（Xvfb 上で MacroEditor を実際に動かす）
+合成グラフ（直列 / 扇形 / 密メッシュ、100〜50,000 ブロック）を生成し、次の操作の所要時間を測る:
+    load       load_dict（add_block + 接続の描画。1ブロックあたりの時間も出す）
+    drag       ブロックのドラッグ（_on_block_drag → 接続線の引き直し）。扇形ではハブを掴む
+    marquee    空白からのマーキー選択（_on_canvas_mouseup の範囲判定）
+    duplicate  選択ブロックの複製（_duplicate_blocks）
+    delete     複製したブロックの削除（_delete_blocks）
+    run        run_macro（コンパイル + 実行順の走査。送出は何もしない偽のバックエンド）
+メモリは Python ヒープ（tracemalloc）と RSS の増分を1ブロックあたりで記録する。
+ケースごとに子プロセスで実行し、結果を JSON に書く。--baseline で前回の結果と比べ、
+threshold 倍より遅くなった項目があれば終了コード 1。
+
+使い方:
+    python benchmarks/editor_bench.py --xvfb -o bench.json
+    python benchmarks/editor_bench.py --shapes chain fanout --sizes 100 1000 --baseline bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SHAPES = ("chain", "fanout", "mesh")
+SIZES = (100, 1000, 10000, 50000)
+MESH_DEGREE = 4         # 密メッシュ：各ブロックから後続 MESH_DEGREE 個へ接続
+DRAG_STEPS = 50
+THRESHOLD = 1.5
+TIMED = ("load", "drag", "marquee", "duplicate", "delete", "run")
+
+
+# ======================== 合成グラフ ========================
+def make_graph(shape: str, n: int) -> dict:
+    """マクロ保存形式(dict)の合成グラフ"""
+    from layout import layered_layout
+    bids = [f"block_{i}" for i in range(n)]
+    if shape == "chain":
+        conns = list(zip(bids, bids[1:]))
+    elif shape == "fanout":
+        conns = [(bids[0], b) for b in bids[1:]]
+    elif shape == "mesh":
+        conns = [(bids[i], bids[j]) for i in range(n) for j in range(i + 1, min(n, i + 1 + MESH_DEGREE))]
+    else:
+        raise ValueError(f"不明な形: {shape}")
+    pos = layered_layout(bids, conns)
+    # 待ちの無い設定（既定の repeat_interval 0.5 秒は最後の押下の後も待つので、run が sleep の計測になる）
+    cfg = {"action": "キー入力", "key": "a", "repeat_count": 1, "repeat_interval": 0.0, "seconds": 0}
+    return {
+        "blocks": {b: {"x": pos[b][0], "y": pos[b][1], "config": dict(cfg)} for b in bids},
+        "connections": [[f, t] for (f, t) in conns],
+    }
+
+
+class _NullInjector:
+    """送出を数えるだけのバックエンド"""
+    def __init__(self):
+        self.calls = 0
+
+    def position(self):
+        return (0, 0)
+
+    def __getattr__(self, name):
+        def _call(*a, **k):
+            self.calls += 1
+        return _call
+
+
+def _rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# ======================== 1ケース（子プロセス） ========================
+def _event(widget, seq, x, y):
+    widget.event_generate(seq, x=x, y=y, warp=False)
+    widget.update()
+
+
+def run_case(shape: str, n: int) -> dict:
+    import customtkinter as ctk
+    import macro_editor
+    from macro_engine import run_plan
+
+    data = make_graph(shape, n)
+    root = ctk.CTk()
+    root.geometry("1600x1000+0+0")
+    editor = macro_editor.MacroEditor(root, stop_flag_ref=lambda: False)
+    editor.pack(fill="both", expand=True)
+    editor._open_journal(None)      # after で開かれる前に開いておく（計測中に割り込まない）
+    root.update()
+    canvas = editor.canvas
+    res = {"shape": shape, "blocks": n, "connections": len(data["connections"])}
+
+    # load（add_block + 接続）
+    tracemalloc.start()
+    rss0 = _rss()
+    t = time.perf_counter()
+    editor.load_dict(data)
+    root.update()
+    res["load"] = time.perf_counter() - t
+    res["load_per_block_us"] = res["load"] / n * 1e6
+    res["py_bytes_per_block"] = tracemalloc.get_traced_memory()[0] / n
+    tracemalloc.stop()
+    res["rss_bytes_per_block"] = (_rss() - rss0) / n
+
+    # drag：先頭ブロック（扇形ではハブ）を DRAG_STEPS 回動かす
+    meta = editor.blocks["block_0"]
+    gx, gy = int(meta['x'] + 20), int(meta['y'] + 10)
+    _event(canvas, "<Motion>", gx, gy)
+    _event(canvas, "<ButtonPress-1>", gx, gy)
+    if editor.current_block_id != "block_0":
+        res["error"] = "ブロックを掴めません（イベントが届いていない）"
+        root.destroy()
+        return res
+    t = time.perf_counter()
+    for i in range(1, DRAG_STEPS + 1):
+        _event(canvas, "<B1-Motion>", gx + i * 4, gy + i * 2)
+    res["drag"] = time.perf_counter() - t
+    res["drag_per_step_ms"] = res["drag"] / DRAG_STEPS * 1000
+    _event(canvas, "<ButtonRelease-1>", gx + DRAG_STEPS * 4, gy + DRAG_STEPS * 2)
+
+    # marquee：表示範囲を空白から囲む
+    w, h = canvas.winfo_width(), canvas.winfo_height()
+    _event(canvas, "<Motion>", 2, 2)
+    t = time.perf_counter()
+    _event(canvas, "<ButtonPress-1>", 2, 2)
+    _event(canvas, "<B1-Motion>", w - 2, h - 2)
+    _event(canvas, "<ButtonRelease-1>", w - 2, h - 2)
+    res["marquee"] = time.perf_counter() - t
+    selected = set(editor.multi_selected)
+    res["selected"] = len(selected)
+
+    # duplicate / delete
+    before = set(editor.blocks)
+    t = time.perf_counter()
+    editor._duplicate_blocks(selected)
+    root.update()
+    res["duplicate"] = time.perf_counter() - t
+    dupes = set(editor.blocks) - before
+    t = time.perf_counter()
+    editor._delete_blocks(dupes)
+    root.update()
+    res["delete"] = time.perf_counter() - t
+
+    # run_macro（偽のバックエンドで実行。ブロックごとの表示は捨てる）
+    inj = _NullInjector()
+    orig = macro_editor.run_plan
+    macro_editor.run_plan = lambda plan, stop, **kw: run_plan(plan, stop, backend=inj, **kw)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            editor.run_macro()
+            res["run"] = time.perf_counter() - t
+    finally:
+        macro_editor.run_plan = orig
+    res["run_injected"] = inj.calls
+    res["pool"] = editor.pool.stats()
+
+    editor.close_journal()
+    root.destroy()
+    return res
+
+
+# ======================== 親（ケースの分配と比較） ========================
+def _child(shape, n, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), "--one", shape, str(n)]
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"shape": shape, "blocks": n, "error": f"{timeout}s でタイムアウト"}
+    lines = p.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"shape": shape, "blocks": n, "error": (p.stderr.strip().splitlines() or ["不明"])[-1]}
+
+
+def compare(results, baseline, threshold: float = THRESHOLD) -> list:
+    """前回の結果より threshold 倍以上遅くなった項目"""
+    prev = {(r["shape"], r["blocks"]): r for r in baseline.get("results", [])}
+    worse = []
+    for r in results:
+        old = prev.get((r["shape"], r["blocks"]))
+        if not old or "error" in r or "error" in old:
+            continue
+        for k in TIMED:
+            if old.get(k) and r.get(k) and r[k] > old[k] * threshold:
+                worse.append(f"{r['shape']}/{r['blocks']} {k}: {old[k] * 1000:.1f}ms → {r[k] * 1000:.1f}ms")
+    return worse
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="マクロエディタのスケーラビリティ計測")
+    ap.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=SHAPES)
+    ap.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    ap.add_argument("-o", "--output", default=None, help="結果(JSON)の出力先。省略時は標準出力")
+    ap.add_argument("--baseline", default=None, help="比較する前回の結果(JSON)")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD, help="遅くなったとみなす倍率")
+    ap.add_argument("--xvfb", action="store_true", help="Xvfb を起動してその上で計測")
+    ap.add_argument("--timeout", type=float, default=1800.0, help="1ケースの制限時間(秒)")
+    ap.add_argument("--one", nargs=2, metavar=("SHAPE", "N"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.one:
+        # 子プロセス：自動保存は一時ディレクトリへ（利用者の自動保存に触れない）
+        os.environ["HOME"] = tempfile.mkdtemp(prefix="autergui_bench_")
+        with contextlib.redirect_stdout(sys.stderr):
+            res = run_case(args.one[0], int(args.one[1]))
+        print(json.dumps(res, ensure_ascii=False))
+        return 0
+
+    procs = []
+    if args.xvfb:
+        from batch_runner import start_xvfb
+        displays, procs = start_xvfb(1, base=199, screen="1600x1000x24")
+        os.environ["DISPLAY"] = displays[0]
+    try:
+        results = []
+        for shape in args.shapes:
+            for n in args.sizes:
+                r = _child(shape, n, args.timeout)
+                results.append(r)
+                if "error" in r:
+                    print(f"{shape:7s} {n:6d}: エラー {r['error']}", file=sys.stderr)
+                else:
+                    print(f"{shape:7s} {n:6d}: load {r['load_per_block_us']:.0f}us/ブロック, "
+                          f"drag {r['drag_per_step_ms']:.2f}ms/回, marquee {r['marquee'] * 1000:.1f}ms, "
+                          f"dup {r['duplicate'] * 1000:.1f}ms, del {r['delete'] * 1000:.1f}ms, "
+                          f"run {r['run'] * 1000:.1f}ms, {r['py_bytes_per_block']:.0f}B/ブロック",
+                          file=sys.stderr)
+    finally:
+        if procs:
+            from batch_runner import stop_xvfb
+            stop_xvfb(procs)
+
+    report = {"created_at": time.time(), "python": sys.version.split()[0], "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            worse = compare(results, json.load(f), args.threshold)
+        for line in worse:
+            print("遅くなりました:", line, file=sys.stderr)
+        return 1 if worse else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,411 @@
+# benchmarks/latency_bench.py
+"""
+起動・停止の体感レイテンシ計測（Xvfb 上で App を実際に動かす）
+合成キー入力で HotkeyManager を叩き、pynput のリスナーで X に届いたイベントの時刻を取る:
+    trigger  起動操作が届いてから、最初の送出イベントが届くまで
+             action: Alt+Shift（2つ目のキーの押下）→ 最初の送出
+             macro : 「マクロ実行」ボタンのクリック（離した時点）→ 最初の送出
+    cancel   ESC が届いてから、最後の送出イベントが届くまで
+送出はすべて PROBE_KEY の連打（INTERVAL 間隔）。開始・終了の両端を同じリスナーで測るので、
+リスナー自体の遅れは差し引かれる。
+合成入力の送り方は --driver で選ぶ（pynput: pynput の Controller / xtest: pyautogui の XTest）。
+--modes に process を含めると AUTERGUI_EXECUTOR=process（実行専用プロセス）でも測る。
+ジョブ × 実行方式ごとに子プロセスで実行し、百分位（ms）を JSON に書く。
+--baseline で前回の結果と比べ、threshold 倍より遅くなった項目があれば終了コード 1。
+
+使い方:
+    python benchmarks/latency_bench.py --xvfb -o latency.json
+    python benchmarks/latency_bench.py --xvfb --jobs action --modes thread process --trials 100
+"""
+import argparse
+import contextlib
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+JOBS = ("action", "macro")
+MODES = ("thread", "process")
+DRIVERS = ("pynput", "xtest")
+TRIALS = 50
+PROBE_KEY = "ctrlright"     # 送出するキー（Tk の入力欄に文字を打ち込まない）
+INTERVAL = 0.005
+ARM_WAIT = 0.3              # ホットキーのリスナーが立ち上がるまで
+QUIET = 0.3                 # この間送出が無ければ止まったとみなす
+TIMEOUT = 3.0
+THRESHOLD = 1.5
+PERCENTILES = (50, 90, 99)
+
+
+# ======================== 集計 ========================
+def summarize(xs) -> dict:
+    """秒のリスト → ms の百分位"""
+    if not xs:
+        return {}
+    xs = sorted(xs)
+    out = {f"p{p}": xs[min(len(xs) - 1, int(len(xs) * p / 100))] * 1000 for p in PERCENTILES}
+    out["max"] = xs[-1] * 1000
+    out["mean"] = sum(xs) / len(xs) * 1000
+    return out
+
+
+# ======================== 観測と合成入力（子プロセス） ========================
+class _Observer:
+    """X に届いたキー / クリックの時刻（perf_counter）を記録"""
+    def __init__(self):
+        from pynput import keyboard, mouse
+        self.Key = keyboard.Key
+        self.probe = keyboard.Key.ctrl_r
+        self.shifts = (keyboard.Key.shift, keyboard.Key.shift_l, keyboard.Key.shift_r)
+        self._lock = threading.Lock()
+        self.reset()
+        self.kl = keyboard.Listener(on_press=self._press)
+        self.ml = mouse.Listener(on_click=self._click)
+        self.kl.start()
+        self.ml.start()
+        self.kl.wait()
+        self.ml.wait()
+
+    def reset(self):
+        with self._lock:
+            self.probes = []
+            self.marks = {}
+
+    def _press(self, key):
+        t = time.perf_counter()
+        with self._lock:
+            if key == self.probe:
+                self.probes.append(t)
+            elif key in self.shifts:
+                self.marks['chord'] = t
+            elif key == self.Key.esc:
+                self.marks['esc'] = t
+
+    def _click(self, x, y, button, pressed):
+        if not pressed:
+            with self._lock:
+                self.marks['click'] = time.perf_counter()
+
+    def first_after(self, mark, timeout):
+        """mark 以降の最初の送出時刻（来なければ None）"""
+        end = time.perf_counter() + timeout
+        while time.perf_counter() < end:
+            with self._lock:
+                t0 = self.marks.get(mark)
+                if t0 is not None:
+                    for t in self.probes:
+                        if t >= t0:
+                            return t0, t
+            time.sleep(0.001)
+        return None
+
+    def last_quiet(self, timeout):
+        """送出が QUIET 秒途切れるまで待ち、最後の送出時刻を返す（止まらなければ None）"""
+        end = time.perf_counter() + timeout
+        while time.perf_counter() < end:
+            with self._lock:
+                last = self.probes[-1] if self.probes else 0.0
+            if time.perf_counter() - last >= QUIET:
+                return last
+            time.sleep(0.005)
+        return None
+
+    def stop(self):
+        self.kl.stop()
+        self.ml.stop()
+
+
+class _Driver:
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == "pynput":
+            from pynput import keyboard, mouse
+            self.Key = keyboard.Key
+            self.kb = keyboard.Controller()
+            self.mouse = mouse.Controller()
+            self.Button = mouse.Button
+        else:
+            import pyautogui
+            self.pag = pyautogui
+
+    def chord(self):
+        if self.kind == "pynput":
+            self.kb.press(self.Key.alt)
+            self.kb.press(self.Key.shift)
+            self.kb.release(self.Key.shift)
+            self.kb.release(self.Key.alt)
+        else:
+            self.pag.keyDown("alt")
+            self.pag.keyDown("shift")
+            self.pag.keyUp("shift")
+            self.pag.keyUp("alt")
+
+    def esc(self):
+        if self.kind == "pynput":
+            self.kb.press(self.Key.esc)
+            self.kb.release(self.Key.esc)
+        else:
+            self.pag.press("esc")
+
+    def click(self, x, y):
+        if self.kind == "pynput":
+            self.mouse.position = (x, y)
+            self.mouse.click(self.Button.left)
+        else:
+            self.pag.click(x, y)
+
+
+class _TkCalls:
+    """計測スレッドから Tk スレッドで関数を呼ぶ（after のポーリングで受け取る）"""
+    def __init__(self, root):
+        self.root = root
+        self.q = queue.Queue()
+        self.root.after(10, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                fn, box, ev = self.q.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                box['value'] = fn()
+            except Exception as e:
+                box['error'] = e
+            ev.set()
+        self.root.after(10, self._poll)
+
+    def call(self, fn, timeout=10.0):
+        box, ev = {}, threading.Event()
+        self.q.put((fn, box, ev))
+        if not ev.wait(timeout):
+            raise RuntimeError("Tk スレッドが応答しません")
+        if 'error' in box:
+            raise box['error']
+        return box.get('value')
+
+
+# ======================== 1ケース（子プロセス） ========================
+def _setup_action(app):
+    p = app.action_panel
+    p.action_option.set("キー入力"); p._on_action_change("キー入力")
+    p.press_option.set("短押し"); p._on_press_change("短押し")
+    p.selected_key = PROBE_KEY
+    for entry, value in ((p.entry_repeat_count, "1000000"), (p.entry_repeat_interval, str(INTERVAL))):
+        entry.delete(0, "end"); entry.insert(0, value)
+
+
+def _setup_macro(app):
+    app.tabs.set("マクロ")
+    app._ensure_tab("マクロ")
+    editor = app.macro_editor
+    editor.load_dict({"blocks": {"probe": {"x": 60, "y": 60, "config": {
+        "action": "キー入力", "key": PROBE_KEY, "repeat_count": 1000000, "repeat_interval": INTERVAL}}},
+        "connections": []})
+    app.update()
+    btn = _find_button(editor, "マクロ実行")
+    app.hk.start()          # ESC を受け付ける
+    return btn.winfo_rootx() + btn.winfo_width() // 2, btn.winfo_rooty() + btn.winfo_height() // 2
+
+
+def _find_button(widget, text):
+    import customtkinter as ctk
+    for w in widget.winfo_children():
+        if isinstance(w, ctk.CTkButton) and w.cget("text") == text:
+            return w
+        found = _find_button(w, text)
+        if found is not None:
+            return found
+    return None
+
+
+def _trials(app, calls, job, n, driver, seed) -> dict:
+    obs = _Observer()
+    drv = _Driver(driver)
+    rng = random.Random(seed)
+    trigger, cancel = [], []
+    timeouts = {'trigger': 0, 'cancel': 0}
+    target = calls.call(lambda: _setup_macro(app)) if job == "macro" else None
+    if job == "action":
+        calls.call(lambda: _setup_action(app))
+    try:
+        for _ in range(n):
+            obs.reset()
+            if job == "action":
+                calls.call(app._on_start_hotkey)
+                time.sleep(ARM_WAIT)
+                drv.chord()
+                hit = obs.first_after('chord', TIMEOUT)
+            else:
+                app._stop_flag = False
+                time.sleep(ARM_WAIT)
+                drv.click(*target)
+                hit = obs.first_after('click', TIMEOUT)
+            if hit is None:
+                timeouts['trigger'] += 1
+                app._on_esc()
+                obs.last_quiet(TIMEOUT)
+                continue
+            trigger.append(hit[1] - hit[0])
+
+            time.sleep(rng.uniform(0.2, 0.4))
+            drv.esc()
+            last = obs.last_quiet(TIMEOUT)
+            esc = obs.marks.get('esc')
+            if last is None or esc is None:
+                timeouts['cancel'] += 1
+                app._on_esc()       # 後片付け（ESC が効かなかった）
+                obs.last_quiet(TIMEOUT)
+                continue
+            cancel.append(max(0.0, last - esc))
+    finally:
+        obs.stop()
+    return {"trigger_ms": summarize(trigger), "cancel_ms": summarize(cancel),
+            "samples": {"trigger": len(trigger), "cancel": len(cancel)}, "timeouts": timeouts}
+
+
+def run_case(job: str, mode: str, n: int, driver: str, seed: int) -> dict:
+    if mode == "process":
+        os.environ["AUTERGUI_EXECUTOR"] = "process"
+    import main as app_main
+
+    app = app_main.App()
+    app.geometry("1280x800+0+0")
+    calls = _TkCalls(app)
+    res = {"job": job, "mode": mode, "driver": driver, "trials": n}
+    box = {}
+
+    def _work():
+        try:
+            if app.executor is not None:
+                deadline = time.time() + 10
+                while app.executor.pid is None and time.time() < deadline:
+                    time.sleep(0.05)    # 実行プロセスの起動を計測に含めない
+            box.update(_trials(app, calls, job, n, driver, seed))
+        except Exception as e:
+            box['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            box['done'] = True
+
+    def _wait_done():
+        if box.get('done'):
+            app._on_close()
+        else:
+            app.after(50, _wait_done)
+
+    threading.Thread(target=_work, daemon=True).start()
+    app.after(50, _wait_done)
+    app.mainloop()
+    box.pop('done', None)
+    res.update(box)
+    return res
+
+
+# ======================== 親（ケースの分配と比較） ========================
+def _child(job, mode, n, driver, seed, timeout):
+    cmd = [sys.executable, os.path.abspath(__file__), "--one", job, mode,
+           "--trials", str(n), "--driver", driver, "--seed", str(seed)]
+    try:
+        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"job": job, "mode": mode, "error": f"{timeout}s でタイムアウト"}
+    lines = p.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"job": job, "mode": mode, "error": (p.stderr.strip().splitlines() or ["不明"])[-1]}
+
+
+def compare(results, baseline, threshold: float = THRESHOLD) -> list:
+    """前回の結果より threshold 倍以上遅くなった百分位"""
+    prev = {(r["job"], r["mode"]): r for r in baseline.get("results", [])}
+    worse = []
+    for r in results:
+        old = prev.get((r["job"], r["mode"]))
+        if not old or "error" in r or "error" in old:
+            continue
+        for metric in ("trigger_ms", "cancel_ms"):
+            for k in ("p50", "p90"):
+                a, b = (old.get(metric) or {}).get(k), (r.get(metric) or {}).get(k)
+                if a and b and b > a * threshold:
+                    worse.append(f"{r['job']}/{r['mode']} {metric} {k}: {a:.1f}ms → {b:.1f}ms")
+    return worse
+
+
+def _fmt(s: dict) -> str:
+    return "-" if not s else " ".join(f"{k} {v:.1f}" for k, v in s.items() if k != "mean")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="起動・停止の体感レイテンシ計測")
+    ap.add_argument("--jobs", nargs="+", default=list(JOBS), choices=JOBS)
+    ap.add_argument("--modes", nargs="+", default=["thread"], choices=MODES)
+    ap.add_argument("--driver", default="pynput", choices=DRIVERS, help="合成入力の送り方")
+    ap.add_argument("--trials", type=int, default=TRIALS)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-o", "--output", default=None, help="結果(JSON)の出力先。省略時は標準出力")
+    ap.add_argument("--baseline", default=None, help="比較する前回の結果(JSON)")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD, help="遅くなったとみなす倍率")
+    ap.add_argument("--xvfb", action="store_true", help="Xvfb を起動してその上で計測")
+    ap.add_argument("--timeout", type=float, default=1800.0, help="1ケースの制限時間(秒)")
+    ap.add_argument("--one", nargs=2, metavar=("JOB", "MODE"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.one:
+        # 子プロセス：自動保存・送出コストのキャッシュは一時ディレクトリへ
+        os.environ["HOME"] = tempfile.mkdtemp(prefix="autergui_bench_")
+        with contextlib.redirect_stdout(sys.stderr):
+            res = run_case(args.one[0], args.one[1], max(1, args.trials), args.driver, args.seed)
+        print(json.dumps(res, ensure_ascii=False))
+        return 0
+
+    procs = []
+    if args.xvfb:
+        from batch_runner import start_xvfb
+        displays, procs = start_xvfb(1, base=198, screen="1280x800x24")
+        os.environ["DISPLAY"] = displays[0]
+    try:
+        results = []
+        for job in args.jobs:
+            for mode in args.modes:
+                r = _child(job, mode, args.trials, args.driver, args.seed, args.timeout)
+                results.append(r)
+                if "error" in r:
+                    print(f"{job:6s} {mode:7s}: エラー {r['error']}", file=sys.stderr)
+                else:
+                    print(f"{job:6s} {mode:7s}: trigger [{_fmt(r['trigger_ms'])}]ms, "
+                          f"cancel [{_fmt(r['cancel_ms'])}]ms, タイムアウト {r['timeouts']}",
+                          file=sys.stderr)
+    finally:
+        if procs:
+            from batch_runner import stop_xvfb
+            stop_xvfb(procs)
+
+    report = {"created_at": time.time(), "python": sys.version.split()[0], "driver": args.driver,
+              "interval": INTERVAL, "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            worse = compare(results, json.load(f), args.threshold)
+        for line in worse:
+            print("遅くなりました:", line, file=sys.stderr)
+        return 1 if worse else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
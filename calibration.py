@@ -0,0 +1,223 @@
+# calibration.py
+"""
+送出コスト（1回の click / press 等が返るまでの時間）の計測とホストごとのキャッシュ。
+同じ 0.005 秒間隔でも、送出に 1ms かかる環境と 8ms かかる環境では意味が変わるため、
+「再計測」ボタンか CLI で実測し、~/.autergui/calibration.json に
+ホスト名・OS・バックエンドごとに保存する。計測はキー・マウスを実際に送るので、
+起動時に勝手には行わない（未計測の間はコスト 0 として扱い「未計測」と表示する）。
+
+計測は画面に影響しない操作だけで行う:
+    move      : 現在位置への moveTo
+    position  : position()
+    key_down / key_up : PROBE_KEY の押下/解放。通常どのアプリも反応しないキー
+                        （F15。mac の F14/F15 は画面の明るさなので F18）
+ボタンの押下/解放は同じ注入経路（XTest / SendInput / CGEventPost）を通るため、
+キーの押下/解放と同じコストとして見積もる（クリックは move + 押下 + 解放）。
+
+使い方:
+    python calibration.py            # キャッシュがあれば表示、無ければ計測
+    python calibration.py --force    # 計測し直す
+"""
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+
+import pyautogui as pag
+
+PROFILE_PATH = os.environ.get("AUTERGUI_CALIBRATION") or os.path.join(
+    os.path.expanduser("~"), ".autergui", "calibration.json")
+TRIALS = 30
+PROFILE_VERSION = 2     # 1 は CLI で pyautogui.PAUSE 込みで計測された可能性があるので読まない
+PROBE_KEY = "f18" if platform.system() == "Darwin" else "f15"
+
+# 表示順と表示名
+ACTION_LABELS = {
+    "click": "クリック",
+    "right_click": "右クリック",
+    "double_click": "ダブルクリック",
+    "key": "キー",
+    "move": "移動",
+}
+
+_lock = threading.Lock()
+_profiles = {}          # バックエンド名 -> プロファイル（このホストの分だけ）
+_loaded = False
+
+
+def backend_name(backend=None) -> str:
+    inj = backend or pag
+    return getattr(inj, "__name__", None) or type(inj).__name__
+
+
+def host_id() -> str:
+    return f"{platform.node()}|{platform.system()} {platform.release()}"
+
+
+def _key(backend: str) -> str:
+    return f"{host_id()}|{backend}"
+
+
+# ======================== 計測 ========================
+def _sample(fn, trials: int) -> dict:
+    xs = []
+    for _ in range(trials):
+        t = time.perf_counter()
+        fn()
+        xs.append(time.perf_counter() - t)
+    xs.sort()
+    return {'median': statistics.median(xs), 'p90': xs[min(len(xs) - 1, int(len(xs) * 0.9))]}
+
+
+def measure(backend=None, trials: int = TRIALS) -> dict:
+    """backend の送出コストを実測（秒）。戻り値はプロファイル"""
+    inj = backend or pag
+    # pyautogui は送出ごとに PAUSE（既定 0.1 秒）待つ。アプリでは utils が 0 にしているが、
+    # CLI から単体で計測するときもその待ちを含めない
+    pause = getattr(inj, "PAUSE", None)
+    if pause is not None:
+        inj.PAUSE = 0.0
+    try:
+        return _measure(inj, trials)
+    finally:
+        if pause is not None:
+            inj.PAUSE = pause
+
+
+def _measure(inj, trials: int) -> dict:
+    x, y = inj.position()
+    prims = {
+        'position': _sample(inj.position, trials),
+        'move': _sample(lambda: inj.moveTo(x, y), trials),
+    }
+    down, up = [], []
+    for _ in range(trials):
+        t = time.perf_counter()
+        inj.keyDown(PROBE_KEY)
+        t1 = time.perf_counter()
+        inj.keyUp(PROBE_KEY)
+        down.append(t1 - t)
+        up.append(time.perf_counter() - t1)
+    for name, xs in (('key_down', down), ('key_up', up)):
+        xs.sort()
+        prims[name] = {'median': statistics.median(xs), 'p90': xs[min(len(xs) - 1, int(len(xs) * 0.9))]}
+
+    m = {k: v['median'] for k, v in prims.items()}
+    press = m['key_down'] + m['key_up']
+    actions = {
+        'click': m['move'] + press,
+        'right_click': m['move'] + press,
+        'double_click': m['move'] + 2 * press,
+        'key': press,
+        'move': m['move'],
+        'mouse_up': m['key_up'],
+        'key_up': m['key_up'],
+    }
+    return {
+        'host': host_id(),
+        'backend': backend_name(inj),
+        'created_at': time.time(),
+        'trials': trials,
+        'version': PROFILE_VERSION,
+        'primitives': prims,
+        'actions': actions,
+    }
+
+
+# ======================== キャッシュ ========================
+def _read_all() -> dict:
+    try:
+        with open(PROFILE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_all(data: dict):
+    os.makedirs(os.path.dirname(PROFILE_PATH) or ".", exist_ok=True)
+    tmp = PROFILE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, PROFILE_PATH)
+
+
+def _load_cached():
+    global _loaded
+    if _loaded:
+        return
+    prefix = host_id() + "|"
+    for k, prof in _read_all().items():
+        if (k.startswith(prefix) and isinstance(prof, dict) and isinstance(prof.get('actions'), dict)
+                and prof.get('version') == PROFILE_VERSION):
+            _profiles.setdefault(prof.get('backend', k[len(prefix):]), prof)
+    _loaded = True
+
+
+def load_or_calibrate(backend=None, force: bool = False, trials: int = TRIALS) -> dict:
+    """キャッシュがあればそれを、無ければ（force なら常に）計測して保存したプロファイル"""
+    name = backend_name(backend)
+    with _lock:
+        _load_cached()
+        prof = _profiles.get(name)
+        if prof is not None and not force:
+            return prof
+    prof = measure(backend, trials)
+    with _lock:
+        _profiles[name] = prof
+        data = _read_all()
+        data[_key(name)] = prof
+        try:
+            _write_all(data)
+        except OSError as e:
+            print(f"送出コストを保存できません: {e}")
+    return prof
+
+
+def current(backend=None):
+    """計測済み（またはキャッシュ済み）のプロファイル。無ければ None（ここでは計測しない）"""
+    with _lock:
+        _load_cached()
+        return _profiles.get(backend_name(backend))
+
+
+def cost(action: str, backend=None) -> float:
+    """action（click / key / mouse_up など）の1回あたりの送出コスト（秒）。未計測なら 0"""
+    prof = current(backend)
+    if prof is None:
+        return 0.0
+    try:
+        return max(0.0, float(prof['actions'].get(action, 0.0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def format_profile(prof) -> str:
+    if not prof:
+        return "送出コスト: 未計測"
+    parts = [f"{label} {prof['actions'][k] * 1000:.2f}ms"
+             for k, label in ACTION_LABELS.items() if k in prof['actions']]
+    return "送出コスト: " + " / ".join(parts)
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="送出コストの計測（ホストごとにキャッシュ）")
+    ap.add_argument("--force", action="store_true", help="キャッシュがあっても計測し直す")
+    ap.add_argument("--trials", type=int, default=TRIALS, help="操作ごとの試行回数")
+    args = ap.parse_args(argv)
+
+    prof = load_or_calibrate(force=args.force, trials=max(1, args.trials))
+    print(f"{prof['host']} [{prof['backend']}] "
+          f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(prof['created_at']))} 計測, {prof['trials']}回")
+    for name, s in prof['primitives'].items():
+        print(f"  {name:9s} 中央値 {s['median'] * 1000:.3f}ms  p90 {s['p90'] * 1000:.3f}ms")
+    print(format_profile(prof))
+    print(f"保存先: {PROFILE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
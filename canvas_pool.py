@@ -0,0 +1,90 @@
+# canvas_pool.py
+"""
+キャンバス図形のプール（作成・削除を繰り返さず、隠して再利用する）。
+Tk のキャンバスは図形 ID を使い回さないため、作成/削除を繰り返す長い編集セッションでは
+ID と内部リストが増え続ける。ここでは図形を「役割」ごとにプールし、
+- acquire: 空きがあれば座標・タグ・オプションを付け直して表示、無ければ作成
+- release: 隠して空きへ戻す（役割ごとの上限を超えた分だけ本当に削除）
+- 所有者（ブロック ID など）ごとに図形を記録し、release_owner でまとめて返却（取りこぼし防止）
+タグへのバインドは呼び出し側で1度だけ登録する（図形ごとには登録しない）。
+"""
+
+POOLED_TAG = "pooled"
+DEFAULT_LIMIT = 4096
+
+
+class CanvasPool:
+    def __init__(self, canvas, roles: dict, limit: int = DEFAULT_LIMIT):
+        """
+        roles: {役割: (図形種別, 既定オプション)}
+            例) {"port": ("oval", {"fill": "#7AA2F7", "outline": ""})}
+        """
+        self.canvas = canvas
+        self.roles = roles
+        self.limit = limit
+        self._free = {role: [] for role in roles}
+        self._role = {}         # item_id -> 役割（使用中のみ）
+        self._owner = {}        # item_id -> 所有者
+        self._owned = {}        # 所有者 -> {item_id}
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, role: str, coords, tags=(), owner=None, **opts):
+        kind, defaults = self.roles[role]
+        free = self._free[role]
+        if free:
+            item = free.pop()
+            self.canvas.coords(item, *coords)
+            # 前の利用で変えたオプション（強調表示など）も既定へ戻す
+            self.canvas.itemconfigure(item, state="normal", tags=tags, **dict(defaults, **opts))
+            self.canvas.tag_raise(item)
+            self.reused += 1
+        else:
+            item = getattr(self.canvas, f"create_{kind}")(*coords, tags=tags, **dict(defaults, **opts))
+            self.created += 1
+        self._role[item] = role
+        if owner is not None:
+            self._owner[item] = owner
+            self._owned.setdefault(owner, set()).add(item)
+        return item
+
+    def release(self, item):
+        role = self._role.pop(item, None)
+        if role is None:
+            return      # プール外 / 返却済み
+        owner = self._owner.pop(item, None)
+        if owner is not None:
+            items = self._owned.get(owner)
+            if items is not None:
+                items.discard(item)
+                if not items:
+                    del self._owned[owner]
+        free = self._free[role]
+        if len(free) < self.limit:
+            self.canvas.itemconfigure(item, state="hidden", tags=(POOLED_TAG,))
+            free.append(item)
+        else:
+            self.canvas.delete(item)
+
+    def release_many(self, items):
+        for item in items:
+            self.release(item)
+
+    def release_owner(self, owner):
+        for item in list(self._owned.get(owner, ())):
+            self.release(item)
+
+    def owned(self, owner) -> set:
+        return set(self._owned.get(owner, ()))
+
+    def in_use(self, item) -> bool:
+        return item in self._role
+
+    def stats(self) -> dict:
+        return {
+            "in_use": len(self._role),
+            "free": sum(len(v) for v in self._free.values()),
+            "owners": len(self._owned),
+            "created": self.created,
+            "reused": self.reused,
+        }
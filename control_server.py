@@ -0,0 +1,271 @@
+# control_server.py
+"""
+ローカル制御API（localhost HTTP）
+他プロセスからマクロを一覧・読込・起動・キャンセルし、進捗をストリームで受け取る。
+読込済みマクロはコンパイル済みプランとして保持（ウォーム）するので、起動はキー入力の
+擬似操作なしで即時に行われる。
+--watch を付けると読込済みマクロのファイル変更を監視し、変わったブロックだけ再コンパイルする
+（実行中の run は元のプランのまま終わり、次の start から新しいプランになる）。
+
+エンドポイント（すべて JSON、127.0.0.1 のみで待受）:
+    GET  /macros               利用可能 / 読込済みマクロ一覧
+    POST /macros/<name>/load   読込＆コンパイル
+    POST /macros/<name>/start  起動（未読込なら読込も行う）
+    POST /cancel               実行中マクロを停止
+    GET  /status               実行状態
+    GET  /progress             実行中の進捗を NDJSON で逐次送信（終了で切断）
+    GET  /metrics              累積メトリクス（Prometheus テキスト形式）
+
+使い方:
+    python control_server.py --dir ./macros --port 8765
+    python control_server.py --dir ./macros --preload --watch
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MacroService:
+    """マクロの読込・実行状態を保持する（HTTP 層とは独立）"""
+    def __init__(self, macro_dir: str, backend=None, watch: bool = False):
+        self.macro_dir = os.path.abspath(macro_dir)
+        self.backend = backend
+        self.watch = watch
+        self.plans = {}             # name -> plan（ウォーム）
+        self._reloaders = {}        # name -> ReloadingPlan（watch 時）
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._stop = False
+        self._thread = None
+        self._run_id = 0
+        self._events = []           # 現在の実行の進捗イベント
+        self._state = "idle"        # idle | running | done | cancelled | error
+
+    # ==== マクロ ====
+    def _path(self, name: str) -> str:
+        if not name or os.sep in name or (os.altsep and os.altsep in name) or name.startswith("."):
+            raise KeyError(name)
+        return os.path.join(self.macro_dir, name + ".json")
+
+    def available(self) -> list:
+        try:
+            files = os.listdir(self.macro_dir)
+        except OSError:
+            return []
+        return sorted(f[:-5] for f in files if f.endswith(".json"))
+
+    def load(self, name: str) -> int:
+        """読込＆コンパイルしてウォームに保持。ステップ数を返す"""
+        from plan_cache import default_cache
+        path = self._path(name)
+        if not os.path.exists(path):
+            raise KeyError(name)
+        if self.watch:
+            return self._load_watched(name, path)
+        plan = default_cache().load_plan(path)
+        with self._lock:
+            self.plans[name] = plan
+        return len(plan)
+
+    def _load_watched(self, name: str, path: str) -> int:
+        from hot_reload import ReloadingPlan
+        rp = ReloadingPlan(path, on_reload=lambda r: self._reloaded(name, r))
+        with self._lock:
+            old = self._reloaders.pop(name, None)
+            self._reloaders[name] = rp
+            self.plans[name] = rp.current()
+        if old:
+            old.stop()
+        rp.start()
+        return len(self.plans[name])
+
+    def _reloaded(self, name: str, rp):
+        # 実行中の run は開始時に受け取ったプランのまま。次の start から新しいプラン
+        with self._cond:
+            self.plans[name] = rp.current()
+            if self._state == "running":
+                self._emit({"event": "reloaded", "macro": name, "version": rp.version, "applies": "next_run"})
+
+    # ==== 実行 ====
+    def start(self, name: str) -> int:
+        if name not in self.plans:
+            self.load(name)
+        # 判定からスレッドの登録までをロック内で行う（ThreadingHTTPServer では start が並行して来る）
+        with self._cond:
+            if self._state == "running":
+                raise RuntimeError("実行中です")
+            self._run_id += 1
+            self._stop = False
+            self._events = []
+            self._state = "running"
+            run_id = self._run_id
+            plan = self.plans[name]
+            self._emit({"event": "start", "macro": name, "steps": len(plan)})
+            self._thread = threading.Thread(target=self._worker, args=(run_id, name, plan), daemon=True)
+            self._thread.start()
+        return run_id
+
+    def cancel(self) -> bool:
+        with self._lock:
+            running = self._state == "running"
+            self._stop = True
+        return running
+
+    def status(self) -> dict:
+        with self._lock:
+            st = {"run": self._run_id, "state": self._state, "events": len(self._events),
+                  "loaded": sorted(self.plans)}
+            if self.watch:
+                st["versions"] = {n: rp.version for n, rp in self._reloaders.items()}
+        from plan_cache import default_cache
+        st["plan_cache"] = default_cache().stats()
+        return st
+
+    def _emit(self, ev: dict):
+        # self._cond を保持した状態で呼ぶ
+        ev.setdefault("t", time.time())
+        ev["run"] = self._run_id
+        self._events.append(ev)
+        self._cond.notify_all()
+
+    def _worker(self, run_id, name, plan):
+        from macro_engine import run_plan
+
+        def _on_step(i, bid):
+            with self._cond:
+                self._emit({"event": "step", "index": i, "block": bid})
+
+        try:
+            ok = run_plan(plan, lambda: self._stop, backend=self.backend, on_step=_on_step)
+            state, ev = ("done", {"event": "done"}) if ok else ("cancelled", {"event": "cancelled"})
+        except Exception as e:
+            state, ev = "error", {"event": "error", "error": f"{type(e).__name__}: {e}"}
+        with self._cond:
+            self._state = state
+            self._emit(ev)
+
+    def iter_progress(self, timeout: float = 3600.0):
+        """現在の実行の進捗イベントを順に返す（実行終了で止まる）"""
+        i = 0
+        deadline = time.time() + timeout
+        while True:
+            with self._cond:
+                while i >= len(self._events) and self._state == "running":
+                    if not self._cond.wait(timeout=max(0.0, deadline - time.time())):
+                        return
+                batch = self._events[i:]
+                finished = self._state != "running"
+            for ev in batch:
+                yield ev
+            i += len(batch)
+            if finished and i >= len(self._events):
+                return
+
+
+# ==== HTTP ====
+class _Handler(BaseHTTPRequestHandler):
+    service: MacroService = None    # serve() で差し替え
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code: int, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        svc = self.service
+        if self.path == "/macros":
+            self._send(200, {"available": svc.available(), "loaded": sorted(svc.plans)})
+        elif self.path == "/status":
+            self._send(200, svc.status())
+        elif self.path == "/metrics":
+            import metrics
+            body = metrics.registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/progress":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            try:
+                for ev in svc.iter_progress():
+                    self.wfile.write(json.dumps(ev, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        svc = self.service
+        parts = self.path.strip("/").split("/")
+        try:
+            if parts == ["cancel"]:
+                self._send(200, {"cancelled": svc.cancel()})
+            elif len(parts) == 3 and parts[0] == "macros" and parts[2] == "load":
+                self._send(200, {"macro": parts[1], "steps": svc.load(parts[1])})
+            elif len(parts) == 3 and parts[0] == "macros" and parts[2] == "start":
+                self._send(202, {"macro": parts[1], "run": svc.start(parts[1])})
+            else:
+                self._send(404, {"error": "not found"})
+        except KeyError as e:
+            self._send(404, {"error": f"マクロがありません: {e.args[0]}"})
+        except RuntimeError as e:
+            self._send(409, {"error": str(e)})
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+
+
+def serve(service: MacroService, port: int = 8765, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """サーバを生成して返す（port=0 で空きポート）。serve_forever は呼び出し側で"""
+    handler = type("Handler", (_Handler,), {"service": service})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def serve_in_thread(service: MacroService, port: int = 0) -> ThreadingHTTPServer:
+    """バックグラウンドで待受開始（アプリ組込み・ループバック検証用）"""
+    httpd = serve(service, port)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AuterGUI ローカル制御API")
+    ap.add_argument("--dir", default=".", help="マクロ(JSON)のディレクトリ")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--preload", action="store_true", help="起動時に全マクロを読込")
+    ap.add_argument("--watch", action="store_true", help="読込済みマクロのファイル変更を反映（ホットリロード）")
+    args = ap.parse_args(argv)
+
+    svc = MacroService(args.dir, watch=args.watch)
+    if args.preload:
+        for name in svc.available():
+            try:
+                svc.load(name)
+            except (OSError, ValueError) as e:
+                print(f"読込失敗 {name}: {e}")
+    httpd = serve(svc, args.port)
+    print(f"<< 制御API: http://127.0.0.1:{httpd.server_address[1]} >>")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        svc.cancel()
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
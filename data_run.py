@@ -0,0 +1,152 @@
+# data_run.py
+"""
+データ駆動実行：CSV / JSONL の各行をパラメータとしてマクロを繰り返す。
+ブロックの設定値に {列名} を書くと、その行の値に置き換えて実行する。
+    例) key = "{key}",  move_x = "{x}",  move_y = "{y}",  text = "{name} 様"
+パラメータになるのはブロックのアクションが使う欄だけ。文字としての { } は {{ }} と書く。
+
+- マクロは1回だけコンパイルし、行ごとにはパラメータを含むブロックだけ差し替える
+- 行はジェネレータで1行ずつ読む（100万行でもメモリは一定）
+- キャンセル時は次に実行すべき行番号を返す（start_row で再開）
+
+使い方:
+    python data_run.py macro.json rows.csv
+    python data_run.py macro.json rows.jsonl --start-row 1200
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import signal
+
+from macro_engine import (PARAM_RE, default_config, escape_braces, normalize_config, param_names,
+                          template_fields, compile_plan, run_plan, load_macro)
+
+
+class TemplatePlan:
+    """
+    パラメータ入りマクロのコンパイル結果。
+    steps  : 通常のプラン（パラメータ欄は既定値で仮置き）
+    slots  : [(ステップ番号, 欄名, テンプレート文字列), ...]
+    configs: ステップ番号 → 元の設定（行ごとにここから normalize_config し直す）
+    """
+    def __init__(self, steps, slots, configs):
+        self.steps = steps
+        self.slots = slots
+        self.configs = configs
+        self.params = sorted({m for (_, _, tpl) in slots for m in param_names(tpl)})
+        # ステップ番号 → そのステップのスロット
+        self._by_step = {}
+        for (i, field, tpl) in slots:
+            self._by_step.setdefault(i, []).append((field, tpl))
+
+    def bind(self, row: dict) -> list:
+        """行の値を当てはめたプランを返す（パラメータの無いステップは共有）"""
+        plan = list(self.steps)
+        for i, fields in self._by_step.items():
+            bid = self.steps[i][0]
+            bound = dict(self.configs[i])
+            for field, tpl in fields:
+                bound[field] = _substitute(tpl, row)
+            try:
+                plan[i] = (bid, normalize_config(bound))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{bid}: {e}") from None
+        return plan
+
+
+def _substitute(tpl: str, row: dict):
+    # "{x}" だけならその値をそのまま（型変換は normalize_config に任せる）。
+    # 行の値の { } はパラメータと読まれないよう {{ }} にし、{{ }} は normalize_config で戻す
+    m = PARAM_RE.fullmatch(tpl)
+    if m and m.group(1):
+        v = _lookup(row, m.group(1))
+        return escape_braces(v) if isinstance(v, str) else v
+    return PARAM_RE.sub(lambda mm: escape_braces(str(_lookup(row, mm.group(1)))) if mm.group(1) else mm.group(0),
+                        tpl)
+
+
+def _lookup(row: dict, name: str):
+    try:
+        return row[name]
+    except KeyError:
+        raise ValueError(f"列 {name} がありません") from None
+
+
+def compile_template(data: dict) -> TemplatePlan:
+    defaults = default_config()
+    templated = {}      # bid -> [(欄名, テンプレート)]
+    raw = {}            # bid -> 元の設定
+    blocks = {}
+    for bid, b in (data.get("blocks") or {}).items():
+        cfg = dict(b.get("config") or {})
+        raw[bid] = dict(cfg)
+        for k in template_fields(cfg):
+            templated.setdefault(bid, []).append((k, cfg[k]))
+            cfg[k] = defaults.get(k, "")
+        blocks[bid] = dict(b, config=cfg)
+    steps = compile_plan({"blocks": blocks, "connections": data.get("connections") or []})
+    slots = [(i, field, tpl)
+             for i, (bid, _) in enumerate(steps)
+             for (field, tpl) in templated.get(bid, ())]
+    configs = {i: raw[bid] for i, (bid, _) in enumerate(steps) if bid in templated}
+    return TemplatePlan(steps, slots, configs)
+
+
+def iter_rows(path, start: int = 0):
+    """CSV（ヘッダ行あり）/ JSONL を1行ずつ dict で返す。start 行目から"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if ext in (".jsonl", ".ndjson"):
+            lines = (ln for ln in f if ln.strip())
+            for ln in itertools.islice(lines, start, None):
+                row = json.loads(ln)
+                if not isinstance(row, dict):
+                    raise ValueError("JSONL の各行はオブジェクトにしてください")
+                yield row
+        else:
+            yield from itertools.islice(csv.DictReader(f), start, None)
+
+
+def run_rows(tplan: TemplatePlan, rows, stop, backend=None, start: int = 0, on_row=None) -> int:
+    """
+    各行でプランを実行。戻り値は次に実行すべき行番号
+    （全行終われば行数、キャンセル時は途中の行＝再開位置）。
+    """
+    n = start
+    for row in rows:
+        if stop():
+            return n
+        plan = tplan.bind(row)
+        if not run_plan(plan, stop, backend):
+            return n
+        n += 1
+        if on_row:
+            on_row(n, row)
+    return n
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AuterGUI データ駆動実行")
+    ap.add_argument("macro", help="マクロファイル(JSON)")
+    ap.add_argument("rows", help="データ（.csv / .jsonl）")
+    ap.add_argument("--start-row", type=int, default=0, help="この行から再開（0 始まり）")
+    args = ap.parse_args(argv)
+
+    tplan = compile_template(load_macro(args.macro))
+    print(f"パラメータ: {', '.join(tplan.params) or 'なし'}")
+    # Ctrl+C は停止フラグに変換し、実行中の行を区切りよく止める
+    stopped = {"flag": False}
+    signal.signal(signal.SIGINT, lambda *_: stopped.update(flag=True))
+    done = run_rows(tplan, iter_rows(args.rows, args.start_row), lambda: stopped["flag"],
+                    start=args.start_row)
+    if stopped["flag"]:
+        print(f"キャンセルしました。再開するには --start-row {done}")
+        return 1
+    print(f"完了: {done} 行")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
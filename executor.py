@@ -0,0 +1,268 @@
+# executor.py
+"""
+実行専用プロセス（任意）。GUI プロセス内のスレッドで実行すると、Tk の再描画・カーソル点滅・
+キャンバスのドラッグと GIL を取り合い、連打の間隔が乱れる。ここではコンパイル済みプランを
+パイプで子プロセスへ渡し、進捗（ブロック完了・ログ・終了）をパイプで受け取る。
+- 停止は共有メモリの1バイト（RawValue）。子では sleep_until の確認間隔を CANCEL_SLICE に
+  縮めるので、cancel() から送出が止まるまで数 ms 以内
+- Linux では CPU アフィニティ（sched_setaffinity）と優先度（nice / SCHED_FIFO）を設定できる。
+  権限が無い設定は飛ばして、その旨を ready で返す
+- 子の print は行ごとに親へ送り、親の標準出力（＝ログタブ）に流す
+- メトリクスは子プロセス側で数える（親の /metrics には出ない）
+
+有効化（main.py）:
+    AUTERGUI_EXECUTOR=process
+    AUTERGUI_EXECUTOR_CPUS=2,3      # 使う CPU（Linux）
+    AUTERGUI_EXECUTOR_NICE=-5       # nice 値（下げるには権限が必要）
+    AUTERGUI_EXECUTOR_RT=10         # SCHED_FIFO の優先度（Linux・要権限）
+
+単体:
+    python executor.py macro.json --cpus 2 --cancel-after 0.5
+"""
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+
+CANCEL_SLICE = 0.001    # 子プロセスでの停止確認間隔
+POLL = 0.002            # 親の受信待ち（この間隔で stop 参照も見る）
+
+
+# ======================== 優先度 ========================
+def apply_priority(cpus=None, nice=None, rt=None) -> list:
+    """自プロセスへ適用。戻り値は適用結果の説明（失敗も含む）"""
+    notes = []
+    if cpus:
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, set(cpus))
+                notes.append(f"CPU {sorted(os.sched_getaffinity(0))}")
+            except OSError as e:
+                notes.append(f"CPU 指定失敗 ({e})")
+        else:
+            notes.append("CPU 指定はこの OS では使えません")
+    if nice is not None:
+        try:
+            os.nice(int(nice) - os.nice(0))
+            notes.append(f"nice {os.nice(0)}")
+        except (OSError, AttributeError) as e:
+            notes.append(f"nice 変更失敗 ({e})")
+    if rt:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(int(rt)))
+            notes.append(f"SCHED_FIFO {int(rt)}")
+        except (OSError, AttributeError) as e:
+            notes.append(f"SCHED_FIFO 失敗 ({e})")
+    return notes
+
+
+# ======================== 子プロセス ========================
+class _PipeStream:
+    """子の print を行ごとに親へ送る"""
+    def __init__(self, send, err=False):
+        self._send = send
+        self.err = err
+        self._partial = ""
+
+    def write(self, s):
+        lines = (self._partial + s).split("\n")
+        self._partial = lines[-1]
+        for line in lines[:-1]:
+            self._send(("log", line, self.err))
+        return len(s)
+
+    def flush(self):
+        pass
+
+
+def _child(jobs, events, flag, cpus, nice, rt):
+    lock = threading.Lock()     # 待ち条件のスレッドからの print と送信が混ざらないように
+
+    def send(msg):
+        with lock:
+            events.send(msg)
+
+    sys.stdout = _PipeStream(send)
+    sys.stderr = _PipeStream(send, err=True)
+    import utils
+    utils.SLEEP_SLICE = CANCEL_SLICE
+    from macro_engine import run_plan
+
+    send(("ready", os.getpid(), apply_priority(cpus, nice, rt)))
+    stop = lambda: flag.value != 0
+    while True:
+        try:
+            msg = jobs.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        job_id, plan = msg
+        t0 = time.perf_counter()
+        err = None
+        try:
+            ok = run_plan(plan, stop, on_step=lambda i, bid: send(("step", job_id, i, bid)))
+        except Exception as e:
+            ok, err = False, f"{type(e).__name__}: {e}"
+        send(("done", job_id, ok, time.perf_counter() - t0, err))
+
+
+# ======================== 親 ========================
+class Executor:
+    def __init__(self, cpus=None, nice=None, rt=None):
+        ctx = mp.get_context("spawn")   # Tk のスレッドを抱えたまま fork しない
+        self._flag = ctx.RawValue("b", 0)
+        job_r, self._jobs = ctx.Pipe(duplex=False)
+        self._events, ev_w = ctx.Pipe(duplex=False)
+        self.proc = ctx.Process(target=_child, args=(job_r, ev_w, self._flag, cpus, nice, rt),
+                                name="autergui-executor", daemon=True)
+        self.proc.start()
+        job_r.close()
+        ev_w.close()
+        self.pid = None
+        self.notes = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._job = None            # 実行中: {'id', 'on_step', 'on_done', 'stop', 'event', 'result'}
+        self._last = None           # 最後に投入したジョブ（wait 用）
+        self._cancel_at = None
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @classmethod
+    def from_env(cls):
+        cpus = os.environ.get("AUTERGUI_EXECUTOR_CPUS")
+        nice = os.environ.get("AUTERGUI_EXECUTOR_NICE")
+        rt = os.environ.get("AUTERGUI_EXECUTOR_RT")
+        return cls(cpus=[int(c) for c in cpus.split(",") if c.strip()] if cpus else None,
+                   nice=int(nice) if nice else None,
+                   rt=int(rt) if rt else None)
+
+    @property
+    def busy(self) -> bool:
+        return self._job is not None
+
+    def submit(self, plan, stop=None, on_step=None, on_done=None):
+        """
+        プランを子プロセスで実行（すぐ戻る）。実行中なら None。
+        stop: 親側の停止フラグ参照（POLL ごとに見て子へ伝える。ESC は cancel() を直接呼ぶ方が速い）
+        on_step(i, bid) / on_done(結果) は受信スレッドから呼ばれる
+            結果: {'ok', 'elapsed', 'error', 'cancel_latency'}
+        """
+        if not self.proc.is_alive():
+            print("実行プロセスが終了しています")
+            return None
+        with self._lock:
+            if self._job is not None:
+                print("実行中です（ESC で停止してから実行してください）")
+                return None
+            job = {'id': next(self._ids), 'on_step': on_step, 'on_done': on_done, 'stop': stop,
+                   'event': threading.Event(), 'result': None}
+            self._flag.value = 1 if (stop and stop()) else 0
+            self._cancel_at = None
+            self._job = self._last = job
+        self._jobs.send((job['id'], plan))
+        return job['id']
+
+    def cancel(self):
+        if self._flag.value == 0:
+            self._cancel_at = time.perf_counter()
+        self._flag.value = 1
+
+    def wait(self, timeout=None):
+        """最後に投入したジョブの結果を待つ（timeout までに終わらなければ None）"""
+        job = self._last
+        if job is None:
+            return None
+        job['event'].wait(timeout)
+        return job['result']
+
+    def _read(self):
+        while True:
+            try:
+                if not self._events.poll(POLL):
+                    job = self._job
+                    if job and job['stop'] and self._flag.value == 0 and job['stop']():
+                        self.cancel()
+                    continue
+                msg = self._events.recv()
+            except (EOFError, OSError):
+                break
+            kind = msg[0]
+            if kind == "log":
+                print(msg[1], file=sys.stderr if msg[2] else sys.stdout)
+            elif kind == "ready":
+                self.pid, self.notes = msg[1], msg[2]
+                print(f"実行プロセス pid {self.pid}" + (f": {', '.join(self.notes)}" if self.notes else ""))
+            elif kind == "step":
+                job = self._job
+                if job and job['id'] == msg[1] and job['on_step']:
+                    job['on_step'](msg[2], msg[3])
+            elif kind == "done":
+                self._finish(msg[1], {'ok': msg[2], 'elapsed': msg[3], 'error': msg[4]})
+        job = self._job
+        if job is not None:
+            self._finish(job['id'], {'ok': False, 'elapsed': 0.0, 'error': "実行プロセスが終了しました"})
+
+    def _finish(self, job_id, result):
+        with self._lock:
+            job = self._job
+            if job is None or job['id'] != job_id:
+                return
+            self._job = None
+        result['cancel_latency'] = (time.perf_counter() - self._cancel_at) if self._cancel_at else None
+        if result['error']:
+            print("実行エラー:", result['error'])
+        job['result'] = result
+        job['event'].set()
+        if job['on_done']:
+            job['on_done'](result)
+
+    def close(self, timeout: float = 1.0):
+        self.cancel()
+        try:
+            self._jobs.send(None)
+        except (OSError, ValueError):
+            pass
+        self.proc.join(timeout)
+        if self.proc.is_alive():
+            self.proc.terminate()
+
+
+def format_result(res: dict) -> str:
+    s = f"{'完了' if res['ok'] else '停止'} {res['elapsed']:.3f}s"
+    if res.get('cancel_latency') is not None:
+        s += f"（停止まで {res['cancel_latency'] * 1000:.1f}ms）"
+    return s
+
+
+def main(argv=None):
+    import argparse
+    from macro_engine import compile_plan, load_macro
+    ap = argparse.ArgumentParser(description="マクロを実行専用プロセスで実行")
+    ap.add_argument("macro")
+    ap.add_argument("--cpus", default=None, help="使う CPU（例: 2,3。Linux）")
+    ap.add_argument("--nice", type=int, default=None)
+    ap.add_argument("--rt", type=int, default=None, help="SCHED_FIFO の優先度（Linux・要権限）")
+    ap.add_argument("--cancel-after", type=float, default=None, help="指定秒後に停止して停止までの時間を測る")
+    args = ap.parse_args(argv)
+
+    plan = compile_plan(load_macro(args.macro))
+    ex = Executor(cpus=[int(c) for c in args.cpus.split(",")] if args.cpus else None,
+                  nice=args.nice, rt=args.rt)
+    try:
+        ex.submit(plan)
+        res = ex.wait(args.cancel_after)
+        if res is None:
+            ex.cancel()
+            res = ex.wait()
+        print(format_result(res))
+        return 0 if res['ok'] else 1
+    finally:
+        ex.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,477 @@
+# export_script.py
+"""
+マクロを単体の Python スクリプトへ書き出す（トランスパイラ）。
+- グラフ解釈なし：実行順に並べた直線的なコード＋ループ
+- import するのは送出バックエンド（pyautogui）と標準ライブラリの time / os だけ
+- 繰り返しの期限計算・移動軌道の係数・記録再生のイベント時刻は書き出し時に計算して埋め込む
+- 生成物は差分を取りやすいよう決定的（同じマクロなら同じ出力）
+
+長押しはエンジンと同じく解放の送出コスト分だけ早く離す。コストは書き出し時の計測値
+（calibration。未計測なら 0）を埋め込むので、計測し直すと出力も変わる。
+
+verify() はエンジンと生成スクリプトを同じ記録用バックエンドで実行し、
+イベント列（種類・引数・時刻）が一致することを確かめる。実時間ではなく仮想時計で実行するので
+結果は決定的（sleep は即座に時刻を進めるだけ）。
+
+使い方:
+    python export_script.py macro.json -o macro_run.py
+    python export_script.py macro.json --verify           # 往復チェックのみ
+"""
+import argparse
+import contextlib
+import os
+import time
+
+import calibration
+import motion
+import scheduler
+import text_input
+import wait_reactor
+from macro_engine import CLICK_ACTIONS, compile_plan, load_macro, run_plan
+
+MAX_TRACE_EVENTS = 200000
+VERIFY_TOLERANCE = 0.001    # 仮想時計での間隔の差の許容（時刻の読み出し回数の違いの分）
+VIRTUAL_TICK = 1e-6         # 仮想時計で時刻を1回読むごとに進める量
+
+# 生成スクリプトに埋め込む実行時ヘルパ（エンジンの scheduler / motion / trace_format と同じ期限計算）
+_RUNTIME = '''
+def _sleep_until(deadline, stop, spin=0.001):
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        if stop():
+            return True
+        if remaining > spin:
+            time.sleep(min(remaining - spin, 0.01))
+
+
+def _release_modifiers(inj):
+    for k in ("shift", "option", "alt"):
+        try:
+            inj.keyUp(k)
+        except Exception:
+            pass
+
+
+def _repeat(count, interval, fire, stop, policy):
+    base = time.perf_counter()
+    slot = 0
+    for n in range(count):
+        if n:
+            deadline = base + slot * interval
+            now = time.perf_counter()
+            if now > deadline and interval > 0:
+                if policy == "スキップ":
+                    slot += int((now - deadline) / interval) + 1
+                    deadline = base + slot * interval
+                elif policy in ("延長", "適応"):    # 適応の送達確認は書き出さない（遅れたらずらす）
+                    base, slot = now, 0
+                    deadline = now
+            if _sleep_until(deadline, stop):
+                return True
+        elif stop():
+            return True
+        fire()
+        slot += 1
+    return _sleep_until(base + slot * interval, stop)
+
+
+def _glide(inj, tx, ty, relative, rate, coeffs, jitter, stop):
+    sx, sy = inj.position()
+    if relative:
+        tx, ty = sx + tx, sy + ty
+    dx, dy = tx - sx, ty - sy
+    period = 1.0 / rate
+    spin = min(0.001, period / 4)
+    n = len(coeffs)
+    last = None
+    t0 = time.perf_counter()
+    for i, (u, v) in enumerate(coeffs):
+        if i == n - 1:
+            p = (int(tx), int(ty))
+        else:
+            jx, jy = jitter[i] if jitter else (0.0, 0.0)
+            p = (int(round(sx + u * dx - v * dy + jx)), int(round(sy + u * dy + v * dx + jy)))
+        if _sleep_until(t0 + (i + 1) * period, stop, spin):
+            return True
+        if p != last:
+            inj.moveTo(p[0], p[1], _pause=False)
+            last = p
+    return False
+
+
+def _play(inj, events, stop):
+    t0 = time.perf_counter()
+    for (dt, kind, button, x, y, arg) in events:
+        if _sleep_until(t0 + dt, stop):
+            return True
+        if kind == "move":
+            inj.moveTo(x, y, _pause=False)
+        elif kind == "down":
+            inj.mouseDown(x, y, button=button, _pause=False)
+        elif kind == "up":
+            inj.mouseUp(x, y, button=button, _pause=False)
+        elif kind == "scroll":
+            inj.scroll(arg, x, y, _pause=False)
+        elif kind == "key_down":
+            inj.keyDown(arg, _pause=False)
+        elif kind == "key_up":
+            inj.keyUp(arg, _pause=False)
+    return False
+
+
+def _type(inj, parts, interval, stop):
+    t0 = time.perf_counter()
+    for i, part in enumerate(parts):
+        if interval > 0 and i:
+            if _sleep_until(t0 + i * interval, stop):
+                return True
+        elif stop():
+            return True
+        inj.write(part)
+    return False
+
+
+def _wait(check, timeout, stop, interval=0.005):
+    deadline = time.perf_counter() + timeout if timeout > 0 else None
+    while True:
+        if stop():
+            return None
+        if check():
+            return True
+        if deadline is None:
+            time.sleep(interval)
+        else:
+            now = time.perf_counter()
+            if now >= deadline:
+                return False
+            time.sleep(min(interval, deadline - now))
+
+
+def _pixel(inj, x, y):
+    return inj.screenshot(region=(x, y, 1, 1)).getpixel((0, 0))[:3]
+
+
+def _close(a, b, tol):
+    return all(abs(int(p) - int(q)) <= tol for p, q in zip(a, b))
+'''
+
+
+def _trace_events(path, speed):
+    """記録ファイルを (経過秒, 種類, ボタン, x, y, 引数) の列へ（再生倍率は適用済み）"""
+    import trace_format as tf
+    kinds = {tf.MOVE: "move", tf.DOWN: "down", tf.UP: "up", tf.SCROLL: "scroll",
+             tf.KEY_DOWN: "key_down", tf.KEY_UP: "key_up"}
+    speed = max(0.01, float(speed))
+    out = []
+    with tf.TraceReader(path) as r:
+        if len(r) > MAX_TRACE_EVENTS:
+            raise ValueError(f"記録が大きすぎます（{len(r)} 件 > {MAX_TRACE_EVENTS}）: {path}")
+        if not len(r):
+            return out
+        t_base = r.record(0)[0]
+        for (t, kind, button, x, y, code) in r.iter_from(0):
+            name = kinds.get(kind)
+            if name is None:
+                continue
+            arg = code if kind == tf.SCROLL else (r.key_name(code) if name.startswith("key") else None)
+            if name.startswith("key") and not arg:
+                continue
+            out.append((round((t - t_base) / speed, 6), name, tf._BUTTON_NAMES.get(button, "left"), x, y, arg))
+    return out
+
+
+def _emit_block(bid, cfg, w, backend=None):
+    """
+    1ブロック分のコード行を w(行) で出力。ブロック途中で停止したら run() から False を返す。
+    backend: 長押しの解放コストを引く送出バックエンド（None は pyautogui）
+    """
+    act = cfg.get('action', "左クリック")
+    w(f"# {bid}: {act}")
+    w("_release_modifiers(inj)")
+    w("if stop():")
+    w("    return False")
+
+    if act in CLICK_ACTIONS or act == "キー入力":
+        press = cfg.get('press_type', "短押し")
+        if press == "短押し":
+            count, itv = cfg.get('repeat_count', 1), cfg.get('repeat_interval', 0.5)
+            policy = cfg.get('overrun_policy', scheduler.DEFAULT_POLICY)
+            if act == "キー入力":
+                fire = f"lambda: inj.press({cfg.get('key', 'enter')!r})"
+            else:
+                w("x, y = inj.position()")
+                meth = {"左クリック": "click", "右クリック": "rightClick", "ダブルクリック": "doubleClick"}[act]
+                fire = f"lambda: inj.{meth}(x, y)"
+            w(f"if _repeat({count!r}, {itv!r}, {fire}, stop, {policy!r}):")
+            w("    return False")
+        else:
+            secs = cfg.get('seconds', 1.0)
+            if act == "キー入力":
+                down, up = f"inj.keyDown({cfg.get('key', 'enter')!r})", f"inj.keyUp({cfg.get('key', 'enter')!r})"
+                release = calibration.cost("key_up", backend)
+            else:
+                w("x, y = inj.position()")
+                w("inj.moveTo(x, y)")
+                down, up = "inj.mouseDown()", "inj.mouseUp()"
+                release = calibration.cost("mouse_up", backend)
+            w(down)
+            # エンジンと同じく、解放の送出コスト分だけ早く離す
+            w(f"held = _sleep_until(time.perf_counter() + {secs!r} - {round(release, 6)!r}, stop)")
+            w(up)
+            w("if held:")
+            w("    return False")
+
+    elif act == "文字入力":
+        text = cfg.get('text', '')
+        method = text_input.resolve_method(text, cfg.get('text_method', text_input.DEFAULT_METHOD))
+        if method == "貼り付け":
+            # クリップボードは送出バックエンドの外なので書き出さない
+            raise ValueError(f"{bid}: 文字入力「貼り付け」はスクリプト出力に未対応です（1文字ずつ / 一括入力を指定してください）")
+        if method == "1文字ずつ":
+            parts, itv = list(text), float(cfg.get('text_interval', 0.0))
+        else:
+            parts, itv = [text[i:i + text_input.CHUNK] for i in range(0, len(text), text_input.CHUNK)], 0.0
+        w(f"if _type(inj, {parts!r}, {itv!r}, stop):")
+        w("    return False")
+
+    elif act == "マウス移動":
+        relative = cfg.get('move_mode', '絶対座標') != "絶対座標"
+        x, y = int(cfg.get('move_x', 0)), int(cfg.get('move_y', 0))
+        dur = float(cfg.get('move_time', 0.0))
+        if dur <= 0:
+            w(f"inj.{'moveRel' if relative else 'moveTo'}({x}, {y})")
+        else:
+            rate = min(motion.MAX_RATE, max(motion.MIN_RATE, float(cfg.get('move_rate', motion.DEFAULT_RATE))))
+            n = motion.point_count(dur, rate)
+            # 係数は丸めない（丸めると座標の四捨五入が境目でエンジンと1ずれる）
+            coeffs = [(u, v) for u, v in motion.path_coefficients(n, cfg.get('move_curve', '直線'))]
+            jitter = float(cfg.get('move_jitter', 0.0))
+            # 揺らぎは書き出し時に固定（スクリプトは毎回同じ軌道になる）
+            jit = [(round(a, 3), round(b, 3)) for a, b in motion.jitter_offsets(n, jitter, seed=bid)] if jitter > 0 else None
+            w(f"if _glide(inj, {x}, {y}, {relative}, {rate!r}, {coeffs!r}, {jit!r}, stop):")
+            w("    return False")
+
+    elif act == "記録再生":
+        path = cfg.get('trace_path')
+        if not path:
+            w("# 記録ファイル未指定（何もしない）")
+        else:
+            events = _trace_events(path, cfg.get('trace_speed', 1.0))
+            w(f"# {os.path.basename(path)}: {len(events)} events")
+            w(f"if _play(inj, {events!r}, stop):")
+            w("    return False")
+
+    elif act == "条件待ち":
+        kind = cfg.get('wait_kind', "時間経過")
+        timeout = float(cfg.get('wait_timeout', 0.0))
+        if kind == "時間経過":
+            w(f"if _sleep_until(time.perf_counter() + {max(0.0, timeout)!r}, stop):")
+            w("    return False")
+        else:
+            if kind == "色一致":
+                from wait_reactor import parse_color
+                rgb = parse_color(cfg.get('wait_color', '#000000'))
+                x, y, tol = int(cfg.get('wait_x', 0)), int(cfg.get('wait_y', 0)), int(cfg.get('wait_tolerance', 0))
+                check = f"lambda: _close(_pixel(inj, {x}, {y}), {rgb!r}, {tol})"
+            elif kind == "色変化":
+                x, y, tol = int(cfg.get('wait_x', 0)), int(cfg.get('wait_y', 0)), int(cfg.get('wait_tolerance', 0))
+                w(f"ref = _pixel(inj, {x}, {y})")
+                check = f"lambda: not _close(_pixel(inj, {x}, {y}), ref, {tol})"
+            elif kind == "ファイル出現":
+                check = f"lambda: os.path.exists({os.path.expanduser(str(cfg.get('wait_path', '')))!r})"
+            else:
+                raise ValueError(f"{bid}: 条件待ち「{kind}」はスクリプト出力に未対応です")
+            w(f"if _wait({check}, {timeout!r}, stop) is None:")
+            w("    return False")
+    w("")
+
+
+def export(data: dict, source: str = "", backend=None) -> str:
+    """マクロ(dict) → スクリプトのソース文字列"""
+    plan = compile_plan(data)
+    lines = []
+    body = []
+
+    def w(line):
+        body.append("    " + line if line else "")
+
+    for bid, cfg in plan:
+        _emit_block(bid, cfg, w, backend)
+
+    lines.append("#!/usr/bin/env python3")
+    lines.append(f"# AuterGUI から書き出したマクロ{f'（{os.path.basename(source)}）' if source else ''}。編集は元のマクロで行ってください。")
+    lines.append("# 実行中は Ctrl+C で停止します。")
+    lines.append("import os")
+    lines.append("import time")
+    lines.append(_RUNTIME)
+    lines.append("")
+    lines.append("def run(inj, stop=lambda: False):")
+    lines.append(f'    """{len(plan)} ブロック。最後まで実行したら True"""')
+    lines.extend(body or ["    pass"])
+    lines.append("    return not stop()")
+    lines.append("")
+    lines.append("")
+    lines.append("def main():")
+    lines.append("    import pyautogui")
+    lines.append("    pyautogui.PAUSE = 0.0")
+    lines.append("    try:")
+    lines.append("        return 0 if run(pyautogui) else 1")
+    lines.append("    except KeyboardInterrupt:")
+    lines.append("        return 1")
+    lines.append("")
+    lines.append("")
+    lines.append('if __name__ == "__main__":')
+    lines.append("    raise SystemExit(main())")
+    return "\n".join(lines) + "\n"
+
+
+# ======================== 往復チェック ========================
+class _Recorder:
+    """送出を (時刻, 名前, 引数) で記録するだけのバックエンド"""
+    def __init__(self):
+        self.log = []
+        self.pos = [100, 100]
+        self.t0 = time.perf_counter()
+
+    def _rec(self, name, args):
+        self.log.append((time.perf_counter() - self.t0, name, tuple(args)))
+
+    def position(self):
+        return tuple(self.pos)
+
+    def moveTo(self, x=None, y=None, *a, **k):
+        self.pos = [x, y]
+        self._rec("moveTo", (x, y))
+
+    def moveRel(self, x=0, y=0, *a, **k):
+        self.pos = [self.pos[0] + x, self.pos[1] + y]
+        self._rec("moveRel", (x, y))
+
+    def click(self, *a, **k):
+        self._rec("click", a)
+
+    def rightClick(self, *a, **k):
+        self._rec("rightClick", a)
+
+    def doubleClick(self, *a, **k):
+        self._rec("doubleClick", a)
+
+    def press(self, *a, **k):
+        self._rec("press", a)
+
+    def write(self, *a, **k):
+        self._rec("write", a)
+
+    def keyDown(self, *a, **k):
+        self._rec("keyDown", a)
+
+    def keyUp(self, *a, **k):
+        self._rec("keyUp", a)
+
+    def mouseDown(self, *a, **k):
+        self._rec("mouseDown", a + tuple(sorted(k.items())))
+
+    def mouseUp(self, *a, **k):
+        self._rec("mouseUp", a + tuple(sorted(k.items())))
+
+    def scroll(self, *a, **k):
+        self._rec("scroll", a)
+
+
+class _VirtualClock:
+    """sleep は即座に時刻を進めるだけ。読み出しごとに VIRTUAL_TICK 進める（ビジーウェイトが終わるように）"""
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        self.now += VIRTUAL_TICK
+        return self.now
+
+    def sleep(self, secs):
+        self.now += max(0.0, secs)
+
+
+@contextlib.contextmanager
+def _virtual_time():
+    """
+    time.perf_counter / time.time / time.sleep を仮想時計に差し替え、条件待ちを呼び出しスレッドで処理する。
+    プロセス全体の time を差し替えるので、他のスレッドが時刻を使っている間は使わない
+    """
+    clock = _VirtualClock()
+    saved = (time.perf_counter, time.time, time.sleep, wait_reactor.reactor)
+    time.perf_counter = time.time = clock.perf_counter
+    time.sleep = clock.sleep
+    wait_reactor.reactor = wait_reactor.InlineReactor()
+    try:
+        yield clock
+    finally:
+        time.perf_counter, time.time, time.sleep, wait_reactor.reactor = saved
+
+
+def verify(data: dict, tolerance: float = VERIFY_TOLERANCE) -> dict:
+    """
+    エンジンと生成スクリプトを仮想時計で実行してイベント列を比べる。
+    種類・引数が全件一致し、各イベントの直前からの間隔の差が tolerance 秒以内なら ok。
+    （揺らぎ付きの移動は乱数が異なるため、その座標は比べない）
+    """
+    src = export(data, backend=_Recorder())
+    ns = {"__name__": "autergui_export"}
+    exec(compile(src, "<export>", "exec"), ns)
+
+    with _virtual_time():
+        a = _Recorder()
+        run_plan(compile_plan(data), lambda: False, backend=a)
+        b = _Recorder()
+        ns["run"](b)
+
+    loose_moves = any(float((blk.get("config") or {}).get("move_jitter", 0) or 0) > 0
+                      for blk in (data.get("blocks") or {}).values())
+    mismatches = []
+    skew = 0.0      # 直前のイベントからの間隔の差（実行ごとの sleep のばらつきが積み上がらない）
+    if len(a.log) != len(b.log):
+        mismatches.append(f"イベント数が違います: エンジン {len(a.log)} / スクリプト {len(b.log)}")
+    pa = pb = 0.0
+    for i, ((ta, na, aa), (tb, nb, ab)) in enumerate(zip(a.log, b.log)):
+        if na != nb or (aa != ab and not (loose_moves and na == "moveTo")):
+            mismatches.append(f"#{i}: {na}{aa} != {nb}{ab}")
+        skew = max(skew, abs((ta - pa) - (tb - pb)))
+        pa, pb = ta, tb
+    if skew > tolerance:
+        mismatches.append(f"間隔の差 {skew * 1000:.2f}ms > {tolerance * 1000:.2f}ms")
+    end_skew = (a.log[-1][0] - b.log[-1][0]) if a.log and b.log else 0.0
+    return {"ok": not mismatches, "events": len(a.log), "max_skew": skew, "end_skew": end_skew,
+            "mismatches": mismatches[:10]}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="AuterGUI マクロを単体スクリプトへ書き出す")
+    ap.add_argument("macro", help="マクロファイル(JSON)")
+    ap.add_argument("-o", "--output", default=None, help="出力先（省略時は標準出力）")
+    ap.add_argument("--verify", action="store_true", help="エンジンとのイベント列の一致を確認")
+    ap.add_argument("--tolerance", type=float, default=VERIFY_TOLERANCE, help="許容する間隔の差（秒）")
+    args = ap.parse_args(argv)
+
+    data = load_macro(args.macro)
+    if args.verify:
+        res = verify(data, args.tolerance)
+        print(f"{'一致' if res['ok'] else '不一致'}: {res['events']} イベント, "
+              f"間隔の最大差 {res['max_skew'] * 1000:.2f}ms, 終了時刻の差 {res['end_skew'] * 1000:+.2f}ms")
+        for m in res["mismatches"]:
+            print("  ", m)
+        return 0 if res["ok"] else 1
+
+    src = export(data, args.macro)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(src)
+        os.chmod(args.output, 0o755)
+        print(f"書き出しました: {args.output}")
+    else:
+        print(src, end="")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+# hot_reload.py
+"""
+マクロファイルのホットリロード（差分だけ再コンパイル）
+- FileWatcher     : 更新時刻・サイズをポーリング。書き込み途中を拾わないよう、
+                    変化後に1周期安定してから読み込む（読めなければ次の周期で再試行）
+- diff_macro      : 保存形式(dict)2つの差分（ブロック追加/削除/設定変更/移動、接続の追加/削除、並び順）
+- IncrementalPlan : ブロックごとの正規化済み設定を保持し、変わったブロックだけ正規化し直す。
+                    ブロックの並び・接続の並びが変わったときだけ実行順を計算し直す
+                    （実行順は分岐先を接続順・入口をブロック順に辿るので、並び替えだけでも変わる）
+- ReloadingPlan   : ファイル監視 + IncrementalPlan。実行側は run の開始時に current() を取る
+                    （実行中の run は古いプランのまま最後まで進み、次の run の境界で切り替わる）
+
+使い方:
+    rp = ReloadingPlan("macro.json").start()
+    while True:
+        run_plan(rp.current(), stop)
+
+単体（監視して差分を表示。--check で毎回 compile_plan の結果と照合）:
+    python hot_reload.py macro.json --check
+"""
+import os
+import threading
+import time
+
+from macro_engine import compile_plan, execution_order, load_macro, normalize_config
+
+WATCH_INTERVAL = 0.5
+
+
+# ======================== 差分 ========================
+def _conn_list(data: dict) -> list:
+    return [(c[0], c[1]) for c in data.get("connections") or []]
+
+
+def diff_macro(old: dict, new: dict) -> dict:
+    """
+    戻り値: {'added': {bid}, 'removed': {bid}, 'changed': {bid}, 'moved': {bid},
+             'conns_added': {(f, t)}, 'conns_removed': {(f, t)},
+             'order': 共通のブロック・接続の並び順が変わったか}
+    """
+    ob, nb = old.get("blocks") or {}, new.get("blocks") or {}
+    common = ob.keys() & nb.keys()
+    ocl, ncl = _conn_list(old), _conn_list(new)
+    oc, nc = set(ocl), set(ncl)
+    order = ([b for b in ob if b in nb] != [b for b in nb if b in ob]
+             or [c for c in ocl if c in nc] != [c for c in ncl if c in oc])
+    return {
+        'added': set(nb.keys() - ob.keys()),
+        'removed': set(ob.keys() - nb.keys()),
+        'changed': {b for b in common if (ob[b].get("config") or {}) != (nb[b].get("config") or {})},
+        'moved': {b for b in common if (ob[b].get("x"), ob[b].get("y")) != (nb[b].get("x"), nb[b].get("y"))},
+        'conns_added': nc - oc,
+        'conns_removed': oc - nc,
+        'order': order,
+    }
+
+
+def is_empty(diff: dict) -> bool:
+    return not any(diff.values())
+
+
+def format_diff(diff: dict) -> str:
+    parts = [f"{name} {len(diff[key])}" for key, name in (
+        ('added', "追加"), ('removed', "削除"), ('changed', "設定変更"), ('moved', "移動"),
+        ('conns_added', "接続追加"), ('conns_removed', "接続削除")) if diff[key]]
+    if diff['order']:
+        parts.append("並び替え")
+    return ", ".join(parts) or "変更なし"
+
+
+# ======================== 差分コンパイル ========================
+class IncrementalPlan:
+    """compile_plan と同じプランを、差分のブロック・接続だけ処理して更新する"""
+    def __init__(self, data: dict):
+        self.data = {"blocks": {}, "connections": []}
+        self._steps = {}        # bid -> (bid, 正規化済みconfig)
+        self._inputs = None     # 実行順の入力（ブロックの並び, 接続の並び）
+        self._order = []
+        self.plan = []
+        self.update(data)
+
+    def update(self, data: dict):
+        """
+        data に追従する。不正なブロックがあれば ValueError（状態は変えない）。
+        戻り値: (差分, {'recompiled': 正規化したブロック数, 'reordered': 実行順を計算し直したか})
+        """
+        diff = diff_macro(self.data, data)
+        blocks = data.get("blocks") or {}
+        fresh = {}
+        for bid in diff['added'] | diff['changed']:
+            try:
+                fresh[bid] = (bid, normalize_config(blocks[bid].get("config")))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"{bid}: {e}") from None
+
+        for bid in diff['removed']:
+            self._steps.pop(bid, None)
+        self._steps.update(fresh)
+        inputs = (list(blocks), [c for c in _conn_list(data) if c[0] in blocks and c[1] in blocks])
+        reordered = inputs != self._inputs
+        if reordered:
+            self._inputs = inputs
+            self._order = execution_order(*inputs)
+        self.data = data
+        self.plan = [self._steps[bid] for bid in self._order]
+        return diff, {'recompiled': len(fresh), 'reordered': reordered}
+
+    def check(self):
+        """全体を compile_plan し直した結果と一致するか確かめる（不一致なら ValueError）"""
+        full = compile_plan(self.data)
+        if full != self.plan:
+            raise ValueError(f"差分コンパイルの結果が compile_plan と一致しません: "
+                             f"{[b for b, _ in self.plan]} != {[b for b, _ in full]}")
+
+
+# ======================== ファイル監視 ========================
+class FileWatcher:
+    """
+    path の変更を検知して読み込む。poll() を自分で呼ぶ（GUI の after ループ等）か、
+    start() で監視スレッドを立てて on_change(旧dict, 新dict) を受け取る。
+    """
+    def __init__(self, path, on_change=None, interval: float = WATCH_INTERVAL, data=None):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.interval = interval
+        self.data = data if data is not None else load_macro(self.path)
+        self._sig = self._stat()
+        self._pending = None        # 変化を見つけた直後の stat（次の周期で安定を確認）
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def sync(self, data=None):
+        """自分で書いた内容を既知として扱う（保存直後に呼ぶと自分の保存を通知しない）"""
+        self._sig = self._stat()
+        self._pending = None
+        if data is not None:
+            self.data = data
+
+    def poll(self):
+        """変更があれば (旧dict, 新dict) を返す。無ければ None"""
+        sig = self._stat()
+        if sig is None or sig == self._sig:
+            self._pending = None
+            return None
+        if sig != self._pending:
+            self._pending = sig     # まだ書き込み中かもしれない
+            return None
+        try:
+            data = load_macro(self.path)
+        except (OSError, ValueError):
+            return None             # 壊れた途中状態。次の変化を待つ
+        self._sig, self._pending = sig, None
+        old, self.data = self.data, data
+        return old, data
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            changed = self.poll()
+            if changed and self.on_change:
+                try:
+                    self.on_change(*changed)
+                except Exception as e:
+                    print(f"ホットリロード失敗 {os.path.basename(self.path)}: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+class ReloadingPlan:
+    """ファイル変更に追従するプラン。current() はその時点の最新プラン（リスト）を返す"""
+    def __init__(self, path, interval: float = WATCH_INTERVAL, on_reload=None, check: bool = False):
+        data = load_macro(path)
+        self.path = os.path.abspath(path)
+        self.on_reload = on_reload
+        self.check = check
+        self.version = 0
+        self._inc = IncrementalPlan(data)
+        self._lock = threading.Lock()
+        self.watcher = FileWatcher(path, self._on_change, interval, data=data)
+
+    def _on_change(self, old, new):
+        with self._lock:
+            try:
+                diff, st = self._inc.update(new)
+            except ValueError as e:
+                print(f"ホットリロード: {os.path.basename(self.path)} は不正なため前のプランのまま ({e})")
+                return
+            if is_empty(diff):
+                return
+            self.version += 1
+        print(f"ホットリロード: {os.path.basename(self.path)} v{self.version} "
+              f"({format_diff(diff)} / 再コンパイル {st['recompiled']} ブロック"
+              f"{', 実行順を再計算' if st['reordered'] else ''})")
+        if self.check:
+            with self._lock:
+                self._inc.check()   # 不一致は監視ループが表示する
+        if self.on_reload:
+            self.on_reload(self)
+
+    def current(self) -> list:
+        with self._lock:
+            return self._inc.plan
+
+    def start(self):
+        self.watcher.start()
+        return self
+
+    def stop(self):
+        self.watcher.stop()
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="マクロファイルを監視して差分コンパイル")
+    ap.add_argument("macro")
+    ap.add_argument("--interval", type=float, default=WATCH_INTERVAL)
+    ap.add_argument("--check", action="store_true", help="更新のたびに compile_plan の結果と照合")
+    args = ap.parse_args(argv)
+
+    rp = ReloadingPlan(args.macro, args.interval, check=args.check)
+    if args.check:
+        rp._inc.check()
+    print(f"<< 監視中: {rp.path}（Ctrl+C で終了） >>")
+    rp.start()
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rp.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -66,6 +66,10 @@ class HotkeyManager:
         def stop(self):
             self._mac_thread = None
 
+        def disarm(self):
+            """起動キーだけ外す（mac の ESC は実行側が Quartz で直接見る）"""
+            self.stop()
+
     # ==== Win/Linux: pynput ====
     else:
         try:
@@ -86,6 +90,14 @@ class HotkeyManager:
             self._listener.start()
             print("<< Alt+Shift を押すと実行開始します。ESC で途中キャンセル >>")
 
+        def disarm(self):
+            """起動キーだけ外し、ESC は実行中も受け付ける（誤発火防止）"""
+            if self.pk is None:
+                return
+            self.stop()
+            self._listener = self.pk.GlobalHotKeys({'<esc>': self.on_esc})
+            self._listener.start()
+
         def stop(self):
             if self._listener:
                 try:
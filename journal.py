@@ -0,0 +1,204 @@
+# journal.py
+"""
+マクロエディタの自動保存（追記型ジャーナル）
+編集のたびにマクロ全体を書き直すのではなく、1操作 = 1行(JSON) を追記する。
+    add      ブロック追加     {"op": "add", "bid", "x", "y", "config"}
+    move     移動             {"op": "move", "pos": {bid: [x, y], ...}}
+    config   設定変更         {"op": "config", "bid", "config"}
+    connect  接続             {"op": "connect", "from", "to"}
+    delete   削除             {"op": "delete", "bids": [...]}
+
+- 追記はバッファに書くだけ。fsync はバックグラウンドで sync_interval ごとにまとめて行う
+- 一定件数たまったらスナップショット（全体）を書き、ジャーナルを空にする（コンパクション）
+- スナップショットに未保存の編集が含まれるときは journal_dirty を付ける（ジャーナルが空でも復旧対象）
+- 復旧はスナップショット + ジャーナルの再生。途中で切れた最終行は捨てる
+
+保存先は ~/.autergui/autosave（ファイルごとに別名）
+"""
+import hashlib
+import json
+import os
+import threading
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".autergui", "autosave")
+SYNC_INTERVAL = 0.5
+COMPACT_EVERY = 2000
+
+
+def apply_op(data: dict, op: dict):
+    """保存形式(dict)に1操作を適用（その場で書き換える）"""
+    blocks = data.setdefault("blocks", {})
+    kind = op.get("op")
+    if kind == "add":
+        blocks[op["bid"]] = {"x": op["x"], "y": op["y"], "config": dict(op["config"])}
+    elif kind == "move":
+        for bid, (x, y) in op["pos"].items():
+            if bid in blocks:
+                blocks[bid]["x"], blocks[bid]["y"] = x, y
+    elif kind == "config":
+        if op["bid"] in blocks:
+            blocks[op["bid"]]["config"] = dict(op["config"])
+    elif kind == "connect":
+        data.setdefault("connections", []).append([op["from"], op["to"]])
+    elif kind == "delete":
+        doomed = set(op["bids"])
+        for bid in doomed:
+            blocks.pop(bid, None)
+        data["connections"] = [c for c in data.get("connections") or []
+                               if c[0] not in doomed and c[1] not in doomed]
+    else:
+        raise ValueError(f"不明な操作: {kind}")
+
+
+class Journal:
+    def __init__(self, source=None, directory=None,
+                 sync_interval: float = SYNC_INTERVAL, compact_every: int = COMPACT_EVERY):
+        """source: 編集中のマクロファイル（None は未保存の新規）"""
+        self.source = os.path.abspath(source) if source else None
+        directory = directory or DEFAULT_DIR
+        name = hashlib.sha1(self.source.encode("utf-8")).hexdigest()[:16] if self.source else "untitled"
+        self.snap_path = os.path.join(directory, name + ".snap.json")
+        self.log_path = os.path.join(directory, name + ".journal")
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.ops = 0                # 最後のコンパクション以降の操作数
+        self._f = None
+        self._dirty = False
+        self._snap_dirty = False    # 今のスナップショットが未保存の編集を含むか
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._syncer = None
+
+    # ==== 状態 ====
+    def pending(self) -> bool:
+        """前回の未保存の編集（復旧対象）が残っているか"""
+        try:
+            if os.path.getsize(self.log_path) > 0:
+                return True
+        except OSError:
+            pass
+        try:
+            with open(self.snap_path, "r", encoding="utf-8") as f:
+                return bool(json.load(f).get("journal_dirty"))
+        except (OSError, ValueError, AttributeError):
+            return False
+
+    @property
+    def unsaved(self) -> bool:
+        """保存済みファイルに無い編集がある（スナップショットかジャーナルに）"""
+        return self._snap_dirty or self.ops > 0
+
+    def recover(self):
+        """スナップショット + ジャーナルを再生した dict。無ければ None"""
+        try:
+            with open(self.snap_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {"blocks": {}, "connections": []}
+        except (OSError, ValueError) as e:
+            print("自動保存のスナップショットが読めません:", e)
+            return None
+        data.pop("journal_source", None)
+        data.pop("journal_dirty", None)
+        try:
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            lines = []
+        for i, ln in enumerate(lines):
+            try:
+                apply_op(data, json.loads(ln))
+            except (ValueError, KeyError, TypeError):
+                if i == len(lines) - 1:
+                    break       # 書き込み途中で落ちた最終行
+                print(f"自動保存の {i + 1} 行目を読み飛ばしました")
+        return data
+
+    # ==== 書き込み ====
+    def start(self, data: dict, dirty: bool = False):
+        """
+        現在の内容を基準（スナップショット）にしてジャーナルを空から始める。
+        dirty: data が保存済みファイルと違う（復旧した内容など）
+        """
+        os.makedirs(os.path.dirname(self.snap_path), exist_ok=True)
+        snap = dict(data, journal_source=self.source, journal_dirty=bool(dirty))
+        tmp = self.snap_path + ".tmp"
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snap_path)
+            if self._f:
+                self._f.close()
+            self._f = open(self.log_path, "w", encoding="utf-8")
+            self._dirty = False
+            self._snap_dirty = bool(dirty)
+            self.ops = 0
+        if self._syncer is None:
+            self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+            self._syncer.start()
+
+    def compact(self, data: dict):
+        """ジャーナルをスナップショットへ畳む。未保存の編集があればスナップショットに印を残す"""
+        self.start(data, dirty=self.unsaved)
+
+    def append(self, op: dict):
+        line = json.dumps(op, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._f is None:
+                return
+            self._f.write(line)
+            self._dirty = True
+            self.ops += 1
+
+    def needs_compaction(self) -> bool:
+        return self.ops >= self.compact_every
+
+    def sync(self):
+        # flush だけロック内で行い、時間のかかる fsync 中も追記（UI 側）を止めない
+        with self._lock:
+            if self._f is None or not self._dirty:
+                return
+            self._dirty = False
+            try:
+                self._f.flush()
+                fd = os.dup(self._f.fileno())
+            except OSError as e:
+                print("自動保存の書き込み失敗:", e)
+                return
+        try:
+            os.fsync(fd)
+        except OSError as e:
+            print("自動保存の書き込み失敗:", e)
+        finally:
+            os.close(fd)
+
+    def _sync_loop(self):
+        while not self._closed:
+            self._wake.wait(self.sync_interval)
+            self.sync()
+
+    def discard(self):
+        """自動保存ファイルを消す（明示保存・復旧しない選択のあと）"""
+        with self._lock:
+            if self._f:
+                self._f.close()
+                self._f = None
+            for p in (self.log_path, self.snap_path):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            self.ops = 0
+            self._snap_dirty = False
+
+    def close(self):
+        self.sync()
+        self._closed = True
+        self._wake.set()
+        with self._lock:
+            if self._f:
+                self._f.close()
+                self._f = None
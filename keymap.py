@@ -0,0 +1,265 @@
+# keymap.py
+"""
+キー名の事前解決と検索。
+- resolve    : キー名 → バックエンドのキーコード [code, shift]（shift は添える Shift のコード、
+               不要なら -1）。normalize_config で解決してプランに入れ、実行時はブロックごとに
+               confirm で照合するだけ。pyautogui の platformModule.keyboardMapping を使う
+- KeySender  : 解決済みコードで直接送出する。pag.press は毎回、名前の小文字化・表引き・
+               フェイルセーフ確認（マウス位置の問い合わせ）を行い、X11 では1イベントごとに sync する。
+               ここでは1回の押下を1回の sync にまとめ、フェイルセーフ確認は FAILSAFE_PERIOD ごとにする。
+               直接送出できるのは X11（XTest）と Windows（keybd_event）。mac は pyautogui が
+               イベント間に待ち（DARWIN_CATCH_UP_TIME）を入れて順序を保っているので、名前で送る
+- KeyIndex   : KEY_LIST の検索（前方一致 → 部分一致 → あいまい（文字の順に含む））。
+               前方一致は接頭辞 → キーの表を1度だけ作って引く。同順位は最近使ったキーを先に
+"""
+import platform
+import time
+
+import pyautogui as pag
+
+from utils import KEY_LIST
+
+FAILSAFE_PERIOD = 0.05
+SEARCH_LIMIT = 40
+VK_SHIFT = 0x10
+KEYEVENTF_KEYUP = 0x0002
+
+
+# ======================== 事前解決 ========================
+def _platform_module():
+    return getattr(pag, "platformModule", None)
+
+
+def resolve(name: str, backend=None):
+    """name を送出用のコードへ。直接送出できない（バックエンド・キー・OS）なら None"""
+    if backend is not None and backend is not pag:
+        return None
+    system = platform.system()
+    if system not in ("Linux", "Windows"):
+        return None
+    mapping = getattr(_platform_module(), "keyboardMapping", None)
+    if not mapping or not name:
+        return None
+    key = name.lower() if len(name) > 1 else name
+    code = mapping.get(key)
+    if not isinstance(code, int) or code <= 0:
+        return None
+    shift = -1
+    needs_shift = pag.isShiftCharacter(key) if hasattr(pag, "isShiftCharacter") else False
+    if system == "Windows":
+        mods, code = divmod(code, 0x100)    # VkKeyScan の上位バイトは修飾（1=Shift 2=Ctrl 4=Alt）
+        if mods & 6:
+            return None
+        if mods & 1 or needs_shift:
+            shift = VK_SHIFT
+    elif needs_shift:
+        shift = mapping.get("shift")
+        if not isinstance(shift, int):
+            return None
+    return [code, shift]
+
+
+def confirm(name: str, code, backend=None):
+    """
+    プランに入っているコードがこのプロセスの表と合うか確かめる（ブロックごとに1回）。
+    別の X サーバー（バッチ実行の Xvfb など）でコンパイルされたプランでも正しいコードを返す
+    """
+    now = resolve(name, backend)
+    return code if code is not None and now is not None and list(code) == now else now
+
+
+def _native():
+    """(down(code), up(code), flush()) か None"""
+    system = platform.system()
+    pm = _platform_module()
+    if system == "Linux":
+        display = getattr(pm, "_display", None)
+        try:
+            from Xlib import X
+            from Xlib.ext.xtest import fake_input
+        except Exception:
+            return None
+        if display is None:
+            return None
+        return (lambda c: fake_input(display, X.KeyPress, c),
+                lambda c: fake_input(display, X.KeyRelease, c),
+                display.sync)
+    if system == "Windows":
+        import ctypes
+        keybd_event = ctypes.windll.user32.keybd_event
+        return (lambda c: keybd_event(c, 0, 0, 0),
+                lambda c: keybd_event(c, 0, KEYEVENTF_KEYUP, 0),
+                lambda: None)
+    return None
+
+
+class KeySender:
+    """press / keyDown / keyUp を、解決済みコードがあれば直接、無ければ名前で送る"""
+    def __init__(self, backend=None):
+        self.inj = backend or pag
+        self._native = _native() if self.inj is pag else None
+        self._next_failsafe = 0.0
+
+    @property
+    def native(self) -> bool:
+        return self._native is not None
+
+    def _failsafe(self):
+        if not getattr(pag, "FAILSAFE", False):
+            return
+        now = time.perf_counter()
+        if now >= self._next_failsafe:
+            self._next_failsafe = now + FAILSAFE_PERIOD
+            pag.failSafeCheck()
+
+    def press(self, name, code=None):
+        if code is None or self._native is None:
+            self.inj.press(name)
+            return
+        self._failsafe()
+        down, up, flush = self._native
+        c, sh = code
+        if sh >= 0:
+            down(sh)
+        down(c)
+        up(c)
+        if sh >= 0:
+            up(sh)
+        flush()
+
+    def down(self, name, code=None):
+        if code is None or self._native is None:
+            self.inj.keyDown(name)
+            return
+        self._failsafe()
+        down, up, flush = self._native
+        c, sh = code
+        if sh >= 0:
+            down(sh)
+        down(c)
+        if sh >= 0:
+            up(sh)
+        flush()
+
+    def up(self, name, code=None):
+        if code is None or self._native is None:
+            self.inj.keyUp(name)
+            return
+        down, up, flush = self._native
+        c, sh = code
+        if sh >= 0:
+            down(sh)
+        up(c)
+        if sh >= 0:
+            up(sh)
+        flush()
+
+
+_senders = {}
+
+
+def sender(backend=None) -> KeySender:
+    """バックエンドごとに使い回す KeySender"""
+    key = id(backend or pag)
+    s = _senders.get(key)
+    if s is None or s.inj is not (backend or pag):
+        s = _senders[key] = KeySender(backend)
+    return s
+
+
+# ======================== 検索 ========================
+def _subsequence_span(q: str, s: str):
+    """q の文字が s に順に現れるなら、その範囲の長さ（短いほど良い）。現れなければ None"""
+    i = s.find(q[0])
+    if i < 0:
+        return None
+    best = None
+    while i >= 0:
+        j = i
+        for ch in q[1:]:
+            j = s.find(ch, j + 1)
+            if j < 0:
+                break
+        else:
+            span = j - i + 1
+            best = span if best is None else min(best, span)
+        i = s.find(q[0], i + 1)
+    return best
+
+
+class KeyIndex:
+    def __init__(self, keys=KEY_LIST):
+        self.keys = list(keys)
+        self._order = {k: i for i, k in enumerate(self.keys)}
+        self._prefix = {}       # 接頭辞 -> [キー]（短い順）
+        for k in sorted(self.keys, key=lambda k: (len(k), k)):
+            low = k.lower()
+            for n in range(1, len(low) + 1):
+                self._prefix.setdefault(low[:n], []).append(k)
+        self._cache = {}
+
+    def search(self, query: str, recent=(), limit: int = SEARCH_LIMIT) -> list:
+        """query に合うキー。空なら最近使ったキー → 全キー"""
+        recent = tuple(k for k in recent if k in self._order)
+        ck = (query, recent, limit)
+        hit = self._cache.get(ck)
+        if hit is not None:
+            return hit
+        rank = {k: i for i, k in enumerate(recent)}
+        q = query.strip().lower() if len(query.strip()) > 1 else query.lower()
+        if not q.strip():
+            out = list(recent) + [k for k in self.keys if k not in rank]
+        else:
+            pre = self._prefix.get(q, [])
+            seen = set(pre)
+            exact = [k for k in pre if k.lower() == q]
+            tier1 = exact + sorted((k for k in pre if k.lower() != q),
+                                   key=lambda k: (rank.get(k, len(rank)), len(k), k))
+            tier2 = sorted((k for k in self.keys if k not in seen and q in k.lower()),
+                           key=lambda k: (rank.get(k, len(rank)), k.lower().find(q), len(k)))
+            seen.update(tier2)
+            fuzzy = []
+            if len(q) > 1:
+                for k in self.keys:
+                    if k in seen:
+                        continue
+                    span = _subsequence_span(q, k.lower())
+                    if span is not None:
+                        fuzzy.append((rank.get(k, len(rank)), span, len(k), k))
+            out = tier1 + tier2 + [f[-1] for f in sorted(fuzzy)]
+        out = out[:limit]
+        if len(self._cache) > 512:
+            self._cache.clear()
+        self._cache[ck] = out
+        return out
+
+
+_index = None
+
+
+def index() -> KeyIndex:
+    global _index
+    if _index is None:
+        _index = KeyIndex()
+    return _index
+
+
+def bind_filter(combo, recent=lambda: (), on_change=None):
+    """
+    CTkComboBox に入力中の絞り込みを付ける（文字を打つたびにドロップダウンの候補を差し替える）。
+    on_change(値) は入力・選択のたびに呼ぶ
+    """
+    last = [None]
+
+    def _refresh(*_):
+        value = combo.get()
+        values = index().search(value, recent())
+        if values != last[0]:
+            last[0] = values
+            combo.configure(values=values or [value])
+        if on_change:
+            on_change(value)
+
+    combo.bind("<KeyRelease>", _refresh)
+    combo.configure(values=index().search("", recent()))
+    return _refresh
@@ -0,0 +1,86 @@
+# layout.py
+"""
+マクログラフの自動整列（階層レイアウト）。GUI に依存しない純粋な計算。
+- 実行順（入口からの DFS）で順位を付け、順位の逆向きの辺（ループ）は無視して DAG にする
+- 層 = 前の層から届く最長距離。左 → 右に並べる
+- 層内の並びは前段ブロックの並び位置の平均（バリセンター）で1回整列
+- 層が多い場合は wrap 層ごとに折り返して下の段へ続ける
+計算量は O(V + E + V log V)。
+"""
+from macro_engine import execution_order
+
+BLOCK_W, BLOCK_H = 180, 54
+GAP_X, GAP_Y = 60, 30
+ORIGIN = (60, 60)
+WRAP = 12
+
+
+def layered_layout(block_ids, connections, w: int = BLOCK_W, h: int = BLOCK_H,
+                   gap_x: int = GAP_X, gap_y: int = GAP_Y, wrap: int = WRAP, origin=ORIGIN) -> dict:
+    """{bid: (x, y)} を返す"""
+    block_ids = list(block_ids)
+    known = set(block_ids)
+    connections = [(f, t) for (f, t) in connections if f in known and t in known]
+
+    # 順位：実行順 → 入口から届かない（ループだけの）ブロックはその後ろ
+    order = execution_order(block_ids, connections)
+    rank = {b: i for i, b in enumerate(order)}
+    rest = [b for b in block_ids if b not in rank]
+    if rest:
+        # 残りは自分を入口とみなして DFS（ループ内の最初のブロックから）
+        outgoing = {}
+        for (f, t) in connections:
+            outgoing.setdefault(f, []).append(t)
+        for s in rest:
+            stack = [s]
+            while stack:
+                b = stack.pop()
+                if b in rank:
+                    continue
+                rank[b] = len(rank)
+                order.append(b)
+                stack.extend(reversed(outgoing.get(b, ())))
+
+    # 前向きの辺だけで最長路の層
+    preds = {}
+    for (f, t) in connections:
+        if rank[f] < rank[t]:
+            preds.setdefault(t, []).append(f)
+    layer = {}
+    for b in order:
+        layer[b] = max((layer[p] + 1 for p in preds.get(b, ())), default=0)
+
+    layers = {}
+    for b in order:
+        layers.setdefault(layer[b], []).append(b)
+
+    # 層内の並び：前段の並び位置の平均 → 同点は実行順
+    slot = {}
+    for L in sorted(layers):
+        members = layers[L]
+        if L:
+            def _key(b):
+                ps = preds.get(b)
+                bary = sum(slot[p] for p in ps) / len(ps) if ps else float("inf")
+                return (bary, rank[b])
+            members.sort(key=_key)
+        for i, b in enumerate(members):
+            slot[b] = i
+
+    # 座標（wrap 層ごとに折り返し。段の高さはその段の最大の層に合わせる）
+    wrap = max(1, int(wrap))
+    ox, oy = origin
+    band_tops = {}
+    y = oy
+    for band in range(max(layers) // wrap + 1 if layers else 0):
+        band_tops[band] = y
+        tallest = max((len(layers.get(L, ())) for L in range(band * wrap, (band + 1) * wrap)), default=0)
+        y += tallest * (h + gap_y) + gap_y * 2
+    pos = {}
+    for L, members in layers.items():
+        band, col = divmod(L, wrap)
+        x = ox + col * (w + gap_x)
+        top = band_tops[band]
+        for i, b in enumerate(members):
+            pos[b] = (x, top + i * (h + gap_y))
+    return pos
@@ -1,12 +1,39 @@
 # macro_editor.py
+import os
+import threading
 import time
 import tkinter as tk
+from contextlib import contextmanager
 from tkinter import ttk
 
 import customtkinter as ctk
 import pyautogui as pag
 
-from utils import KEY_LIST, flush_modifiers, busy_wait, esc_pressed
+import keymap
+import motion
+import path_simplify
+import scheduler
+import text_input
+from wait_reactor import WAIT_KINDS, parse_color
+from macro_engine import (
+    ACTIONS, MACRO_FORMAT, PARAM_RE, default_config, compile_plan, run_plan, load_macro, save_macro,
+)
+from data_run import compile_template, iter_rows, run_rows
+from journal import Journal
+from layout import layered_layout
+from hot_reload import FileWatcher, diff_macro, format_diff, is_empty, WATCH_INTERVAL
+from canvas_pool import CanvasPool
+
+# キャンバス図形の役割と既定オプション（CanvasPool で再利用する）
+_CANVAS_ROLES = {
+    "block_rect": ("rectangle", {"fill": "#3A3A3A", "outline": "#5A5A5A", "width": 2}),
+    "block_text": ("text", {"fill": "white", "text": ""}),
+    "port": ("oval", {"fill": "#7AA2F7", "outline": ""}),
+    "conn": ("line", {"arrow": "last", "fill": "white", "width": 2}),
+    "wire": ("line", {"fill": "white", "dash": (3, 2)}),
+    "marquee": ("rectangle", {"outline": "#58A6FF", "dash": (2, 2)}),
+    "hint": ("text", {"anchor": "nw", "fill": "#9AB6FF", "font": ("TkDefaultFont", 11, "bold"), "text": ""}),
+}
 
 
 class MacroEditor(ctk.CTkFrame):
@@ -14,13 +41,16 @@ class MacroEditor(ctk.CTkFrame):
     マクロエディタ（完全版）
     - ブロック追加 / 接続（ポートドラッグ or 接続モード） / 実行（入口からDFS）
     - ダブルクリックでインライン名称編集
-    - 複数選択（Shift+クリック / マーキー）・複製・削除
+    - 複数選択（Shift+クリック / マーキー）・複製・削除（bulk() で一括反映）
     - 右バナー（インスペクタ）で詳細編集＆削除ボタン
     - 入力欄フォーカス中はショートカット無効（Delete誤爆防止）
     - グリッドスナップ（10px）
     - アクション：
         左クリック / 右クリック / ダブルクリック / キー入力 /
-        マウス移動（絶対/相対, X/Y, 時間）
+        文字入力（1文字ずつ / 一括入力 / 貼り付け / 自動） /
+        マウス移動（絶対/相対, X/Y, 時間, 軌道: 直線/イージング/ベジェ） /
+        記録再生（入力トレースをファイルから逐次再生。「簡略化」で移動を間引いた版を作成） /
+        条件待ち（色一致/色変化/ファイル出現/クリップボード一致/時間経過）
     - ショートカット：
         A: アクション切替, P: 押し方切替, +/=: 回数+1, -: 回数-1,
         [: 間隔0.5x, ]: 間隔2x, .: 間隔=0.01, D: 複製,
@@ -28,12 +58,18 @@ class MacroEditor(ctk.CTkFrame):
     - 接続モードの可視化：
         ボタン文言/色、バッジ、カーソル、キャンバス透かし、タイトル表示
     - ツールバー右上にリアルタイム座標表示＆「現在地を反映」ボタン
+    - 保存 / 開く（JSON 形式。実行は macro_engine と共通）
+    - データ実行：設定値の {列名} を CSV / JSONL の各行で置き換えて繰り返し
+    - 自動保存：編集操作をジャーナルへ追記（起動時・読込時に復旧を提案）
+    - 整列：実行順に左→右の階層レイアウト（計算は別スレッド、反映は一括）
+    - ホットリロード：開いているファイルが外部で変わったら差分のブロック・接続だけ反映
     """
 
     # ======================== 初期化 ========================
-    def __init__(self, master, stop_flag_ref, **kwargs):
+    def __init__(self, master, stop_flag_ref, executor=None, **kwargs):
         super().__init__(master, **kwargs)
         self.stop_flag_ref = stop_flag_ref  # callable: 実行停止フラグを返す
+        self.executor = executor            # 実行専用プロセス（executor.Executor。None ならこのプロセスで実行）
 
         # 状態
         self.blocks = {}            # bid -> meta
@@ -50,7 +86,15 @@ class MacroEditor(ctk.CTkFrame):
         self.wire_preview = None
         self.wire_from = None   # (bid, side 'L'|'R')
 
-        self.recent_keys = []
+        self.current_path = None    # 保存先マクロファイル
+        self._txn = None            # 一括編集トランザクション（bulk() 中のみ）
+        self._data_resume = {}      # データファイル -> 再開行
+        self.journal = None         # 自動保存（_open_journal で設定）
+        self._journal_muted = False # 読込中など、ジャーナルに記録しない間 True
+        self._compact_pending = False
+        self._layout_job = None     # 整列計算中のスレッド
+        self._simplify_job = None   # トレース簡略化中のスレッド
+        self._watcher = None        # 開いているファイルの監視（_watch_file で設定）
 
         # ツールバー
         toolbar = ctk.CTkFrame(self)
@@ -68,6 +112,14 @@ class MacroEditor(ctk.CTkFrame):
 
         ctk.CTkButton(toolbar, text="マクロ実行",
                       command=self.run_macro).pack(side="left", padx=4)
+        ctk.CTkButton(toolbar, text="開く", width=60,
+                      command=self.open_file).pack(side="left", padx=4)
+        ctk.CTkButton(toolbar, text="保存", width=60,
+                      command=self.save_file).pack(side="left", padx=4)
+        ctk.CTkButton(toolbar, text="データ実行", width=80,
+                      command=self.run_with_data).pack(side="left", padx=4)
+        ctk.CTkButton(toolbar, text="整列", width=60,
+                      command=self.auto_layout).pack(side="left", padx=4)
 
         # 右側：接続モードのバッジ & 座標ラベル
         self.connect_badge = ctk.CTkLabel(toolbar, text="CONNECT",
@@ -87,6 +139,8 @@ class MacroEditor(ctk.CTkFrame):
         c_area.pack(side="left", fill="both", expand=True)
         self.canvas = ctk.CTkCanvas(c_area, bg="#2A2A2A", highlightthickness=0)
         self.canvas.pack(fill="both", expand=True)
+        # 図形は作り捨てずにプールで使い回す（長時間の編集でも ID・内部リストが増えない）
+        self.pool = CanvasPool(self.canvas, _CANVAS_ROLES)
 
         # 接続モード透かし
         self.connect_hint_id = None
@@ -103,6 +157,11 @@ class MacroEditor(ctk.CTkFrame):
         self.canvas.tag_bind("block", "<ButtonRelease-1>", self._on_block_release)
         self.canvas.tag_bind("block", "<Double-Button-1>", self._on_block_rename)
 
+        # バインド：ポート（全ブロック共通。ブロックごとには登録しない）
+        self.canvas.tag_bind("port", "<Button-1>", self._on_port_press)
+        self.canvas.tag_bind("port", "<B1-Motion>", self._drag_wire)
+        self.canvas.tag_bind("port", "<ButtonRelease-1>", self._finish_wire)
+
         # バインド：キャンバス
         self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-1 * (e.delta / 120)), "units"))
         self.canvas.bind("<Button-1>", self._on_canvas_mousedown)
@@ -115,6 +174,9 @@ class MacroEditor(ctk.CTkFrame):
         # 座標更新開始
         self._tick_cursor()
 
+        # 自動保存（前回の未保存の編集があれば復旧を提案。画面表示後に行う）
+        self.after(200, lambda: self.journal is None and self._open_journal(None))
+
     # ======================== 接続モードUI ========================
     def toggle_connect(self):
         self.connect_mode = not self.connect_mode
@@ -133,12 +195,10 @@ class MacroEditor(ctk.CTkFrame):
             # カーソル
             self.canvas.configure(cursor="tcross")
             # 透かし
-            if not self.connect_hint_id or not self._item_exists(self.connect_hint_id):
-                self.connect_hint_id = self.canvas.create_text(
-                    12, 12, anchor="nw",
+            if not self.pool.in_use(self.connect_hint_id):
+                self.connect_hint_id = self.pool.acquire(
+                    "hint", (12, 12), tags=("connect_hint",),
                     text="接続モード（クリックで接続 / Escでキャンセル）",
-                    fill="#9AB6FF", font=("TkDefaultFont", 11, "bold"),
-                    tags=("connect_hint",)
                 )
             # タイトルに表示
             try:
@@ -158,12 +218,7 @@ class MacroEditor(ctk.CTkFrame):
             # カーソル
             self.canvas.configure(cursor="")
             # 透かし削除
-            if self.connect_hint_id and self._item_exists(self.connect_hint_id):
-                try:
-                    self.canvas.delete(self.connect_hint_id)
-                except Exception:
-                    pass
-            self.connect_hint_id = None
+            self._release_item('connect_hint_id')
             # タイトル戻す
             try:
                 top = self.winfo_toplevel()
@@ -185,165 +240,330 @@ class MacroEditor(ctk.CTkFrame):
         self.var_seconds = ctk.StringVar(value="1.0")
         self.var_count = ctk.StringVar(value="1")
         self.var_interval = ctk.StringVar(value="0.5")
+        self.var_policy = ctk.StringVar(value=scheduler.DEFAULT_POLICY)
         self.var_key = ctk.StringVar(value="enter")
 
+        # 文字入力（本文は複数行のテキストボックス。行の作成前でも値を保持できるよう変数にも持つ）
+        self.var_text = ctk.StringVar(value="")
+        self.var_text_method = ctk.StringVar(value=text_input.DEFAULT_METHOD)
+        self.var_text_interval = ctk.StringVar(value="0")
+        self.text_box = None
+
         # マウス移動
         self.var_move_mode = ctk.StringVar(value="絶対座標")  # or 相対座標
         self.var_move_x = ctk.StringVar(value="0")
         self.var_move_y = ctk.StringVar(value="0")
         self.var_move_time = ctk.StringVar(value="0")  # 0 で瞬間移動
+        self.var_move_curve = ctk.StringVar(value="直線")
+        self.var_move_rate = ctk.StringVar(value=str(motion.DEFAULT_RATE))
+        self.var_move_jitter = ctk.StringVar(value="0")
+
+        # 記録再生
+        self.var_trace_path = ctk.StringVar(value="")
+        self.var_trace_speed = ctk.StringVar(value="1.0")
+
+        # 条件待ち
+        self.var_wait_kind = ctk.StringVar(value="時間経過")
+        self.var_wait_timeout = ctk.StringVar(value="1.0")
+        self.var_wait_x = ctk.StringVar(value="0")
+        self.var_wait_y = ctk.StringVar(value="0")
+        self.var_wait_color = ctk.StringVar(value="#FFFFFF")
+        self.var_wait_tol = ctk.StringVar(value="0")
+        self.var_wait_path = ctk.StringVar(value="")
+        self.var_wait_text = ctk.StringVar(value="")
 
         # アクション
         ctk.CTkLabel(parent, text="アクション").pack(anchor="w", padx=12)
         ctk.CTkOptionMenu(
             parent,
-            values=["左クリック", "右クリック", "ダブルクリック", "キー入力", "マウス移動"],
+            values=list(ACTIONS),
             variable=self.var_action,
             command=lambda *_: (self._apply_inspector(), self._switch_inspector_fields())
         ).pack(fill="x", padx=12, pady=(0, 8))
 
-        # 押し方
-        self.row_press = ctk.CTkFrame(parent)
-        self.row_press.pack(fill="x", padx=12, pady=(2, 4))
-        ctk.CTkLabel(self.row_press, text="押し方").pack(side="left")
+        # 各設定行は初めて表示するときに作る（_inspector_row）。一度作った行は
+        # 破棄せず pack_forget で隠して使い回す
+        self._rows_parent = parent
+        self._rows = {}             # 行名 -> CTkFrame（作成済みのみ）
+        self.recent_keys = []
+        self._recent_buttons = None # キー行の作成時に作る
+        self._recent_shown = None   # 最近キーボタンに表示中の内容
+
+        # 削除ボタン（右バナー）
+        self.frame_delete = ctk.CTkFrame(parent)
+        self.frame_delete.pack(fill="x", padx=12, pady=(14, 12))
+        self.btn_delete = ctk.CTkButton(
+            self.frame_delete,
+            text="ブロックを削除",
+            fg_color="#7A1F1F",
+            hover_color="#992525",
+            state="disabled",
+            command=self._delete_from_banner,
+        )
+        self.btn_delete.pack(fill="x")
+
+        # 初期の表示切替
+        self._switch_inspector_fields()
+        self._update_delete_button()
+
+    def _inspector_row(self, name):
+        """設定行を返す（未作成ならここで作る）"""
+        row = self._rows.get(name)
+        if row is None:
+            row = ctk.CTkFrame(self._rows_parent)
+            getattr(self, f"_fill_row_{name}")(row)
+            self._rows[name] = row
+        return row
+
+    def _entry(self, row, var, width=80):
+        e = ctk.CTkEntry(row, textvariable=var, width=width)
+        e.bind("<FocusOut>", lambda *_: self._apply_inspector())
+        return e
+
+    # ---- 設定行の中身 ----
+    def _fill_row_press(self, row):
+        ctk.CTkLabel(row, text="押し方").pack(side="left")
         ctk.CTkOptionMenu(
-            self.row_press,
+            row,
             values=["短押し", "長押し"],
             variable=self.var_press,
             command=lambda *_: (self._apply_inspector(), self._switch_inspector_fields())
         ).pack(side="right")
 
-        # 長押し
-        self.row_seconds = ctk.CTkFrame(parent)
-        self.row_seconds.pack(fill="x", padx=12, pady=(2, 4))
-        ctk.CTkLabel(self.row_seconds, text="長押し(秒)").pack(side="left")
-        e1 = ctk.CTkEntry(self.row_seconds, textvariable=self.var_seconds, width=80)
-        e1.pack(side="right")
-        e1.bind("<FocusOut>", lambda *_: self._apply_inspector())
-
-        # 短押し：回数/間隔
-        self.row_count = ctk.CTkFrame(parent)
-        self.row_count.pack(fill="x", padx=12, pady=(2, 4))
-        ctk.CTkLabel(self.row_count, text="回数").pack(side="left")
-        e2 = ctk.CTkEntry(self.row_count, textvariable=self.var_count, width=80)
-        e2.pack(side="right")
-        e2.bind("<FocusOut>", lambda *_: self._apply_inspector())
-
-        self.row_interval = ctk.CTkFrame(parent)
-        self.row_interval.pack(fill="x", padx=12, pady=(2, 10))
-        ctk.CTkLabel(self.row_interval, text="間隔(秒)").pack(side="left")
-        e3 = ctk.CTkEntry(self.row_interval, textvariable=self.var_interval, width=80)
-        e3.pack(side="right")
-        e3.bind("<FocusOut>", lambda *_: self._apply_inspector())
-
-        # キー入力
-        self.row_key = ctk.CTkFrame(parent)
-        ctk.CTkLabel(self.row_key, text="キー").pack(anchor="w", padx=0, pady=(0, 2))
+    def _fill_row_seconds(self, row):
+        ctk.CTkLabel(row, text="長押し(秒)").pack(side="left")
+        self._entry(row, self.var_seconds).pack(side="right")
+
+    def _fill_row_count(self, row):
+        ctk.CTkLabel(row, text="回数").pack(side="left")
+        self._entry(row, self.var_count).pack(side="right")
+
+    def _fill_row_interval(self, row):
+        ctk.CTkLabel(row, text="間隔(秒)").pack(side="left")
+        self._entry(row, self.var_interval).pack(side="right")
+
+    def _fill_row_policy(self, row):
+        ctk.CTkLabel(row, text="遅れたとき").pack(side="left")
+        ctk.CTkOptionMenu(
+            row,
+            values=list(scheduler.OVERRUN_POLICIES),
+            variable=self.var_policy,
+            width=100,
+            command=lambda *_: self._apply_inspector()
+        ).pack(side="right")
+
+    def _fill_row_key(self, row):
+        ctk.CTkLabel(row, text="キー").pack(anchor="w", padx=0, pady=(0, 2))
         try:
             from customtkinter import CTkComboBox
-            self.key_widget = CTkComboBox(self.row_key, values=KEY_LIST, variable=self.var_key)
+            self.key_widget = CTkComboBox(row, values=[], variable=self.var_key,
+                                          command=lambda *_: self._apply_inspector())
             self.key_widget.pack(fill="x")
-            self.key_widget.bind("<KeyRelease>", lambda *_: self._apply_inspector())
-            self.key_widget.bind("<<ComboboxSelected>>", lambda *_: self._apply_inspector())
+            # 打つたびに候補を絞り込む（最近使ったキーを上位に）
+            keymap.bind_filter(self.key_widget, recent=lambda: self.recent_keys,
+                               on_change=lambda *_: self._apply_inspector())
         except Exception:
-            self.key_widget = ctk.CTkEntry(self.row_key, textvariable=self.var_key)
+            self.key_widget = ctk.CTkEntry(row, textvariable=self.var_key)
             self.key_widget.pack(fill="x")
             self.key_widget.bind("<KeyRelease>", lambda *_: self._apply_inspector())
-        self.row_key_recent = ctk.CTkFrame(self.row_key)
+        # 最近使ったキー：ラベル＋ボタン5個を一度だけ作り、文字だけ差し替える
+        self.row_key_recent = ctk.CTkFrame(row)
         self.row_key_recent.pack(fill="x", pady=(4, 0))
+        self._recent_label = ctk.CTkLabel(self.row_key_recent, text="最近:")
+        self._recent_buttons = [
+            ctk.CTkButton(self.row_key_recent, text="", width=44,
+                          command=lambda i=i: self._pick_recent_key(i))
+            for i in range(5)
+        ]
+        self._recent_shown = None
+        self._update_recent_keys_ui()
 
-        # マウス移動
-        self.row_move_mode = ctk.CTkFrame(parent)
-        self.row_move_mode.pack(fill="x", padx=12, pady=(2, 4))
-        ctk.CTkLabel(self.row_move_mode, text="移動方法").pack(side="left")
+    def _fill_row_text(self, row):
+        ctk.CTkLabel(row, text="入力する文字列").pack(anchor="w", pady=(0, 2))
+        self.text_box = ctk.CTkTextbox(row, height=90, wrap="char")
+        self.text_box.pack(fill="x")
+        self.text_box.insert("1.0", self.var_text.get())
+        self.text_box.bind("<FocusOut>", lambda *_: self._apply_inspector())
+
+    def _fill_row_text_method(self, row):
+        ctk.CTkLabel(row, text="方式").grid(row=0, column=0, padx=4, sticky="w")
         ctk.CTkOptionMenu(
-            self.row_move_mode,
+            row,
+            values=list(text_input.TEXT_METHODS),
+            variable=self.var_text_method,
+            width=100,
+            command=lambda *_: self._apply_inspector()
+        ).grid(row=0, column=1, sticky="w")
+        ctk.CTkLabel(row, text="間隔(秒)").grid(row=1, column=0, padx=4, pady=(4, 0), sticky="w")
+        self._entry(row, self.var_text_interval, 60).grid(row=1, column=1, pady=(4, 0), sticky="w")
+        ctk.CTkLabel(row, text="※ 間隔は 1文字ずつ のみ", text_color="#9AA0A6"
+                     ).grid(row=2, column=0, columnspan=2, padx=4, sticky="w")
+
+    def _set_text_box(self, text):
+        self.var_text.set(text)
+        if self.text_box is not None:
+            self.text_box.delete("1.0", "end")
+            self.text_box.insert("1.0", text)
+
+    def _fill_row_move_mode(self, row):
+        ctk.CTkLabel(row, text="移動方法").pack(side="left")
+        ctk.CTkOptionMenu(
+            row,
             values=["絶対座標", "相対座標"],
             variable=self.var_move_mode,
             command=lambda *_: self._apply_inspector()
         ).pack(side="right")
 
-        self.row_move_xy = ctk.CTkFrame(parent)
-        self.row_move_xy.pack(fill="x", padx=12, pady=(2, 4))
-        ctk.CTkLabel(self.row_move_xy, text="X").grid(row=0, column=0, padx=4, sticky="w")
-        e4 = ctk.CTkEntry(self.row_move_xy, textvariable=self.var_move_x, width=80)
-        e4.grid(row=0, column=1)
-        e4.bind("<FocusOut>", lambda *_: self._apply_inspector())
-        ctk.CTkLabel(self.row_move_xy, text="Y").grid(row=0, column=2, padx=(12, 4), sticky="w")
-        e5 = ctk.CTkEntry(self.row_move_xy, textvariable=self.var_move_y, width=80)
-        e5.grid(row=0, column=3)
-        e5.bind("<FocusOut>", lambda *_: self._apply_inspector())
-
+    def _fill_row_move_xy(self, row):
+        ctk.CTkLabel(row, text="X").grid(row=0, column=0, padx=4, sticky="w")
+        self._entry(row, self.var_move_x).grid(row=0, column=1)
+        ctk.CTkLabel(row, text="Y").grid(row=0, column=2, padx=(12, 4), sticky="w")
+        self._entry(row, self.var_move_y).grid(row=0, column=3)
         # 現在地を反映
-        reflect_btn = ctk.CTkButton(
-            self.row_move_xy, text="現在地を反映", width=100, command=self._fill_xy_with_cursor
-        )
-        reflect_btn.grid(row=0, column=4, padx=(12, 0))
+        ctk.CTkButton(
+            row, text="現在地を反映", width=100, command=self._fill_xy_with_cursor
+        ).grid(row=0, column=4, padx=(12, 0))
 
-        self.row_move_time = ctk.CTkFrame(parent)
-        self.row_move_time.pack(fill="x", padx=12, pady=(2, 10))
-        ctk.CTkLabel(self.row_move_time, text="移動時間(秒)").pack(side="left")
-        e6 = ctk.CTkEntry(self.row_move_time, textvariable=self.var_move_time, width=80)
-        e6.pack(side="right")
-        e6.bind("<FocusOut>", lambda *_: self._apply_inspector())
+    def _fill_row_move_time(self, row):
+        ctk.CTkLabel(row, text="移動時間(秒)").pack(side="left")
+        self._entry(row, self.var_move_time).pack(side="right")
 
-        # 削除ボタン（右バナー）
-        self.frame_delete = ctk.CTkFrame(parent)
-        self.frame_delete.pack(fill="x", padx=12, pady=(14, 12))
-        self.btn_delete = ctk.CTkButton(
-            self.frame_delete,
-            text="ブロックを削除",
-            fg_color="#7A1F1F",
-            hover_color="#992525",
-            state="disabled",
-            command=self._delete_from_banner,
-        )
-        self.btn_delete.pack(fill="x")
+    def _fill_row_move_curve(self, row):
+        # 軌道（移動時間 > 0 のとき使用）
+        ctk.CTkLabel(row, text="軌道").grid(row=0, column=0, padx=4, sticky="w")
+        ctk.CTkOptionMenu(
+            row,
+            values=list(motion.CURVES),
+            variable=self.var_move_curve,
+            width=100,
+            command=lambda *_: self._apply_inspector()
+        ).grid(row=0, column=1, columnspan=3, sticky="w")
+        ctk.CTkLabel(row, text="Hz").grid(row=1, column=0, padx=4, pady=(4, 0), sticky="w")
+        self._entry(row, self.var_move_rate, 60).grid(row=1, column=1, pady=(4, 0))
+        ctk.CTkLabel(row, text="揺らぎ(px)").grid(row=1, column=2, padx=(12, 4), pady=(4, 0), sticky="w")
+        self._entry(row, self.var_move_jitter, 50).grid(row=1, column=3, pady=(4, 0))
+
+    def _fill_row_trace(self, row):
+        ctk.CTkLabel(row, text="記録ファイル").grid(row=0, column=0, padx=4, sticky="w")
+        self._entry(row, self.var_trace_path, 150).grid(row=0, column=1, columnspan=2, sticky="we")
+        ctk.CTkButton(row, text="参照", width=50,
+                      command=self._browse_trace).grid(row=0, column=3, padx=(6, 0))
+        ctk.CTkLabel(row, text="速度(倍)").grid(row=1, column=0, padx=4, pady=(4, 0), sticky="w")
+        self._entry(row, self.var_trace_speed, 60).grid(row=1, column=1, pady=(4, 0), sticky="w")
+        ctk.CTkButton(row, text="簡略化", width=50,
+                      command=self._simplify_trace).grid(row=1, column=3, padx=(6, 0), pady=(4, 0))
+
+    def _fill_row_wait_kind(self, row):
+        ctk.CTkLabel(row, text="条件").pack(side="left")
+        ctk.CTkOptionMenu(
+            row,
+            values=list(WAIT_KINDS),
+            variable=self.var_wait_kind,
+            command=lambda *_: (self._apply_inspector(), self._switch_inspector_fields())
+        ).pack(side="right")
 
-        # 初期の表示切替と最近キーUI
-        self._switch_inspector_fields()
-        self._update_recent_keys_ui()
-        self._update_delete_button()
+    def _fill_row_wait_pixel(self, row):
+        ctk.CTkLabel(row, text="X").grid(row=0, column=0, padx=4, sticky="w")
+        self._entry(row, self.var_wait_x, 60).grid(row=0, column=1)
+        ctk.CTkLabel(row, text="Y").grid(row=0, column=2, padx=(8, 4), sticky="w")
+        self._entry(row, self.var_wait_y, 60).grid(row=0, column=3)
+        ctk.CTkLabel(row, text="色").grid(row=1, column=0, padx=4, pady=(4, 0), sticky="w")
+        self._entry(row, self.var_wait_color).grid(row=1, column=1, pady=(4, 0))
+        ctk.CTkLabel(row, text="許容").grid(row=1, column=2, padx=(8, 4), pady=(4, 0), sticky="w")
+        self._entry(row, self.var_wait_tol, 60).grid(row=1, column=3, pady=(4, 0))
+        ctk.CTkButton(row, text="現在地の色を取得", command=self._fill_wait_pixel
+                      ).grid(row=2, column=0, columnspan=4, pady=(6, 0), sticky="we")
+
+    def _fill_row_wait_path(self, row):
+        ctk.CTkLabel(row, text="ファイル").pack(side="left")
+        e = ctk.CTkEntry(row, textvariable=self.var_wait_path)
+        e.pack(side="right", fill="x", expand=True, padx=(8, 0))
+        e.bind("<FocusOut>", lambda *_: self._apply_inspector())
+
+    def _fill_row_wait_text(self, row):
+        ctk.CTkLabel(row, text="内容").pack(side="left")
+        e = ctk.CTkEntry(row, textvariable=self.var_wait_text)
+        e.pack(side="right", fill="x", expand=True, padx=(8, 0))
+        e.bind("<FocusOut>", lambda *_: self._apply_inspector())
+
+    def _fill_row_wait_timeout(self, row):
+        self.lbl_wait_timeout = ctk.CTkLabel(row, text="タイムアウト(秒)")
+        self.lbl_wait_timeout.pack(side="left")
+        self._entry(row, self.var_wait_timeout).pack(side="right")
 
     def _switch_inspector_fields(self):
         act = self.var_action.get()
         prs = self.var_press.get()
 
-        # 一旦全部隠す
-        for f in (self.row_press, self.row_seconds, self.row_count, self.row_interval,
-                  self.row_key, self.row_move_mode, self.row_move_xy, self.row_move_time):
-            f.pack_forget()
-
+        # 表示する行と余白（上から順）
+        want = []
         if act in ("左クリック", "右クリック", "ダブルクリック", "キー入力"):
-            self.row_press.pack(fill="x", padx=12, pady=(2, 4))
+            want.append(("press", (2, 4)))
             if prs == "長押し":
-                self.row_seconds.pack(fill="x", padx=12, pady=(2, 4))
+                want.append(("seconds", (2, 4)))
             else:
-                self.row_count.pack(fill="x", padx=12, pady=(2, 4))
-                self.row_interval.pack(fill="x", padx=12, pady=(2, 10))
+                want += [("count", (2, 4)), ("interval", (2, 4)), ("policy", (2, 10))]
             if act == "キー入力":
-                self.row_key.pack(fill="x", padx=12, pady=(2, 10))
+                want.append(("key", (2, 10)))
+        elif act == "文字入力":
+            want += [("text", (2, 4)), ("text_method", (2, 10))]
+        elif act == "記録再生":
+            want.append(("trace", (2, 10)))
+        elif act == "条件待ち":
+            kind = self.var_wait_kind.get()
+            want.append(("wait_kind", (2, 4)))
+            if kind in ("色一致", "色変化"):
+                want.append(("wait_pixel", (2, 4)))
+            elif kind == "ファイル出現":
+                want.append(("wait_path", (2, 4)))
+            elif kind == "クリップボード一致":
+                want.append(("wait_text", (2, 4)))
+            want.append(("wait_timeout", (2, 10)))
         else:  # マウス移動
-            self.row_move_mode.pack(fill="x", padx=12, pady=(2, 4))
-            self.row_move_xy.pack(fill="x", padx=12, pady=(2, 4))
-            self.row_move_time.pack(fill="x", padx=12, pady=(2, 10))
+            want += [("move_mode", (2, 4)), ("move_xy", (2, 4)),
+                     ("move_time", (2, 4)), ("move_curve", (2, 10))]
+
+        # 作成済みで不要な行だけ隠す（未作成の行は作らない）
+        names = {n for n, _ in want}
+        for name, row in self._rows.items():
+            if name not in names:
+                row.pack_forget()
+        for name, pady in want:
+            self._inspector_row(name).pack(fill="x", padx=12, pady=pady, before=self.frame_delete)
+
+        if act == "条件待ち":
+            self.lbl_wait_timeout.configure(
+                text="待ち時間(秒)" if self.var_wait_kind.get() == "時間経過" else "タイムアウト(秒, 0=無制限)")
 
     def _update_recent_keys_ui(self):
-        for w in self.row_key_recent.winfo_children():
-            w.destroy()
-        if not self.recent_keys:
+        if self._recent_buttons is None:
+            return      # キー行が未作成（作成時に反映される）
+        shown = tuple(self.recent_keys[:5])
+        if shown == self._recent_shown:
             return
-        ctk.CTkLabel(self.row_key_recent, text="最近:").pack(side="left")
-        for k in self.recent_keys[:5]:
-            ctk.CTkButton(self.row_key_recent, text=k, width=44,
-                          command=lambda kk=k: (self.var_key.set(kk), self._apply_inspector())
-                          ).pack(side="left", padx=2)
+        self._recent_shown = shown
+        for i, btn in enumerate(self._recent_buttons):
+            if i < len(shown):
+                btn.configure(text=shown[i])
+                btn.pack(side="left", padx=2)
+            else:
+                btn.pack_forget()
+        if shown:
+            self._recent_label.pack(side="left", before=self._recent_buttons[0])
+        else:
+            self._recent_label.pack_forget()
+
+    def _pick_recent_key(self, i):
+        if i < len(self.recent_keys):
+            self.var_key.set(self.recent_keys[i])
+            self._apply_inspector()
 
     def _apply_inspector(self):
         bid = self.current_block_id
         if not bid or bid not in self.blocks:
             return
         cfg = self.blocks[bid]['config']
+        before = dict(cfg)
         act = self.var_action.get()
         cfg['action'] = act
 
@@ -361,36 +581,97 @@ class MacroEditor(ctk.CTkFrame):
                 cfg['repeat_interval'] = max(0.0, float(self.var_interval.get()))
             except Exception:
                 pass
+            cfg['overrun_policy'] = self.var_policy.get()
 
             if act == "キー入力":
                 k = (self.var_key.get() or 'enter').strip()
                 cfg['key'] = k
-                if k:
+                if k and (not self.recent_keys or self.recent_keys[0] != k):
                     if k in self.recent_keys:
                         self.recent_keys.remove(k)
                     self.recent_keys.insert(0, k)
                     self._update_recent_keys_ui()
 
-        else:  # マウス移動
-            cfg['move_mode'] = self.var_move_mode.get()
+        elif act == "文字入力":
+            if self.text_box is not None:
+                self.var_text.set(self.text_box.get("1.0", "end-1c"))
+            cfg['text'] = self.var_text.get()
+            cfg['text_method'] = self.var_text_method.get()
             try:
-                cfg['move_x'] = int(self.var_move_x.get())
+                cfg['text_interval'] = max(0.0, float(self.var_text_interval.get()))
             except Exception:
-                cfg['move_x'] = 0
+                pass
+
+        elif act == "記録再生":
+            cfg['trace_path'] = self.var_trace_path.get().strip()
             try:
-                cfg['move_y'] = int(self.var_move_y.get())
+                cfg['trace_speed'] = max(0.01, float(self.var_trace_speed.get()))
             except Exception:
-                cfg['move_y'] = 0
+                pass
+
+        elif act == "条件待ち":
+            cfg['wait_kind'] = self.var_wait_kind.get()
+            for key, var, conv in (('wait_timeout', self.var_wait_timeout, lambda v: max(0.0, float(v))),
+                                   ('wait_x', self.var_wait_x, int),
+                                   ('wait_y', self.var_wait_y, int),
+                                   ('wait_tolerance', self.var_wait_tol, lambda v: max(0, int(v)))):
+                try:
+                    cfg[key] = conv(var.get())
+                except Exception:
+                    pass
+            try:
+                parse_color(self.var_wait_color.get())
+                cfg['wait_color'] = self.var_wait_color.get().strip()
+            except ValueError:
+                pass
+            cfg['wait_path'] = self.var_wait_path.get().strip()
+            cfg['wait_text'] = self.var_wait_text.get()
+
+        else:  # マウス移動
+            cfg['move_mode'] = self.var_move_mode.get()
+            # {列名} はデータ実行用のパラメータとしてそのまま保持
+            for key, var in (('move_x', self.var_move_x), ('move_y', self.var_move_y)):
+                v = var.get().strip()
+                try:
+                    cfg[key] = int(v)
+                except Exception:
+                    m = PARAM_RE.fullmatch(v)
+                    cfg[key] = v if m and m.group(1) else 0
             try:
                 mv = float(self.var_move_time.get())
                 cfg['move_time'] = max(0.0, mv)
             except Exception:
                 cfg['move_time'] = 0.0
+            cfg['move_curve'] = self.var_move_curve.get()
+            try:
+                cfg['move_rate'] = min(motion.MAX_RATE, max(motion.MIN_RATE, float(self.var_move_rate.get())))
+            except Exception:
+                pass
+            try:
+                cfg['move_jitter'] = max(0.0, float(self.var_move_jitter.get()))
+            except Exception:
+                pass
 
+        if cfg != before:
+            self._journal_op({"op": "config", "bid": bid, "config": cfg})
         self._refresh_block_label(bid)
 
     def _refresh_block_label(self, bid):
-        cfg = self.blocks[bid]['config']
+        if self._txn is not None:
+            self._txn.labels.add(bid)
+            return
+        self._apply_block_label(bid)
+
+    def _apply_block_label(self, bid):
+        """表示文字列が変わったときだけキャンバスへ反映"""
+        meta = self.blocks[bid]
+        text = self._block_label_text(meta['config'])
+        if meta.get('label') != text:
+            self.canvas.itemconfig(meta['text_id'], text=text)
+            meta['label'] = text
+
+    @staticmethod
+    def _block_label_text(cfg) -> str:
         act = cfg.get('action', "左クリック")
         if act == "キー入力":
             text = f"Key: {cfg.get('key', 'enter')}"
@@ -399,11 +680,26 @@ class MacroEditor(ctk.CTkFrame):
             x, y = cfg.get('move_x', 0), cfg.get('move_y', 0)
             if mode == "絶対座標":
                 text = f"Move: ({x},{y})"
-            else:
+            elif isinstance(x, int) and isinstance(y, int):
                 text = f"Move: d{ x:+},{ y:+}"
+            else:
+                text = f"Move: d{x},{y}"
+        elif act == "文字入力":
+            body = " ".join(cfg.get('text', '').split())
+            text = f"Text: {body[:12] + '…' if len(body) > 12 else body or '未入力'}"
+        elif act == "記録再生":
+            text = f"Trace: {os.path.basename(cfg.get('trace_path', '')) or '未指定'}"
+        elif act == "条件待ち":
+            kind = cfg.get('wait_kind', "時間経過")
+            if kind == "時間経過":
+                text = f"Wait: {cfg.get('wait_timeout', 1.0)}s"
+            elif kind in ("色一致", "色変化"):
+                text = f"Wait: {kind} ({cfg.get('wait_x', 0)},{cfg.get('wait_y', 0)})"
+            else:
+                text = f"Wait: {kind}"
         else:
             text = act
-        self.canvas.itemconfig(self.blocks[bid]['text_id'], text=text)
+        return text
 
     def _update_delete_button(self):
         count = (1 if self.current_block_id else 0) + len(self.multi_selected)
@@ -423,42 +719,92 @@ class MacroEditor(ctk.CTkFrame):
         self._update_delete_button()
 
     # ======================== ブロックUI ========================
-    def add_block(self, select_after_add=False):
-        x, y, w, h = 60, 60, 180, 54
-        bid = f"block_{self.block_counter}"
-        self.block_counter += 1
+    def add_block(self, select_after_add=False, bid=None, x=60, y=60, config=None):
+        w, h = 180, 54
+        if bid is None:
+            bid = f"block_{self.block_counter}"
+            self.block_counter += 1
+        else:
+            # 読込時：以降の採番と衝突しないよう進める
+            try:
+                self.block_counter = max(self.block_counter, int(bid.rsplit("_", 1)[1]) + 1)
+            except (IndexError, ValueError):
+                pass
 
-        r = self.canvas.create_rectangle(
-            x, y, x + w, y + h, fill="#3A3A3A", outline="#5A5A5A", width=2, tags=("block", bid)
-        )
-        t = self.canvas.create_text(x + w / 2, y + h / 2, text="左クリック", fill="white", tags=("block", bid))
-
-        # 左右ポート
-        lp = self.canvas.create_oval(x - 6, y + h / 2 - 6, x + 6, y + h / 2 + 6,
-                                     fill="#7AA2F7", outline="", tags=("port", bid, "portL"))
-        rp = self.canvas.create_oval(x + w - 6, y + h / 2 - 6, x + w + 6, y + h / 2 + 6,
-                                     fill="#7AA2F7", outline="", tags=("port", bid, "portR"))
-        self.canvas.tag_bind(lp, "<Button-1>", lambda e, b=bid: self._start_wire(b, "L"))
-        self.canvas.tag_bind(rp, "<Button-1>", lambda e, b=bid: self._start_wire(b, "R"))
-        self.canvas.tag_bind("port", "<B1-Motion>", self._drag_wire)
-        self.canvas.tag_bind("port", "<ButtonRelease-1>", self._finish_wire)
+        cfg = dict(default_config(), **(config or {}))
+        self._create_block_items(bid, x, y, w, h, cfg, self._block_label_text(cfg))
+        if select_after_add:
+            self._select_block(bid)
+
+    def _create_block_items(self, bid, x, y, w, h, cfg, label):
+        """ブロックの矩形・文字・左右ポートを作って登録"""
+        pool = self.pool
+        r = pool.acquire("block_rect", (x, y, x + w, y + h), tags=("block", bid), owner=bid)
+        t = pool.acquire("block_text", (x + w / 2, y + h / 2), tags=("block", bid), owner=bid, text=label)
+
+        # 左右ポート（バインドは "port" タグで共通登録済み）
+        lp = pool.acquire("port", (x - 6, y + h / 2 - 6, x + 6, y + h / 2 + 6),
+                          tags=("port", bid, "portL"), owner=bid)
+        rp = pool.acquire("port", (x + w - 6, y + h / 2 - 6, x + w + 6, y + h / 2 + 6),
+                          tags=("port", bid, "portR"), owner=bid)
 
         self.blocks[bid] = {
             'rect_id': r, 'text_id': t, 'x': x, 'y': y, 'w': w, 'h': h, 'dragging': False,
             'ports': {'L': lp, 'R': rp},
-            'config': {
-                'action': "左クリック",
-                'press_type': "短押し",
-                'seconds': 1.0,
-                'repeat_count': 1,
-                'repeat_interval': 0.5,
-                'key': 'enter',
-                'move_mode': '絶対座標',
-                'move_x': 0, 'move_y': 0, 'move_time': 0.0,
-            }
+            'label': label,
+            'config': cfg
         }
-        if select_after_add:
-            self._select_block(bid)
+        self._journal_op({"op": "add", "bid": bid, "x": x, "y": y, "config": cfg})
+
+    # ======================== 一括編集 ========================
+    @contextmanager
+    def bulk(self):
+        """
+        一括編集トランザクション。
+        中で行ったラベル更新・移動はモデルにだけ反映し、終了時にまとめてキャンバスへ流す。
+            with editor.bulk():
+                for b in bids: ...
+        """
+        if self._txn is not None:       # 入れ子は外側にまとめる
+            yield self._txn
+            return
+        self._txn = _BulkEdit()
+        try:
+            yield self._txn
+        finally:
+            txn, self._txn = self._txn, None
+            self._flush_bulk(txn)
+
+    def _flush_bulk(self, txn):
+        for bid in txn.labels:
+            if bid in self.blocks:
+                self._apply_block_label(bid)
+        moved = {b for b in txn.moved if b in self.blocks}
+        for bid in moved:
+            self._place_block_items(bid)
+        self._update_connections(moved)
+        if moved:
+            self._journal_op({"op": "move", "pos": {b: [self.blocks[b]['x'], self.blocks[b]['y']] for b in moved}})
+
+    def _place_block_items(self, bid):
+        meta = self.blocks[bid]
+        x, y, w, h = meta['x'], meta['y'], meta['w'], meta['h']
+        self.canvas.coords(meta['rect_id'], x, y, x + w, y + h)
+        self.canvas.coords(meta['text_id'], x + w / 2, y + h / 2)
+        self.canvas.coords(meta['ports']['L'], x - 6, y + h / 2 - 6, x + 6, y + h / 2 + 6)
+        self.canvas.coords(meta['ports']['R'], x + w - 6, y + h / 2 - 6, x + w + 6, y + h / 2 + 6)
+
+    def _update_connections(self, bids):
+        """bids に接続している線だけ引き直す"""
+        if not bids:
+            return
+        for (f, t, lid) in self.connections:
+            if (f in bids or t in bids) and f in self.blocks and t in self.blocks:
+                fx = self.blocks[f]['x'] + self.blocks[f]['w'] / 2
+                fy = self.blocks[f]['y'] + self.blocks[f]['h'] / 2
+                tx = self.blocks[t]['x'] + self.blocks[t]['w'] / 2
+                ty = self.blocks[t]['y'] + self.blocks[t]['h'] / 2
+                self.canvas.coords(lid, fx, fy, tx, ty)
 
     # ======================== クリック/ドラッグ ========================
     def _on_block_click(self, event):
@@ -482,6 +828,7 @@ class MacroEditor(ctk.CTkFrame):
             return
 
         bx, by = self.blocks[bid]['x'], self.blocks[bid]['y']
+        self.blocks[bid]['drag_start'] = (bx, by)
         self.blocks[bid]['drag_offset_x'] = event.x - bx
         self.blocks[bid]['drag_offset_y'] = event.y - by
         self.blocks[bid]['dragging'] = True
@@ -504,26 +851,11 @@ class MacroEditor(ctk.CTkFrame):
             return
 
         ox, oy = self.blocks[bid]['drag_offset_x'], self.blocks[bid]['drag_offset_y']
-        nx, ny = event.x - ox, event.y - oy
-        w, h = self.blocks[bid]['w'], self.blocks[bid]['h']
-
-        self.canvas.coords(self.blocks[bid]['rect_id'], nx, ny, nx + w, ny + h)
-        self.canvas.coords(self.blocks[bid]['text_id'], nx + w / 2, ny + h / 2)
-        self.blocks[bid]['x'], self.blocks[bid]['y'] = nx, ny
-
-        lp = self.blocks[bid]['ports']['L']
-        rp = self.blocks[bid]['ports']['R']
-        self.canvas.coords(lp, nx - 6, ny + h / 2 - 6, nx + 6, ny + h / 2 + 6)
-        self.canvas.coords(rp, nx + w - 6, ny + h / 2 - 6, nx + w + 6, ny + h / 2 + 6)
+        self.blocks[bid]['x'], self.blocks[bid]['y'] = event.x - ox, event.y - oy
+        self._place_block_items(bid)
 
         # 線更新
-        for (f, t, lid) in list(self.connections):
-            if f in self.blocks and t in self.blocks:
-                fx = self.blocks[f]['x'] + self.blocks[f]['w'] / 2
-                fy = self.blocks[f]['y'] + self.blocks[f]['h'] / 2
-                tx = self.blocks[t]['x'] + self.blocks[t]['w'] / 2
-                ty = self.blocks[t]['y'] + self.blocks[t]['h'] / 2
-                self.canvas.coords(lid, fx, fy, tx, ty)
+        self._update_connections({bid})
 
     def _on_block_release(self, event):
         items = self.canvas.find_withtag("current")
@@ -541,76 +873,52 @@ class MacroEditor(ctk.CTkFrame):
             dx, dy = nx - x, ny - y
             if dx or dy:
                 self._nudge_block(bid, dx, dy)
+        meta = self.blocks[bid]
+        if meta.pop('drag_start', None) != (meta['x'], meta['y']):
+            self._journal_op({"op": "move", "pos": {bid: [meta['x'], meta['y']]}})
 
     def _nudge_block(self, bid, dx, dy):
         meta = self.blocks[bid]
-        x, y, w, h = meta['x'] + dx, meta['y'] + dy, meta['w'], meta['h']
-        self.canvas.coords(meta['rect_id'], x, y, x + w, y + h)
-        self.canvas.coords(meta['text_id'], x + w / 2, y + h / 2)
-        lp = meta['ports']['L']
-        rp = meta['ports']['R']
-        self.canvas.coords(lp, x - 6, y + h / 2 - 6, x + 6, y + h / 2 + 6)
-        self.canvas.coords(rp, x + w - 6, y + h / 2 - 6, x + w + 6, y + h / 2 + 6)
-        meta['x'], meta['y'] = x, y
+        meta['x'], meta['y'] = meta['x'] + dx, meta['y'] + dy
+        if self._txn is not None:
+            self._txn.moved.add(bid)
+            return
+        self._place_block_items(bid)
 
         # 線更新
-        for (f, t, lid) in list(self.connections):
-            if f in self.blocks and t in self.blocks:
-                fx = self.blocks[f]['x'] + self.blocks[f]['w'] / 2
-                fy = self.blocks[f]['y'] + self.blocks[f]['h'] / 2
-                tx = self.blocks[t]['x'] + self.blocks[t]['w'] / 2
-                ty = self.blocks[t]['y'] + self.blocks[t]['h'] / 2
-                self.canvas.coords(lid, fx, fy, tx, ty)
+        self._update_connections({bid})
 
     # ======================== キャンバス空白 ========================
     def _on_canvas_mousedown(self, event):
         # 既存マーキー掃除
-        if self.marquee_rect and self._item_exists(self.marquee_rect):
-            try:
-                self.canvas.delete(self.marquee_rect)
-            except Exception:
-                pass
-        self.marquee_rect = None
+        self._release_item('marquee_rect')
         self.drag_select_origin = None
 
         # 空白ならマーキー開始
         item = self.canvas.find_withtag("current")
         if not item:
             self.drag_select_origin = (event.x, event.y)
-            self.marquee_rect = self.canvas.create_rectangle(
-                event.x, event.y, event.x, event.y, outline="#58A6FF", dash=(2, 2)
-            )
+            self.marquee_rect = self.pool.acquire("marquee", (event.x, event.y, event.x, event.y))
 
     def _on_canvas_drag(self, event):
-        if not self.marquee_rect or not self._item_exists(self.marquee_rect) or not self.drag_select_origin:
+        if not self.pool.in_use(self.marquee_rect) or not self.drag_select_origin:
             return
         x0, y0 = self.drag_select_origin
         self.canvas.coords(self.marquee_rect, x0, y0, event.x, event.y)
 
     def _on_canvas_mouseup(self, event):
-        if not self.marquee_rect or not self._item_exists(self.marquee_rect):
+        if not self.pool.in_use(self.marquee_rect):
             self.marquee_rect = None
             self.drag_select_origin = None
             return
         coords = self.canvas.coords(self.marquee_rect) or []
+        self._release_item('marquee_rect')
+        self.drag_select_origin = None
         try:
             x0, y0, x1, y1 = coords
         except Exception:
-            try:
-                self.canvas.delete(self.marquee_rect)
-            except Exception:
-                pass
-            self.marquee_rect = None
-            self.drag_select_origin = None
             return
 
-        try:
-            self.canvas.delete(self.marquee_rect)
-        except Exception:
-            pass
-        self.marquee_rect = None
-        self.drag_select_origin = None
-
         # 範囲内ブロックを選択
         self.multi_selected.clear()
         xmin, xmax = min(x0, x1), max(x0, x1)
@@ -640,12 +948,13 @@ class MacroEditor(ctk.CTkFrame):
         meta = self.blocks[bid]
         text_id = meta.get('text_id')
 
-        if not text_id or not self._item_exists(text_id):
+        if not self.pool.in_use(text_id):
             x, y, w, h = meta['x'], meta['y'], meta['w'], meta['h']
-            text_id = self.canvas.create_text(x + w / 2, y + h / 2, text="Block", fill="white", tags=("block", bid))
+            text_id = self.pool.acquire("block_text", (x + w / 2, y + h / 2), tags=("block", bid),
+                                        owner=bid, text="Block")
             meta['text_id'] = text_id
 
-        coords = self.canvas.coords(text_id) if self._item_exists(text_id) else []
+        coords = self.canvas.coords(text_id)
         if not coords or len(coords) < 2:
             x, y, w, h = meta['x'], meta['y'], meta['w'], meta['h']
             tx, ty = x + w / 2, y + h / 2
@@ -661,6 +970,7 @@ class MacroEditor(ctk.CTkFrame):
         def _commit(_=None):
             new = entry.get().strip() or "Block"
             self.canvas.itemconfig(text_id, text=new)
+            meta['label'] = new
             try:
                 self.canvas.delete("inline_edit")
             except Exception:
@@ -671,19 +981,24 @@ class MacroEditor(ctk.CTkFrame):
         entry.bind("<FocusOut>", _commit)
 
     # ======================== 配線（ワイヤ） ========================
+    def _on_port_press(self, event):
+        items = self.canvas.find_withtag("current")
+        if not items:
+            return
+        tags = self.canvas.gettags(items[0])
+        bid = next((t for t in tags if t.startswith("block_")), None)
+        if not bid or bid not in self.blocks:
+            return
+        self._start_wire(bid, "L" if "portL" in tags else "R")
+
     def _start_wire(self, bid, side):
-        if self.wire_preview and self._item_exists(self.wire_preview):
-            try:
-                self.canvas.delete(self.wire_preview)
-            except Exception:
-                pass
-        self.wire_preview = None
+        self._release_item('wire_preview')
         self.wire_from = (bid, side)
         x, y = self._port_center(bid, side)
-        self.wire_preview = self.canvas.create_line(x, y, x, y, fill="white", dash=(3, 2))
+        self.wire_preview = self.pool.acquire("wire", (x, y, x, y))
 
     def _drag_wire(self, event):
-        if not self.wire_preview or not self._item_exists(self.wire_preview):
+        if not self.pool.in_use(self.wire_preview):
             self.wire_preview = None
             return
         coords = self.canvas.coords(self.wire_preview) or []
@@ -693,15 +1008,11 @@ class MacroEditor(ctk.CTkFrame):
         self.canvas.coords(self.wire_preview, x0, y0, event.x, event.y)
 
     def _finish_wire(self, event):
-        if not self.wire_preview or not self._item_exists(self.wire_preview):
+        if not self.pool.in_use(self.wire_preview):
             self.wire_preview = None
             self.wire_from = None
             return
-        try:
-            self.canvas.delete(self.wire_preview)
-        except Exception:
-            pass
-        self.wire_preview = None
+        self._release_item('wire_preview')
         if not self.wire_from:
             return
         bid_from, _ = self.wire_from
@@ -735,8 +1046,9 @@ class MacroEditor(ctk.CTkFrame):
         y1 = self.blocks[b1]['y'] + self.blocks[b1]['h'] / 2
         x2 = self.blocks[b2]['x'] + self.blocks[b2]['w'] / 2
         y2 = self.blocks[b2]['y'] + self.blocks[b2]['h'] / 2
-        lid = self.canvas.create_line(x1, y1, x2, y2, arrow="last", fill="white", width=2)
+        lid = self.pool.acquire("conn", (x1, y1, x2, y2))
         self.connections.append((b1, b2, lid))
+        self._journal_op({"op": "connect", "from": b1, "to": b2})
 
     # ======================== 選択系 ========================
     def _select_block(self, bid):
@@ -769,12 +1081,32 @@ class MacroEditor(ctk.CTkFrame):
             self.var_seconds.set(str(cfg.get('seconds', 1.0)))
             self.var_count.set(str(cfg.get('repeat_count', 1)))
             self.var_interval.set(str(cfg.get('repeat_interval', 0.5)))
+            self.var_policy.set(cfg.get('overrun_policy', scheduler.DEFAULT_POLICY))
             self.var_key.set(cfg.get('key', 'enter'))
+        elif act == "文字入力":
+            self._set_text_box(cfg.get('text', ''))
+            self.var_text_method.set(cfg.get('text_method', text_input.DEFAULT_METHOD))
+            self.var_text_interval.set(str(cfg.get('text_interval', 0.0)))
+        elif act == "記録再生":
+            self.var_trace_path.set(cfg.get('trace_path', ''))
+            self.var_trace_speed.set(str(cfg.get('trace_speed', 1.0)))
+        elif act == "条件待ち":
+            self.var_wait_kind.set(cfg.get('wait_kind', "時間経過"))
+            self.var_wait_timeout.set(str(cfg.get('wait_timeout', 1.0)))
+            self.var_wait_x.set(str(cfg.get('wait_x', 0)))
+            self.var_wait_y.set(str(cfg.get('wait_y', 0)))
+            self.var_wait_color.set(cfg.get('wait_color', '#FFFFFF'))
+            self.var_wait_tol.set(str(cfg.get('wait_tolerance', 0)))
+            self.var_wait_path.set(cfg.get('wait_path', ''))
+            self.var_wait_text.set(cfg.get('wait_text', ''))
         else:
             self.var_move_mode.set(cfg.get('move_mode', '絶対座標'))
             self.var_move_x.set(str(cfg.get('move_x', 0)))
             self.var_move_y.set(str(cfg.get('move_y', 0)))
             self.var_move_time.set(str(cfg.get('move_time', 0.0)))
+            self.var_move_curve.set(cfg.get('move_curve', '直線'))
+            self.var_move_rate.set(str(cfg.get('move_rate', motion.DEFAULT_RATE)))
+            self.var_move_jitter.set(str(cfg.get('move_jitter', 0.0)))
 
         self._switch_inspector_fields()
 
@@ -809,12 +1141,7 @@ class MacroEditor(ctk.CTkFrame):
         # Escで接続モードをキャンセル
         if key == 'escape' and self.connect_mode:
             self.connect_mode = False
-            if self.wire_preview and self._item_exists(self.wire_preview):
-                try:
-                    self.canvas.delete(self.wire_preview)
-                except Exception:
-                    pass
-            self.wire_preview = None
+            self._release_item('wire_preview')
             self.wire_from = None
             self._update_connect_ui()
             print("接続モードをキャンセル")
@@ -826,14 +1153,17 @@ class MacroEditor(ctk.CTkFrame):
         bids = {self.current_block_id} | set(self.multi_selected)
 
         def apply(fn):
-            for b in bids:
-                if b not in self.blocks:
-                    continue
-                fn(self.blocks[b]['config'])
-                self._refresh_block_label(b)
+            with self.bulk():
+                for b in bids:
+                    if b not in self.blocks:
+                        continue
+                    cfg = self.blocks[b]['config']
+                    fn(cfg)
+                    self._journal_op({"op": "config", "bid": b, "config": cfg})
+                    self._refresh_block_label(b)
 
         if key == 'a':
-            order = ["左クリック", "右クリック", "ダブルクリック", "キー入力", "マウス移動"]
+            order = list(ACTIONS)
             def _next(cfg):
                 i = order.index(cfg.get('action', "左クリック"))
                 cfg['action'] = order[(i + 1) % len(order)]
@@ -879,81 +1209,55 @@ class MacroEditor(ctk.CTkFrame):
     def _duplicate_blocks(self, bids):
         dx, dy = 20, 20
         mapping = {}
-        for b in bids:
-            if b not in self.blocks:
-                continue
-            meta = self.blocks[b]
-            x, y, w, h = meta['x'] + dx, meta['y'] + dy, meta['w'], meta['h']
-            nb = f"block_{self.block_counter}"
-            self.block_counter += 1
-            r = self.canvas.create_rectangle(x, y, x + w, y + h, fill="#3A3A3A", outline="#5A5A5A", width=2,
-                                             tags=("block", nb))
-            t = self.canvas.create_text(x + w / 2, y + h / 2,
-                                        text=self.canvas.itemcget(meta['text_id'], "text"),
-                                        fill="white", tags=("block", nb))
-            lp = self.canvas.create_oval(x - 6, y + h / 2 - 6, x + 6, y + h / 2 + 6,
-                                         fill="#7AA2F7", outline="", tags=("port", nb, "portL"))
-            rp = self.canvas.create_oval(x + w - 6, y + h / 2 - 6, x + w + 6, y + h / 2 + 6,
-                                         fill="#7AA2F7", outline="", tags=("port", nb, "portR"))
-            self.canvas.tag_bind(lp, "<Button-1>", lambda e, b=nb: self._start_wire(b, "L"))
-            self.canvas.tag_bind(rp, "<Button-1>", lambda e, b=nb: self._start_wire(b, "R"))
-            self.canvas.tag_bind("port", "<B1-Motion>", self._drag_wire)
-            self.canvas.tag_bind("port", "<ButtonRelease-1>", self._finish_wire)
-
-            self.blocks[nb] = {
-                'rect_id': r, 'text_id': t, 'x': x, 'y': y, 'w': w, 'h': h, 'dragging': False,
-                'ports': {'L': lp, 'R': rp},
-                'config': dict(meta['config'])
-            }
-            mapping[b] = nb
-
-        # 選択内の接続を複製
-        for (f, t, _) in list(self.connections):
-            if f in bids and t in bids:
-                nf, nt = mapping.get(f), mapping.get(t)
-                if nf and nt:
-                    self._draw_connection(nf, nt)
+        with self.bulk():
+            for b in bids:
+                if b not in self.blocks:
+                    continue
+                meta = self.blocks[b]
+                nb = f"block_{self.block_counter}"
+                self.block_counter += 1
+                label = meta.get('label') or self.canvas.itemcget(meta['text_id'], "text")
+                self._create_block_items(nb, meta['x'] + dx, meta['y'] + dy, meta['w'], meta['h'],
+                                         dict(meta['config']), label)
+                mapping[b] = nb
+
+            # 選択内の接続を複製
+            for (f, t, _) in list(self.connections):
+                if f in bids and t in bids:
+                    nf, nt = mapping.get(f), mapping.get(t)
+                    if nf and nt:
+                        self._draw_connection(nf, nt)
 
     def _delete_blocks(self, bids):
         bids = set(bids)
 
         # プレビューやマーキーを掃除
-        if self.wire_preview and self._item_exists(self.wire_preview):
-            try:
-                self.canvas.delete(self.wire_preview)
-            except Exception:
-                pass
-        self.wire_preview = None
+        self._release_item('wire_preview')
         self.wire_from = None
-        if self.marquee_rect and self._item_exists(self.marquee_rect):
-            try:
-                self.canvas.delete(self.marquee_rect)
-            except Exception:
-                pass
-        self.marquee_rect = None
+        self._release_item('marquee_rect')
         self.drag_select_origin = None
 
-        # 線削除
-        for (f, t, lid) in list(self.connections):
-            if f in bids or t in bids:
-                try:
-                    self.canvas.delete(lid)
-                except Exception:
-                    pass
-                self.connections.remove((f, t, lid))
+        # 線・ブロックの図形は削除せずプールへ返す（ブロックは所有者単位でまとめて）
+        doomed = []
+        keep = []
+        for conn in self.connections:
+            if conn[0] in bids or conn[1] in bids:
+                doomed.append(conn[2])
+            else:
+                keep.append(conn)
+        self.connections = keep
 
-        # ブロック削除
+        removed = []
         for b in bids:
-            meta = self.blocks.get(b)
+            meta = self.blocks.pop(b, None)
             if not meta:
                 continue
-            for iid in (meta['rect_id'], meta['text_id'], meta['ports']['L'], meta['ports']['R']):
-                try:
-                    self.canvas.delete(iid)
-                except Exception:
-                    pass
-            self.blocks.pop(b, None)
+            self.pool.release_owner(b)
             self.multi_selected.discard(b)
+            removed.append(b)
+        if removed:
+            self._journal_op({"op": "delete", "bids": removed})
+        self.pool.release_many(doomed)
 
         if self.current_block_id in bids:
             self.current_block_id = None
@@ -961,108 +1265,277 @@ class MacroEditor(ctk.CTkFrame):
 
         self._update_delete_button()
 
+    # ======================== 整列 ========================
+    def auto_layout(self):
+        """階層レイアウトを別スレッドで計算し、終わったら一括で反映"""
+        if self._layout_job is not None or not self.blocks:
+            return
+        ids = list(self.blocks)
+        conns = [(f, t) for (f, t, _) in self.connections]
+        box = {}
+
+        def _work():
+            t0 = time.perf_counter()
+            try:
+                box['pos'] = layered_layout(ids, conns)
+            except Exception as e:
+                box['error'] = e
+            box['seconds'] = time.perf_counter() - t0
+
+        self._layout_job = threading.Thread(target=_work, daemon=True)
+        self._layout_job.start()
+        self.after(15, self._poll_layout, box)
+
+    def _poll_layout(self, box):
+        # Tk はメインスレッドからしか触れないので、完了はポーリングで拾う
+        if self._layout_job.is_alive():
+            self.after(15, self._poll_layout, box)
+            return
+        self._layout_job = None
+        if 'error' in box:
+            print("整列エラー:", box['error'])
+            return
+        moved = 0
+        with self.bulk():
+            # 計算中に削除されたブロックは飛ばし、追加されたブロックはそのまま
+            for bid, (x, y) in box['pos'].items():
+                meta = self.blocks.get(bid)
+                if meta and (meta['x'], meta['y']) != (x, y):
+                    self._nudge_block(bid, x - meta['x'], y - meta['y'])
+                    moved += 1
+        bbox = self.canvas.bbox("all")
+        if bbox:
+            self.canvas.configure(scrollregion=(0, 0, bbox[2] + 60, bbox[3] + 60))
+        print(f"整列: {moved} ブロック移動（計算 {box['seconds'] * 1000:.0f}ms）")
+
     # ======================== 実行 ========================
     def run_macro(self):
-        stop = self.stop_flag_ref
-        incoming = {t for (_, t, _) in self.connections}
-        start_nodes = [bid for bid in self.blocks if bid not in incoming]
-        if not start_nodes:
+        try:
+            plan = compile_plan(self.to_dict())
+        except ValueError as e:
+            print("マクロ不正:", e)
+            return
+        if not plan:
             print("スタートブロックがありません。")
             return
+        if self.executor is not None:
+            self.executor.submit(plan, stop=self.stop_flag_ref)
+            return
+        run_plan(plan, self.stop_flag_ref)
 
-        visited = set()
+    def run_with_data(self):
+        """CSV / JSONL の各行をパラメータにして繰り返し実行（別スレッド）"""
+        from tkinter import filedialog, messagebox
+        path = filedialog.askopenfilename(filetypes=[("データ", "*.csv *.jsonl"), ("すべて", "*")])
+        if not path:
+            return
+        try:
+            tplan = compile_template(self.to_dict())
+        except ValueError as e:
+            print("マクロ不正:", e)
+            return
+        start = self._data_resume.get(path, 0)
+        if start and not messagebox.askyesno("データ実行", f"前回は {start} 行目で止まりました。続きから再開しますか？"):
+            start = 0
 
-        def dfs(bid):
-            if bid in visited:
+        def _worker():
+            try:
+                done = run_rows(tplan, iter_rows(path, start), self.stop_flag_ref, start=start)
+            except (OSError, ValueError) as e:
+                print("データ実行エラー:", e)
                 return
-            visited.add(bid)
-            self._exec_block(bid, stop)
-            for (f, t, _) in self.connections:
-                if f == bid:
-                    dfs(t)
-
-        for s in start_nodes:
-            dfs(s)
+            if self.stop_flag_ref():
+                self._data_resume[path] = done
+                print(f"データ実行を中断: {done} 行目から再開できます")
+            else:
+                self._data_resume.pop(path, None)
+                print(f"データ実行 完了: {done} 行")
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+    # ======================== 保存 / 読込 ========================
+    def to_dict(self) -> dict:
+        """キャンバス状態をマクロ保存形式(dict)へ"""
+        return {
+            "format": MACRO_FORMAT,
+            "blocks": {
+                bid: {"x": meta['x'], "y": meta['y'], "config": dict(meta['config'])}
+                for bid, meta in self.blocks.items()
+            },
+            "connections": [[f, t] for (f, t, _) in self.connections],
+        }
 
-    def _exec_block(self, bid, stop):
-        cfg = self.blocks[bid]['config']
-        act = cfg.get('action', "左クリック")
+    def load_dict(self, data: dict):
+        """保存形式(dict)からキャンバスを再構築（ジャーナルには記録しない）"""
+        muted, self._journal_muted = self._journal_muted, True
+        try:
+            self._delete_blocks(set(self.blocks))
+            with self.bulk():
+                for bid, b in (data.get("blocks") or {}).items():
+                    self.add_block(bid=bid, x=b.get("x", 60), y=b.get("y", 60), config=b.get("config"))
+                for c in data.get("connections") or []:
+                    self._draw_connection(c[0], c[1])
+        finally:
+            self._journal_muted = muted
+
+    def save_file(self):
+        from tkinter import filedialog
+        path = self.current_path or filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("AuterGUI マクロ", "*.json")]
+        )
+        if not path:
+            return
+        data = self.to_dict()
+        save_macro(path, data)
+        self._watch_file(path, data)
+        if path != self.current_path or self.journal is None:
+            if self.journal:
+                self.journal.discard()
+            self.current_path = path
+            self._open_journal(path, data)
+        else:
+            self._journal_start(data)
+        print(f"保存しました: {path}")
 
-        # 実行直前：修飾キー離れ待ち（mac の  対策）
-        flush_modifiers()
-        if stop():
+    def open_file(self):
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(filetypes=[("AuterGUI マクロ", "*.json")])
+        if not path:
+            return
+        try:
+            data = load_macro(path)
+        except (OSError, ValueError) as e:
+            print("読込エラー:", e)
+            return
+        self.load_dict(data)
+        self.current_path = path
+        print(f"読み込みました: {path}")
+        self._watch_file(path, data)
+        self._open_journal(path, data)
+
+    # ======================== ホットリロード ========================
+    def _watch_file(self, path, data):
+        """path の監視を開始（同じファイルなら自分の保存内容を既知にするだけ）"""
+        if self._watcher is not None and self._watcher.path == os.path.abspath(path):
+            self._watcher.sync(data)
             return
+        first = self._watcher is None
+        self._watcher = FileWatcher(path, data=data)
+        if first:
+            self.after(int(WATCH_INTERVAL * 1000), self._poll_file)
 
-        if act in ("左クリック", "右クリック", "ダブルクリック"):
-            press = cfg.get('press_type', "短押し")
-            secs = cfg.get('seconds', 1.0)
-            count = cfg.get('repeat_count', 1)
-            itv = cfg.get('repeat_interval', 0.5)
-
-            if press == "短押し":
-                x, y = pag.position()
-                for _ in range(max(1, count)):
-                    if stop():
-                        return
-                    if act == "左クリック":
-                        pag.click(x, y)
-                    elif act == "右クリック":
-                        pag.rightClick(x, y)
+    def _poll_file(self):
+        # stat だけなのでメインスレッドの after ループで確認する
+        try:
+            changed = self._watcher.poll()
+            if changed:
+                self._apply_external(*changed)
+        except Exception as e:
+            print("ホットリロード失敗:", e)
+        self.after(int(WATCH_INTERVAL * 1000), self._poll_file)
+
+    def _apply_external(self, old, new):
+        """ファイルの前回内容 → 新内容の差分だけキャンバスへ反映（未保存の他の編集は残る）"""
+        diff = diff_macro(old, new)
+        if is_empty(diff):
+            return
+        nb = new.get("blocks") or {}
+        muted, self._journal_muted = self._journal_muted, True
+        try:
+            gone = diff['conns_removed']
+            if gone:
+                keep = []
+                for conn in self.connections:
+                    if (conn[0], conn[1]) in gone:
+                        self.pool.release(conn[2])
                     else:
-                        pag.doubleClick(x, y)
-                    if busy_wait(itv, stop):
-                        return
-            else:
-                x, y = pag.position()
-                pag.moveTo(x, y)
-                pag.mouseDown()
-                t0 = time.time()
-                while time.time() - t0 < secs:
-                    if stop() or esc_pressed():
-                        pag.mouseUp()
-                        return
-                    time.sleep(0.01)
-                pag.mouseUp()
-
-        elif act == "キー入力":
-            press = cfg.get('press_type', "短押し")
-            secs = cfg.get('seconds', 1.0)
-            count = cfg.get('repeat_count', 1)
-            itv = cfg.get('repeat_interval', 0.5)
-            key = cfg.get('key', 'enter')
-
-            if press == "短押し":
-                for _ in range(max(1, count)):
-                    if stop():
-                        return
-                    pag.press(key)
-                    if busy_wait(itv, stop):
-                        return
+                        keep.append(conn)
+                self.connections = keep
+            removed = diff['removed'] & self.blocks.keys()
+            if removed:
+                self._delete_blocks(removed)
+            with self.bulk():
+                changed = set(diff['changed'])
+                for bid in diff['added']:
+                    b = nb[bid]
+                    if bid in self.blocks:      # 手元で同じ ID を作っていたら上書き
+                        changed.add(bid)
+                        diff['moved'].add(bid)
+                    else:
+                        self.add_block(bid=bid, x=b.get("x", 60), y=b.get("y", 60), config=b.get("config"))
+                for bid in changed:
+                    if bid in self.blocks:
+                        self.blocks[bid]['config'] = dict(default_config(), **(nb[bid].get("config") or {}))
+                        self._refresh_block_label(bid)
+                for bid in diff['moved']:
+                    meta = self.blocks.get(bid)
+                    if meta:
+                        x, y = nb[bid].get("x", meta['x']), nb[bid].get("y", meta['y'])
+                        self._nudge_block(bid, x - meta['x'], y - meta['y'])
+            have = {(f, t) for (f, t, _) in self.connections}
+            for (f, t) in diff['conns_added']:
+                if (f, t) not in have:
+                    self._draw_connection(f, t)
+            if diff['order']:
+                # 実行順は接続・ブロックの並びで決まるので、ファイル側の並びに揃える（手元だけのものは後ろ）
+                cpos = {(c[0], c[1]): i for i, c in enumerate(new.get("connections") or [])}
+                self.connections.sort(key=lambda c: cpos.get((c[0], c[1]), len(cpos)))
+                bpos = {bid: i for i, bid in enumerate(nb)}
+                self.blocks = dict(sorted(self.blocks.items(), key=lambda kv: bpos.get(kv[0], len(bpos))))
+        finally:
+            self._journal_muted = muted
+        if self.current_block_id in changed:
+            self._load_to_inspector(self.current_block_id)
+        # 自動保存の基準を取り直す（外部変更はジャーナルの操作に含めない）。
+        # 手元の未保存の編集はスナップショットに入るので、その印を引き継ぐ
+        if self.journal:
+            self._journal_start(self.to_dict(), compact=True)
+        print(f"外部変更を反映: {format_diff(diff)}")
+
+    # ======================== 自動保存（ジャーナル） ========================
+    def _open_journal(self, path, data=None):
+        """path（None は新規）の自動保存を開始。前回の未保存分があれば復旧を提案"""
+        if self.journal:
+            self.journal.close()
+        self.journal = Journal(path)
+        if self.journal.pending():
+            from tkinter import messagebox
+            if messagebox.askyesno("自動保存", "前回保存されなかった編集があります。復旧しますか？"):
+                recovered = self.journal.recover()
+                if recovered is not None:
+                    self.load_dict(recovered)
+                    self._journal_start(self.to_dict(), dirty=True)     # 復旧した内容はまだ保存されていない
+                    print("自動保存から復旧しました")
+                    return
+        self._journal_start(self.to_dict() if data is None else data)
+
+    def _journal_start(self, data, dirty=False, compact=False):
+        try:
+            if compact:
+                self.journal.compact(data)
             else:
-                pag.keyDown(key)
-                t0 = time.time()
-                while time.time() - t0 < secs:
-                    if stop() or esc_pressed():
-                        pag.keyUp(key)
-                        return
-                    time.sleep(0.01)
-                pag.keyUp(key)
+                self.journal.start(data, dirty)
+        except OSError as e:
+            print("自動保存を開始できません:", e)
 
-        elif act == "マウス移動":
-            mode = cfg.get('move_mode', '絶対座標')
-            x = int(cfg.get('move_x', 0))
-            y = int(cfg.get('move_y', 0))
-            dur = float(cfg.get('move_time', 0.0))
-            try:
-                if mode == "絶対座標":
-                    pag.moveTo(x, y, duration=max(0.0, dur))
-                else:
-                    pag.moveRel(x, y, duration=max(0.0, dur))
-            except Exception as e:
-                print("マウス移動エラー:", e)
-                return
+    def _journal_op(self, op):
+        """編集操作を1行追記（コストは操作の大きさに比例。マクロ全体は書かない）"""
+        if self._journal_muted or self.journal is None:
+            return
+        self.journal.append(op)
+        if self.journal.needs_compaction() and not self._compact_pending:
+            self._compact_pending = True
+            self.after_idle(self._compact_journal)
 
-        print(f"{bid} 実行完了")
+    def _compact_journal(self):
+        self._compact_pending = False
+        if self.journal and self.journal.needs_compaction():
+            self._journal_start(self.to_dict(), compact=True)
+
+    def close_journal(self):
+        """アプリ終了時：未同期分を書き出す"""
+        if self.journal:
+            self.journal.close()
 
     # ======================== ランタイムUIユーティリティ ========================
     def _tick_cursor(self):
@@ -1074,6 +1547,57 @@ class MacroEditor(ctk.CTkFrame):
             pass
         self.after(50, self._tick_cursor)
 
+    def _browse_trace(self):
+        from tkinter import filedialog
+        path = filedialog.askopenfilename(filetypes=[("入力トレース", "*.agt"), ("すべて", "*")])
+        if path:
+            self.var_trace_path.set(path)
+            self._apply_inspector()
+
+    def _simplify_trace(self):
+        """記録ファイルの移動を簡略化した *.simple.agt を作り、このブロックの再生対象にする"""
+        src = self.var_trace_path.get().strip()
+        bid = self.current_block_id
+        if not src or not os.path.exists(src) or self._simplify_job is not None:
+            return
+        dst = os.path.splitext(src)[0] + ".simple.agt"
+        box = {}
+
+        def _work():
+            try:
+                box['stats'] = path_simplify.simplify_trace(src, dst)
+            except (OSError, ValueError) as e:
+                box['error'] = e
+
+        self._simplify_job = threading.Thread(target=_work, daemon=True)
+        self._simplify_job.start()
+        self.after(50, self._poll_simplify, box, bid, dst)
+
+    def _poll_simplify(self, box, bid, dst):
+        if self._simplify_job.is_alive():
+            self.after(50, self._poll_simplify, box, bid, dst)
+            return
+        self._simplify_job = None
+        if 'error' in box:
+            print("簡略化エラー:", box['error'])
+            return
+        print("簡略化:", path_simplify.format_stats(box['stats']))
+        if bid == self.current_block_id and bid in self.blocks:
+            self.var_trace_path.set(dst)
+            self._apply_inspector()
+
+    def _fill_wait_pixel(self):
+        """現在のカーソル位置とその色を条件待ちに反映"""
+        try:
+            x, y = pag.position()
+            r, g, b = pag.pixel(x, y)[:3]
+            self.var_wait_x.set(str(x))
+            self.var_wait_y.set(str(y))
+            self.var_wait_color.set(f"#{r:02X}{g:02X}{b:02X}")
+            self._apply_inspector()
+        except Exception:
+            pass
+
     def _fill_xy_with_cursor(self):
         """現在のカーソル位置を X/Y に反映（絶対座標モード前提）"""
         try:
@@ -1086,10 +1610,18 @@ class MacroEditor(ctk.CTkFrame):
             pass
 
     # ======================== 安全ユーティリティ ========================
-    def _item_exists(self, item_id) -> bool:
-        if not item_id:
-            return False
-        try:
-            return self.canvas.type(item_id) != ""
-        except Exception:
-            return False
+    def _release_item(self, attr: str):
+        """self.<attr> の一時図形（ワイヤ・マーキー等）をプールへ返して None にする"""
+        item = getattr(self, attr)
+        if item is not None:
+            self.pool.release(item)
+        setattr(self, attr, None)
+
+
+class _BulkEdit:
+    """bulk() 中に溜める未反映の変更"""
+    __slots__ = ("labels", "moved")
+
+    def __init__(self):
+        self.labels = set()     # ラベル再計算が必要なブロック
+        self.moved = set()      # 座標を反映するブロック（線も引き直す）
@@ -0,0 +1,362 @@
+# macro_engine.py
+"""
+マクロ実行エンジン（GUI 非依存）
+- マクロの保存形式（JSON）の読み書き
+- 接続グラフを入口からDFSした実行順の「プラン」へコンパイル
+- ブロック単位の実行（エディタ / バッチ実行で共通）
+"""
+import json
+import re
+import time
+
+import pyautogui as pag
+
+from utils import flush_modifiers, esc_pressed, sleep_until
+import calibration
+import keymap
+import metrics
+import motion
+import pacing
+import scheduler
+import text_input
+import trace_format
+import wait_reactor
+
+ENGINE_VERSION = 4   # 実行意味論・プランの中身が変わったら上げる
+MACRO_FORMAT = 1     # 保存形式のバージョン
+
+ACTIONS = ("左クリック", "右クリック", "ダブルクリック", "キー入力", "文字入力", "マウス移動", "記録再生", "条件待ち")
+CLICK_ACTIONS = ("左クリック", "右クリック", "ダブルクリック")
+CLICK_COST = {"左クリック": "click", "右クリック": "right_click", "ダブルクリック": "double_click"}  # calibration の名前
+PRESS_TYPES = ("短押し", "長押し")
+MOVE_MODES = ("絶対座標", "相対座標")
+
+# アクションごとに実行で使う欄（パラメータを受け付けるのもこの欄だけ）
+_REPEAT_FIELDS = ('press_type', 'seconds', 'repeat_count', 'repeat_interval', 'overrun_policy')
+ACTION_FIELDS = {
+    **{a: _REPEAT_FIELDS for a in CLICK_ACTIONS},
+    "キー入力": _REPEAT_FIELDS + ('key',),
+    "文字入力": ('text', 'text_method', 'text_interval'),
+    "マウス移動": ('move_mode', 'move_x', 'move_y', 'move_time', 'move_curve', 'move_rate', 'move_jitter'),
+    "記録再生": ('trace_path', 'trace_speed'),
+    "条件待ち": ('wait_kind', 'wait_timeout', 'wait_x', 'wait_y', 'wait_color', 'wait_tolerance',
+                 'wait_path', 'wait_text'),
+}
+
+# 設定値中のパラメータ参照 {name}（データ実行で行の値に置き換える）。
+# 文字としての { } は {{ }} と書く（str.format と同じ）
+PARAM_RE = re.compile(r"\{\{|\}\}|\{(\w+)\}")
+
+
+def param_names(s: str) -> list:
+    """s に含まれるパラメータ名（{{ }} は数えない）"""
+    return [m.group(1) for m in PARAM_RE.finditer(s) if m.group(1)]
+
+
+def escape_braces(s: str) -> str:
+    """値をテンプレートへ埋め込むときに { } を {{ }} にする"""
+    return s.replace("{", "{{").replace("}", "}}")
+
+
+def unescape_braces(s: str) -> str:
+    return PARAM_RE.sub(lambda m: m.group(0) if m.group(1) else m.group(0)[0], s)
+
+
+def template_fields(cfg: dict) -> list:
+    """cfg のアクションが使う欄のうち、パラメータを含むもの"""
+    fields = ACTION_FIELDS.get((cfg or {}).get('action', "左クリック"), ())
+    return [k for k in fields if isinstance(cfg.get(k), str) and param_names(cfg[k])]
+
+
+def default_config() -> dict:
+    """新規ブロックの既定設定"""
+    return {
+        'action': "左クリック",
+        'press_type': "短押し",
+        'seconds': 1.0,
+        'repeat_count': 1,
+        'repeat_interval': 0.5,
+        'overrun_policy': scheduler.DEFAULT_POLICY,
+        'key': 'enter',
+        'text': '', 'text_method': text_input.DEFAULT_METHOD, 'text_interval': 0.0,
+        'move_mode': '絶対座標',
+        'move_x': 0, 'move_y': 0, 'move_time': 0.0,
+        'move_curve': '直線', 'move_rate': motion.DEFAULT_RATE, 'move_jitter': 0.0,
+        'trace_path': '', 'trace_speed': 1.0,
+        'wait_kind': '時間経過', 'wait_timeout': 1.0,
+        'wait_x': 0, 'wait_y': 0, 'wait_color': '#FFFFFF', 'wait_tolerance': 0,
+        'wait_path': '', 'wait_text': '',
+    }
+
+
+# ======================== 保存形式 ========================
+def load_macro(path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or "blocks" not in data:
+        raise ValueError(f"マクロファイルではありません: {path}")
+    return data
+
+
+def save_macro(path, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+# ======================== コンパイル ========================
+def normalize_config(cfg: dict) -> dict:
+    """既定値で補完し型を揃える（不正値は ValueError）"""
+    defaults = default_config()
+    out = dict(defaults)
+    out.update(cfg or {})
+    if out['action'] not in ACTIONS:
+        raise ValueError(f"不明なアクション: {out['action']}")
+    used = ACTION_FIELDS[out['action']]
+    for k, v in out.items():
+        if not isinstance(v, str):
+            continue
+        if k not in used:
+            if param_names(v):
+                out[k] = defaults.get(k, v)    # 使わない欄に残ったパラメータは無視する
+            continue
+        names = param_names(v)
+        if names:
+            raise ValueError(f"{k} のパラメータ {{{names[0]}}} はデータ実行でのみ使えます"
+                             "（文字の { } は {{ }} と書きます）")
+        out[k] = unescape_braces(v)
+    if out['press_type'] not in PRESS_TYPES:
+        raise ValueError(f"不明な押し方: {out['press_type']}")
+    if out['move_mode'] not in MOVE_MODES:
+        raise ValueError(f"不明な移動方法: {out['move_mode']}")
+    if out['overrun_policy'] not in scheduler.OVERRUN_POLICIES:
+        raise ValueError(f"不明な遅延方針: {out['overrun_policy']}")
+    if out['move_curve'] not in motion.CURVES:
+        raise ValueError(f"不明な軌道: {out['move_curve']}")
+    out['seconds'] = max(0.0, float(out['seconds']))
+    out['repeat_count'] = max(1, int(out['repeat_count']))
+    out['repeat_interval'] = max(0.0, float(out['repeat_interval']))
+    out['key'] = str(out['key'] or 'enter')
+    # キー名は実行のたびに解決せず、ここで送出用のコードにしておく（解決できなければ None で名前送出）
+    out['key_code'] = keymap.resolve(out['key']) if out['action'] == "キー入力" else None
+    out['text'] = str(out['text'] or '')
+    if out['text_method'] not in text_input.TEXT_METHODS:
+        raise ValueError(f"不明な入力方式: {out['text_method']}")
+    out['text_interval'] = max(0.0, float(out['text_interval']))
+    out['move_x'] = int(out['move_x'])
+    out['move_y'] = int(out['move_y'])
+    out['move_time'] = max(0.0, float(out['move_time']))
+    out['move_rate'] = min(motion.MAX_RATE, max(motion.MIN_RATE, float(out['move_rate'])))
+    out['move_jitter'] = max(0.0, float(out['move_jitter']))
+    out['trace_path'] = str(out['trace_path'] or '')
+    out['trace_speed'] = max(0.01, float(out['trace_speed']))
+    if out['wait_kind'] not in wait_reactor.WAIT_KINDS:
+        raise ValueError(f"不明な待ち条件: {out['wait_kind']}")
+    out['wait_timeout'] = max(0.0, float(out['wait_timeout']))
+    out['wait_x'] = int(out['wait_x'])
+    out['wait_y'] = int(out['wait_y'])
+    out['wait_tolerance'] = max(0, int(out['wait_tolerance']))
+    if out['action'] == "条件待ち" and out['wait_kind'] in ("色一致",):
+        wait_reactor.parse_color(out['wait_color'])
+    out['wait_path'] = str(out['wait_path'] or '')
+    out['wait_text'] = str(out['wait_text'] or '')
+    return out
+
+
+def execution_order(block_ids, connections) -> list:
+    """入口（入力なし）ブロックから接続順にDFSした実行順"""
+    outgoing = {}
+    for (f, t) in connections:
+        outgoing.setdefault(f, []).append(t)
+    incoming = {t for (_, t) in connections}
+    order, visited = [], set()
+    for s in block_ids:
+        if s in incoming:
+            continue
+        stack = [s]
+        while stack:
+            bid = stack.pop()
+            if bid in visited:
+                continue
+            visited.add(bid)
+            order.append(bid)
+            # 接続順に訪問するため逆順で積む
+            stack.extend(reversed(outgoing.get(bid, ())))
+    return order
+
+
+def compile_plan(data: dict) -> list:
+    """マクロ(dict) → [(bid, 正規化済みconfig), ...]"""
+    blocks = data.get("blocks") or {}
+    conns = []
+    for c in data.get("connections") or []:
+        f, t = c[0], c[1]
+        if f in blocks and t in blocks:
+            conns.append((f, t))
+    plan = []
+    for bid in execution_order(list(blocks), conns):
+        try:
+            cfg = normalize_config(blocks[bid].get("config"))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{bid}: {e}") from None
+        plan.append((bid, cfg))
+    return plan
+
+
+# ======================== 実行 ========================
+def run_plan(plan, stop, backend=None, on_step=None) -> bool:
+    """
+    プランを先頭から実行。
+    戻り値: True=最後まで実行, False=停止された
+    """
+    metrics.inc(metrics.RUNS_STARTED)
+    for i, (bid, cfg) in enumerate(plan):
+        if stop():
+            metrics.inc(metrics.RUNS_CANCELLED)
+            return False
+        exec_block(bid, cfg, stop, backend)
+        if on_step:
+            on_step(i, bid)
+    ok = not stop()
+    metrics.inc(metrics.RUNS_COMPLETED if ok else metrics.RUNS_CANCELLED)
+    return ok
+
+
+def _pacer(policy, interval, backend, action):
+    """遅延方針が適応のときだけ、バックエンドに合った送達確認付きの Pacer"""
+    return pacing.for_backend(interval, backend, action) if policy == "適応" else None
+
+
+def exec_block(bid, cfg, stop, backend=None):
+    inj = backend or pag
+    act = cfg.get('action', "左クリック")
+
+    # 実行直前：修飾キー離れ待ち（mac の  対策）
+    flush_modifiers(backend=inj)
+    if stop():
+        return
+
+    if act in CLICK_ACTIONS:
+        press = cfg.get('press_type', "短押し")
+        secs = cfg.get('seconds', 1.0)
+        count = cfg.get('repeat_count', 1)
+        itv = cfg.get('repeat_interval', 0.5)
+
+        if press == "短押し":
+            x, y = inj.position()
+            if act == "左クリック":
+                fire = metrics.timed("click", lambda: inj.click(x, y))
+            elif act == "右クリック":
+                fire = metrics.timed("right_click", lambda: inj.rightClick(x, y))
+            else:
+                fire = metrics.timed("double_click", lambda: inj.doubleClick(x, y))
+            policy = cfg.get('overrun_policy', scheduler.DEFAULT_POLICY)
+            st = scheduler.run_repeating(count, itv, fire, stop, policy,
+                                         cost=calibration.cost(CLICK_COST[act], backend),
+                                         pacer=_pacer(policy, itv, backend, CLICK_COST[act]))
+            if count > 1:
+                print(f"{bid} 連打: {scheduler.format_stats(st)}")
+            if st['cancelled']:
+                return
+        else:
+            x, y = inj.position()
+            inj.moveTo(x, y)
+            inj.mouseDown()
+            metrics.inc(metrics.EVENTS, ("mouse_down",))
+            # 解放の送出コスト分だけ早く離す（押下 → 解放の着弾間隔を secs に合わせる）
+            stopped = sleep_until(time.perf_counter() + secs - calibration.cost("mouse_up", backend),
+                               lambda: stop() or esc_pressed())
+            inj.mouseUp()
+            metrics.inc(metrics.EVENTS, ("mouse_up",))
+            if stopped:
+                return
+
+    elif act == "キー入力":
+        press = cfg.get('press_type', "短押し")
+        secs = cfg.get('seconds', 1.0)
+        count = cfg.get('repeat_count', 1)
+        itv = cfg.get('repeat_interval', 0.5)
+        key = cfg.get('key', 'enter')
+        code = keymap.confirm(key, cfg.get('key_code'), backend)
+        keys = keymap.sender(backend)
+
+        if press == "短押し":
+            policy = cfg.get('overrun_policy', scheduler.DEFAULT_POLICY)
+            st = scheduler.run_repeating(count, itv, metrics.timed("key", lambda: keys.press(key, code)), stop, policy,
+                                         cost=calibration.cost("key", backend),
+                                         pacer=_pacer(policy, itv, backend, "key"))
+            if count > 1:
+                print(f"{bid} 連打: {scheduler.format_stats(st)}")
+            if st['cancelled']:
+                return
+        else:
+            keys.down(key, code)
+            metrics.inc(metrics.EVENTS, ("key_down",))
+            stopped = sleep_until(time.perf_counter() + secs - calibration.cost("key_up", backend),
+                               lambda: stop() or esc_pressed())
+            keys.up(key, code)
+            metrics.inc(metrics.EVENTS, ("key_up",))
+            if stopped:
+                return
+
+    elif act == "文字入力":
+        st = text_input.type_text(cfg.get('text', ''), cfg.get('text_method', text_input.DEFAULT_METHOD),
+                                  stop, inj, interval=cfg.get('text_interval', 0.0))
+        metrics.inc(metrics.EVENTS, ("text",), st['calls'])
+        metrics.inc(metrics.TEXT_CHARS, (st['method'],), st['chars'])
+        metrics.inc(metrics.TEXT_SECONDS, (st['method'],), st['elapsed'])
+        print(f"{bid} 文字入力: {text_input.format_stats(st)}")
+        if st['cancelled']:
+            return
+
+    elif act == "マウス移動":
+        mode = cfg.get('move_mode', '絶対座標')
+        x = int(cfg.get('move_x', 0))
+        y = int(cfg.get('move_y', 0))
+        dur = float(cfg.get('move_time', 0.0))
+        try:
+            if dur <= 0:
+                if mode == "絶対座標":
+                    metrics.timed("move", lambda: inj.moveTo(x, y))()
+                else:
+                    metrics.timed("move", lambda: inj.moveRel(x, y))()
+            else:
+                # 事前計算した軌道を固定レートで再生
+                st = motion.move(
+                    x, y, dur, stop, inj, relative=(mode != "絶対座標"),
+                    rate_hz=cfg.get('move_rate', motion.DEFAULT_RATE),
+                    curve=cfg.get('move_curve', '直線'),
+                    jitter=cfg.get('move_jitter', 0.0),
+                )
+                metrics.inc(metrics.EVENTS, ("move",), st['sent'])
+                print(f"{bid} 移動: {st['elapsed']:.3f}s / {st['target_seconds']:.3f}s, "
+                      f"{st['achieved_hz']:.0f}Hz, 終点誤差 {st['end_error']}")
+                if st['cancelled']:
+                    return
+        except Exception as e:
+            print("マウス移動エラー:", e)
+            return
+
+    elif act == "記録再生":
+        # ファイルから逐次読みしながら再生（全体をメモリに載せない）
+        if not cfg.get('trace_path'):
+            print(f"{bid} 記録ファイルが未指定です")
+            return
+        try:
+            st = trace_format.replay(cfg['trace_path'], stop, inj, speed=cfg.get('trace_speed', 1.0))
+        except (OSError, ValueError) as e:
+            print("記録再生エラー:", e)
+            return
+        metrics.inc(metrics.EVENTS, ("trace",), st['events'])
+        print(f"{bid} 再生: {st['events']}件 / {st['elapsed']:.3f}s")
+        if st['cancelled']:
+            return
+
+    elif act == "条件待ち":
+        # 共有リアクターで待つ（タイムアウト時はそのまま次へ進む）
+        t0 = time.perf_counter()
+        ok = wait_reactor.wait_for(cfg, stop)
+        if stop():
+            return
+        print(f"{bid} 待ち: {'成立' if ok else 'タイムアウト'} ({time.perf_counter() - t0:.3f}s)")
+
+    print(f"{bid} 実行完了")
@@ -43,6 +43,10 @@ def excepthook(etype, evalue, etb):
 sys.excepthook = excepthook
 _log("==== LAUNCH ====")
 
+# 実行ログ（print）をリングバッファへも流し、「ログ」タブで見られるようにする
+import run_console
+run_console.install()
+
 import platform, subprocess
 
 # ダークテーマ
@@ -58,29 +62,53 @@ class App(ctk.CTk):
         # 停止フラグ（スレッド間共有）
         self._stop_flag = False
 
-        # タブ
-        self.tabs = ctk.CTkTabview(self); self.tabs.pack(fill="both", expand=True)
+        # 実行専用プロセス（AUTERGUI_EXECUTOR=process 指定時のみ。無ければ従来どおりスレッドで実行）
+        self.executor = None
+        if os.environ.get("AUTERGUI_EXECUTOR") == "process":
+            try:
+                from executor import Executor
+                self.executor = Executor.from_env()
+                _log(f"executor process started (pid {self.executor.proc.pid})")
+            except Exception as e:
+                _log(f"executor failed: {e}")
+
+        # タブ（中身は初めて表示するときに作る）
+        self.tabs = ctk.CTkTabview(self, command=self._on_tab_change); self.tabs.pack(fill="both", expand=True)
         self.tab_actions = self.tabs.add("操作")
         self.tab_macro   = self.tabs.add("マクロ")
-
-        # 「操作」タブ
-        self.action_panel = ActionPanel(
-            self.tab_actions,
-            on_start=self._on_start_hotkey,
-            stop_flag_ref=lambda: self._stop_flag
-        )
-        self.action_panel.pack(fill="both", expand=True)
-
-        # 「マクロ」タブ
-        self.macro_editor = MacroEditor(
-            self.tab_macro,
-            stop_flag_ref=lambda: self._stop_flag
-        )
-        self.macro_editor.pack(fill="both", expand=True)
+        self.tab_log     = self.tabs.add("ログ")
+        self.action_panel = None
+        self.macro_editor = None
+        self.run_console = None
+        self._ensure_tab(self.tabs.get())
 
         # ホットキー管理
         self.hk = HotkeyManager(on_fire=self._fire_action, on_esc=self._on_esc)
 
+        # ローカル制御API（AUTERGUI_CONTROL_PORT 指定時のみ）
+        self.control = None
+        port = os.environ.get("AUTERGUI_CONTROL_PORT")
+        if port:
+            try:
+                from control_server import MacroService, serve_in_thread
+                self.control = MacroService(os.environ.get("AUTERGUI_MACRO_DIR", "."))
+                httpd = serve_in_thread(self.control, int(port))
+                _log(f"control API listening on 127.0.0.1:{httpd.server_address[1]}")
+            except Exception as e:
+                _log(f"control API failed: {e}")
+
+        # メトリクス（AUTERGUI_METRICS_PORT / AUTERGUI_METRICS_FILE 指定時のみ）
+        try:
+            import metrics
+            started = metrics.start_from_env()
+            if started:
+                _log(f"metrics: {started}")
+        except Exception as e:
+            _log(f"metrics failed: {e}")
+
+        # 終了時の後始末（ホットキー・実行プロセス・自動保存の書き出し）は全 OS で
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
         # mac の権限促しは GUI 構築後に遅延実行（Finder 起動時のクラッシュ回避）
         if platform.system() == "Darwin":
             try:
@@ -88,6 +116,29 @@ class App(ctk.CTk):
             except Exception as e:
                 _log(f"schedule deferred ax prompt failed: {e}")
 
+    # ==== タブの遅延構築 ====
+    def _on_tab_change(self):
+        self._ensure_tab(self.tabs.get())
+
+    def _ensure_tab(self, name):
+        if name == "操作" and self.action_panel is None:
+            self.action_panel = ActionPanel(
+                self.tab_actions,
+                on_start=self._on_start_hotkey,
+                stop_flag_ref=lambda: self._stop_flag
+            )
+            self.action_panel.pack(fill="both", expand=True)
+        elif name == "マクロ" and self.macro_editor is None:
+            self.macro_editor = MacroEditor(
+                self.tab_macro,
+                stop_flag_ref=lambda: self._stop_flag,
+                executor=self.executor
+            )
+            self.macro_editor.pack(fill="both", expand=True)
+        elif name == "ログ" and self.run_console is None:
+            self.run_console = run_console.RunConsole(self.tab_log)
+            self.run_console.pack(fill="both", expand=True)
+
     # ---- macOS: アクセシビリティ/入力監視の促しは GUI 初期化後に安全に実行 ----
     def _mac_deferred_ax_prompt(self):
         # Finder 起動での EXC_BAD_ACCESS を避けるため、ネイティブ API 呼び出しは避け、設定アプリを開くだけにする
@@ -106,8 +157,6 @@ class App(ctk.CTk):
         except Exception as e:
             _log(f"Deferred AX prompt failed: {e}")
 
-        self.protocol("WM_DELETE_WINDOW", self._on_close)
-
     # ==== 実行フロー ====
     def _on_start_hotkey(self):
         """Start ボタン→ホットキー待機開始"""
@@ -117,22 +166,37 @@ class App(ctk.CTk):
     def _on_esc(self):
         """グローバル ESC"""
         self._stop_flag = True
+        if self.executor:
+            self.executor.cancel()
+        if self.control:
+            self.control.cancel()
 
     def _fire_action(self):
         """グローバル起動キー（Alt+Shift または ⌘+Shift）押下時"""
         self._stop_flag = False
-        # アクション実行は別スレッド
-        threading.Thread(target=self.action_panel.run_worker, daemon=True).start()
-        # 起動後は必要ならホットキーを止める（誤発火防止）
-        self.hk.stop()
+        if self.executor:
+            # 実行専用プロセスへプランとして渡す（GUI の GIL と競合しない）
+            self.executor.submit(self.action_panel.to_plan(), stop=lambda: self._stop_flag,
+                                 on_done=lambda res: print("完了！" if res['ok'] else "停止しました"))
+        else:
+            # アクション実行は別スレッド
+            threading.Thread(target=self.action_panel.run_worker, daemon=True).start()
+        # 起動後は起動キーを外す（誤発火防止）。ESC は実行中も受け付ける
+        self.hk.disarm()
 
     # ==== 終了処理 ====
     def _on_close(self):
         try:
             self.hk.stop()
+            if self.executor:
+                self.executor.close()
+            if self.macro_editor:
+                self.macro_editor.close_journal()
         finally:
             self.destroy()
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()    # 実行専用プロセス（spawn）をアプリ化しても起動できるように
     app = App()
     app.mainloop()
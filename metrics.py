@@ -0,0 +1,254 @@
+# metrics.py
+"""
+実行エンジンの累積メトリクス（カウンタ / ヒストグラム / ゲージ）と Prometheus テキスト出力。
+
+記録側（ホットパス）はロックを取らない：スレッドごとの集計表（シャード）に
+加算するだけで、読み出し（スクレイプ）時に全シャードを合算する。
+終了したスレッドのシャードはスクレイプ時に退避用シャードへ畳み込む。
+ゲージ（現在値）は合算しないので、共有の辞書へ代入するだけ（最後に書いた値が出る）。
+
+公開方法（どちらも任意・併用可）:
+    AUTERGUI_METRICS_PORT=9464     → http://127.0.0.1:9464/metrics
+    AUTERGUI_METRICS_FILE=/path    → 定期的にファイルへ書き出し（node_exporter の textfile 用）
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+ERROR_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 1.0)
+FLUSH_INTERVAL = 15.0
+
+
+class _Shard:
+    __slots__ = ("thread", "counters", "hists")
+
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.counters = {}      # (name, labels) -> 値
+        self.hists = {}         # (name, labels) -> [バケットごとの件数..., 合計]
+
+
+class Registry:
+    def __init__(self):
+        self._meta = {}         # name -> (type, help, ラベル名, buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._gauges = {}       # (name, labels) -> 値
+        self._lock = threading.Lock()
+
+    # ==== 定義 ====
+    def counter(self, name: str, help_text: str, labels=()):
+        self._meta[name] = ("counter", help_text, tuple(labels), None)
+        return name
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self._meta[name] = ("histogram", help_text, tuple(labels), tuple(buckets))
+        return name
+
+    def gauge(self, name: str, help_text: str, labels=()):
+        self._meta[name] = ("gauge", help_text, tuple(labels), None)
+        return name
+
+    # ==== 記録（ロックなし） ====
+    def _shard(self) -> _Shard:
+        sh = getattr(self._local, "shard", None)
+        if sh is None:
+            sh = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(sh)
+        return sh
+
+    def inc(self, name: str, labels=(), n=1):
+        c = self._shard().counters
+        key = (name, labels)
+        c[key] = c.get(key, 0) + n
+
+    def observe(self, name: str, value: float, labels=()):
+        h = self._shard().hists
+        key = (name, labels)
+        st = h.get(key)
+        buckets = self._meta[name][3]
+        if st is None:
+            st = h[key] = [0] * (len(buckets) + 1) + [0.0]
+        st[bisect.bisect_left(buckets, value)] += 1
+        st[-1] += value
+
+    def set(self, name: str, value: float, labels=()):
+        self._gauges[(name, labels)] = value
+
+    # ==== 読み出し ====
+    @staticmethod
+    def _copy(d: dict) -> dict:
+        # 記録中のスレッドがキーを追加すると反復が失敗するので取り直す
+        while True:
+            try:
+                return {k: (list(v) if isinstance(v, list) else v) for k, v in list(d.items())}
+            except RuntimeError:
+                continue
+
+    @staticmethod
+    def _merge_into(dst: _Shard, counters: dict, hists: dict):
+        for k, v in counters.items():
+            dst.counters[k] = dst.counters.get(k, 0) + v
+        for k, v in hists.items():
+            cur = dst.hists.get(k)
+            if cur is None:
+                dst.hists[k] = list(v)
+            else:
+                for i, x in enumerate(v):
+                    cur[i] += x
+
+    def snapshot(self):
+        """全シャードを合算した (counters, hists) を返す"""
+        total = _Shard()
+        with self._lock:
+            live = []
+            for sh in self._shards:
+                counters, hists = self._copy(sh.counters), self._copy(sh.hists)
+                if sh.thread is not None and not sh.thread.is_alive():
+                    # 終了スレッドは以後書き込まないので退避シャードへ畳む
+                    self._merge_into(self._retired, counters, hists)
+                else:
+                    live.append(sh)
+                    self._merge_into(total, counters, hists)
+            self._shards = live
+            self._merge_into(total, self._retired.counters, self._retired.hists)
+        return total.counters, total.hists
+
+    def render(self) -> str:
+        """Prometheus テキスト形式（0.0.4）"""
+        counters, hists = self.snapshot()
+        out = []
+        for name, (kind, help_text, label_names, buckets) in self._meta.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                if not label_names:
+                    out.append(f"{name} {counters.get((name, ()), 0)}")
+                    continue
+                for (n, labels), v in sorted(counters.items()):
+                    if n == name:
+                        out.append(f"{name}{_labels(label_names, labels)} {v}")
+            elif kind == "gauge":
+                for (n, labels), v in sorted(self._copy(self._gauges).items()):
+                    if n == name:
+                        out.append(f"{name}{_labels(label_names, labels)} {v}")
+            else:
+                for (n, labels), st in sorted(hists.items()):
+                    if n != name:
+                        continue
+                    acc = 0
+                    for le, c in zip(buckets + (float("inf"),), st[:-1]):
+                        acc += c
+                        le_txt = "+Inf" if le == float("inf") else repr(le)
+                        out.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (le_txt,))} {acc}")
+                    out.append(f"{name}_sum{_labels(label_names, labels)} {st[-1]}")
+                    out.append(f"{name}_count{_labels(label_names, labels)} {acc}")
+        return "\n".join(out) + "\n"
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in zip(names, values)) + "}"
+
+
+# ==== エンジンのメトリクス ====
+registry = Registry()
+
+RUNS_STARTED = registry.counter("autergui_runs_started_total", "開始した実行の数")
+RUNS_COMPLETED = registry.counter("autergui_runs_completed_total", "最後まで実行した数")
+RUNS_CANCELLED = registry.counter("autergui_runs_cancelled_total", "停止された実行の数")
+EVENTS = registry.counter("autergui_events_injected_total", "送出した入力イベント数", ("type",))
+OVERRUNS = registry.counter("autergui_interval_overruns_total", "繰り返しで予定時刻に遅れた回数", ("policy",))
+COST_BOUND = registry.counter("autergui_cost_bound_repeats_total", "間隔が送出コスト以下だった繰り返しの数", ("policy",))
+TEXT_CHARS = registry.counter("autergui_text_chars_total", "文字入力で送った文字数", ("method",))
+TEXT_SECONDS = registry.counter("autergui_text_seconds_total", "文字入力にかかった時間（秒）", ("method",))
+WAITS = registry.counter("autergui_waits_total", "条件待ちの結果", ("kind", "result"))
+INJECT_SECONDS = registry.histogram(
+    "autergui_injection_seconds", "1回の入力送出にかかった時間", ("action",), LATENCY_BUCKETS)
+WAIT_LATENESS = registry.histogram(
+    "autergui_wait_lateness_seconds", "時間待ち・期限の実際の遅れ", ("kind",), ERROR_BUCKETS)
+PACED_RATE = registry.gauge("autergui_paced_rate_hz", "適応連打で実際に出せた送出レート", ("action",))
+PACED_CAP = registry.gauge("autergui_paced_cap_hz", "適応連打の現在の上限レート", ("action",))
+PACED_BACKLOG = registry.gauge("autergui_paced_backlog_events", "送達待ちと推定したイベント数", ("action",))
+PACING_BACKOFFS = registry.counter("autergui_pacing_backoffs_total", "送達の遅れで減速した回数", ("action",))
+
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set
+
+
+def timed(action: str, fn):
+    """fn の呼び出しごとに送出数と所要時間を記録するラッパ"""
+    labels = (action,)
+
+    def _timed():
+        t = time.perf_counter()
+        fn()
+        observe(INJECT_SECONDS, time.perf_counter() - t, labels)
+        inc(EVENTS, labels)
+    return _timed
+
+
+# ==== 公開 ====
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve_in_thread(port: int = 0, host: str = "127.0.0.1"):
+    httpd = ThreadingHTTPServer((host, port), _Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def write_file(path: str):
+    # 読み手が書きかけを見ないよう一時ファイル経由で置き換える
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+
+def start_file_flusher(path: str, interval: float = FLUSH_INTERVAL):
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_file(path)
+            except OSError as e:
+                print("メトリクス書き出し失敗:", e)
+    t = threading.Thread(target=_loop, daemon=True)
+    t.start()
+    return t
+
+
+def start_from_env():
+    """環境変数に応じてエンドポイント / ファイル出力を開始。開始した内容を返す"""
+    started = {}
+    port = os.environ.get("AUTERGUI_METRICS_PORT")
+    if port:
+        started["port"] = serve_in_thread(int(port)).server_address[1]
+    path = os.environ.get("AUTERGUI_METRICS_FILE")
+    if path:
+        start_file_flusher(path)
+        started["file"] = path
+    return started
@@ -0,0 +1,137 @@
+# motion.py
+"""
+マウス移動の軌道を事前計算し、固定レートで再生するモーションエンジン。
+pyautogui の duration 指定（ステップごとの sleep）の代わりに使う。
+- 軌道：直線 / イージング / ベジェ曲線 ＋ 任意の揺らぎ（始点・終点はずれない）
+- 再生：開始時刻 + i/rate の絶対期限で1点ずつ送出（遅れが積み上がらない）
+- 結果：実効レート、所要時間、終点誤差を返す
+"""
+import math
+import random
+import time
+from array import array
+
+from utils import sleep_until
+
+CURVES = ("直線", "イージング", "ベジェ")
+
+DEFAULT_RATE = 240     # Hz
+MIN_RATE, MAX_RATE = 30, 1000
+
+
+def _ease_in_out(t: float) -> float:
+    # 3次の smoothstep
+    return t * t * (3.0 - 2.0 * t)
+
+
+def path_coefficients(n: int, curve: str = "直線", bend: float = 0.25):
+    """
+    n 点の軌道係数 [(u, v), ...]。始点 P0・変位 D=(dx, dy) に対し
+        点 = P0 + u·D + v·(-dy, dx)
+    （v は進行方向に垂直な膨らみ。ベジェのみ非 0）
+    始点・終点に依存しないので、スクリプト出力でも同じ係数を埋め込める。
+    """
+    ts = [i / n for i in range(1, n + 1)]
+    if curve == "イージング":
+        return [(_ease_in_out(t), 0.0) for t in ts]
+    if curve == "ベジェ":
+        # 3次ベジェ。制御点は P0 + D/3, P0 + 2D/3 を垂直方向へ bend·|D| ずらしたもの
+        out = []
+        for t in ts:
+            t = _ease_in_out(t)
+            u = 1.0 - t
+            b, c, d = 3 * u * u * t, 3 * u * t * t, t * t * t
+            out.append((b / 3 + 2 * c / 3 + d, bend * (b + c)))
+        return out
+    return [(t, 0.0) for t in ts]
+
+
+def jitter_offsets(n: int, jitter: float, seed=None):
+    """揺らぎ [(jx, jy), ...]。両端で 0 になる窓を掛け、終点をずらさない"""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        w = math.sin(math.pi * (i + 1) / n)
+        out.append((rnd.gauss(0.0, jitter) * w, rnd.gauss(0.0, jitter) * w))
+    return out
+
+
+def point_count(duration: float, rate_hz: float = DEFAULT_RATE) -> int:
+    rate = min(MAX_RATE, max(MIN_RATE, float(rate_hz)))
+    return max(1, int(round(duration * rate)))
+
+
+def build_path(x0, y0, x1, y1, duration: float, rate_hz: float = DEFAULT_RATE,
+               curve: str = "直線", jitter: float = 0.0, bend: float = 0.25, seed=None):
+    """
+    始点→終点の軌道を整数座標の配列 (xs, ys) として返す。
+    点数は duration × rate（最後の点は必ず終点）。
+    bend: ベジェ時の膨らみ（始点終点間距離に対する比）
+    """
+    n = point_count(duration, rate_hz)
+    dx, dy = x1 - x0, y1 - y0
+    coeffs = path_coefficients(n, curve, bend)
+    fx = [x0 + u * dx - v * dy for u, v in coeffs]
+    fy = [y0 + u * dy + v * dx for u, v in coeffs]
+
+    if jitter > 0:
+        for i, (jx, jy) in enumerate(jitter_offsets(n, jitter, seed)):
+            fx[i] += jx
+            fy[i] += jy
+
+    xs = array('l', (int(round(v)) for v in fx))
+    ys = array('l', (int(round(v)) for v in fy))
+    xs[-1], ys[-1] = int(x1), int(y1)
+    return xs, ys
+
+
+def play_path(xs, ys, rate_hz: float, stop, backend) -> dict:
+    """
+    軌道を固定レートで再生。i 番目の点は start + (i+1)/rate に送出する。
+    同じ座標が続く点は送出を省く（期限は維持）。
+    """
+    rate = min(MAX_RATE, max(MIN_RATE, float(rate_hz)))
+    period = 1.0 / rate
+    spin = min(0.001, period / 4)   # 高レートでも大半は sleep で待つ
+    n = len(xs)
+    sent = 0
+    late_max = 0.0
+    last = None
+    cancelled = False
+    t0 = time.perf_counter()
+    for i in range(n):
+        deadline = t0 + (i + 1) * period
+        if sleep_until(deadline, stop, spin):
+            cancelled = True
+            break
+        late_max = max(late_max, time.perf_counter() - deadline)
+        p = (xs[i], ys[i])
+        if p != last:
+            backend.moveTo(p[0], p[1], _pause=False)
+            last = p
+            sent += 1
+    elapsed = time.perf_counter() - t0
+    try:
+        px, py = backend.position()
+        end_error = math.hypot(px - xs[-1], py - ys[-1])
+    except Exception:
+        end_error = None
+    return {
+        "points": n,
+        "sent": sent,
+        "target_seconds": n * period,
+        "elapsed": elapsed,
+        "achieved_hz": (i + 1 if not cancelled else i) / elapsed if elapsed > 0 else 0.0,
+        "late_max": late_max,
+        "end_error": end_error,
+        "cancelled": cancelled,
+    }
+
+
+def move(x, y, duration: float, stop, backend, relative: bool = False,
+         rate_hz: float = DEFAULT_RATE, curve: str = "直線", jitter: float = 0.0) -> dict:
+    """現在位置から (x, y)（relative なら相対量）へ duration 秒で移動"""
+    sx, sy = backend.position()
+    tx, ty = (sx + x, sy + y) if relative else (x, y)
+    xs, ys = build_path(sx, sy, tx, ty, duration, rate_hz, curve, jitter)
+    return play_path(xs, ys, rate_hz, stop, backend)
@@ -0,0 +1,119 @@
+# pacing.py
+"""
+送達に合わせた連打の速度制御（遅延方針「適応」）。
+0.001 秒間隔のような高レートでは、ウィンドウシステムの入力キューが溢れて、イベントが
+遅れて・まとめて届いたり、受け手のアプリに捨てられたりする。ここでは送出側で送達の遅れを測り、
+遅れが増えたら上限レートを下げ、収まったら少しずつ戻す（AIMD：加算で増やし、乗算で減らす）。
+
+送達の遅れの測り方:
+    X11  : PROBE_PERIOD ごとに pyautogui の X 接続で往復（XSync）。サーバーが溜まった
+           リクエストを処理し終えるまで返らないので、往復時間 - 最小往復時間 ≒ キューの待ち時間
+    その他: 往復の手段が無いので送出1回の所要時間で代用（入力キューが詰まると送出 API も遅くなる）
+待ち時間 × 現在のレートを滞留イベント数として、実際のレート・上限・滞留をメトリクスへ出す。
+"""
+import collections
+import platform
+import time
+
+import metrics
+
+PROBE_PERIOD = 0.02     # 送達確認の間隔
+TARGET_DELAY = 0.002    # キューの待ち時間の許容。超えたら減速
+DECREASE = 0.7          # 減速の倍率
+INCREASE = 0.05         # 1回の確認で戻す量（指定レートに対する割合）
+MIN_RATE = 20.0         # これより下げない（Hz）
+MAX_RATE = 5000.0       # 間隔 0 のときの上限（Hz）
+BASE_WINDOW = 200       # 最小往復時間を取る直近の確認回数
+
+
+def x11_roundtrip(backend=None):
+    """pyautogui の X 接続での往復（無ければ None）"""
+    if platform.system() != "Linux":
+        return None
+    import pyautogui as pag
+    if backend is not None and backend is not pag:
+        return None
+    display = getattr(getattr(pag, "platformModule", None), "_display", None)
+    return getattr(display, "sync", None)
+
+
+class Pacer:
+    def __init__(self, interval: float, probe=None, action: str = "repeat"):
+        """
+        interval: 指定の間隔（これより速くは送らない）
+        probe   : 往復して送達を待つ関数（None なら送出の所要時間で代用）
+        """
+        self.max_rate = 1.0 / interval if interval > 0 else MAX_RATE
+        self.rate = self.max_rate       # 楽観的に始め、遅れが見えたら下げる
+        self.probe = probe
+        self.labels = (action,)
+        self._rtts = collections.deque(maxlen=BASE_WINDOW)
+        self._next = 0.0
+        self._t0 = None
+        self._last = None
+        self.sent = 0
+        self.probes = 0
+        self.backoffs = 0
+        self.backlog = 0.0
+        self.min_rate = self.max_rate
+
+    def interval(self) -> float:
+        """次の送出までの間隔（上限レートの逆数）"""
+        return 1.0 / self.rate
+
+    def after_fire(self, dt: float):
+        """送出1回ごとに呼ぶ。dt = 送出の所要時間"""
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now
+        self._last = now
+        self.sent += 1
+        if now < self._next:
+            return
+        self._next = now + PROBE_PERIOD
+        if self.probe is not None:
+            t = time.perf_counter()
+            self.probe()
+            dt = time.perf_counter() - t
+        self.update(dt)
+
+    def update(self, rtt: float):
+        """往復時間（または送出時間）1件で上限レートを調整"""
+        self.probes += 1
+        self._rtts.append(rtt)
+        delay = max(0.0, rtt - min(self._rtts))
+        self.backlog = delay * self.rate
+        if delay > TARGET_DELAY:
+            self.rate = max(MIN_RATE, self.rate * DECREASE)
+            self.backoffs += 1
+            metrics.inc(metrics.PACING_BACKOFFS, self.labels)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE)
+        self.min_rate = min(self.min_rate, self.rate)
+        metrics.set_gauge(metrics.PACED_CAP, self.rate, self.labels)
+        metrics.set_gauge(metrics.PACED_BACKLOG, self.backlog, self.labels)
+        metrics.set_gauge(metrics.PACED_RATE, self.achieved(), self.labels)
+
+    def achieved(self) -> float:
+        """最初と最後の送出の間の平均レート（Hz）"""
+        if self.sent < 2:
+            return 0.0
+        span = self._last - self._t0
+        return (self.sent - 1) / span if span > 0 else 0.0
+
+    def finish(self):
+        metrics.set_gauge(metrics.PACED_RATE, self.achieved(), self.labels)
+
+    def stats(self) -> dict:
+        return {
+            'achieved': self.achieved(),
+            'cap': self.rate,
+            'min_cap': self.min_rate,
+            'backlog': self.backlog,
+            'backoffs': self.backoffs,
+            'probes': self.probes,
+        }
+
+
+def for_backend(interval: float, backend=None, action: str = "repeat") -> Pacer:
+    return Pacer(interval, probe=x11_roundtrip(backend), action=action)
@@ -0,0 +1,315 @@
+# path_simplify.py
+"""
+記録したマウス移動の簡略化（間引き）。
+1) 重複除去 : 同じ座標が続く区間は最初と最後だけ残す（停止していた時間は保つ）
+2) 簡略化   : 時刻同期距離（SED）による Ramer–Douglas–Peucker。残した2点の間を
+              時間比で直線補間した位置と、元の各サンプルのずれが tolerance px 以内になる
+3) 再時刻化 : 残した点は元の時刻のまま。点の間を「マウス移動」ブロックと同じ
+              等速直線で動かせば、元の軌跡・タイミングから tolerance 以内に収まる
+クリック・キーなど移動以外のイベントは区切りとしてそのまま残す（その前後の移動点も残る）。
+numpy があればベクトル化して処理する（1時間の記録でも数秒）。無ければ純 Python で同じ結果。
+
+使い方:
+    python path_simplify.py session.agt -o session_s.agt --tolerance 2
+    python path_simplify.py session.agt -o session_s.agt --rate 120    # 点の間を 120Hz で補間して書く
+    python path_simplify.py session.agt --macro moves.json             # マウス移動ブロックの列へ
+"""
+import argparse
+import json
+import os
+import time
+from array import array
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+import trace_format as tf
+
+DEFAULT_TOLERANCE = 2.0     # px
+WINDOW = 65536              # 1回の RDP で扱う最大点数（最悪計算量を抑える。境界の点は残る）
+
+
+# ======================== 読込み ========================
+def _read_columns(path):
+    """トレース全体を列ごとの配列 (t, kind, button, x, y, code) で返す（キーのコードは現行形式に揃える）"""
+    with tf.TraceReader(path) as r:
+        if np is not None:
+            dtype = np.dtype([("t", "<f8"), ("kind", "u1"), ("button", "u1"), ("_pad", "V2"),
+                              ("x", "<i4"), ("y", "<i4"), ("code", "<i4")])
+            parts = [np.frombuffer(r._mm, dtype=dtype, count=count, offset=off + tf._CHUNK.size)
+                     for (off, count, _, _) in r.chunks]
+            # mmap を閉じる前に複製し、参照を手放す
+            rec = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+            del parts
+            cols = tuple(np.array(rec[name]) for name in ("t", "kind", "button", "x", "y", "code"))
+        else:
+            cols = (array("d"), array("B"), array("B"), array("i"), array("i"), array("i"))
+            appends = [c.append for c in cols]
+            for rec in r.iter_from(0):
+                for add, v in zip(appends, rec):
+                    add(v)
+        if r.version != tf.VERSION:
+            kind, code = cols[1], cols[5]
+            for i in range(len(kind)):
+                code[i] = tf.upgrade_code(int(kind[i]), int(code[i]), r.version)
+        return cols
+
+
+# ======================== 簡略化（1本の移動列） ========================
+def _simplify_run_np(t, x, y, tolerance):
+    n = len(t)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    if n <= 2:
+        return keep
+    # 重複除去：前後とも同じ座標の点（停止区間の内側）は落とす
+    same = (np.diff(x) == 0) & (np.diff(y) == 0)
+    uniq = np.ones(n, dtype=bool)
+    uniq[1:-1] = ~(same[:-1] & same[1:])
+    idx = np.flatnonzero(uniq)
+    tt, xx, yy = t[idx], x[idx].astype(np.float64), y[idx].astype(np.float64)
+    m = len(idx)
+    kept = np.zeros(m, dtype=bool)
+    kept[::WINDOW] = True
+    kept[-1] = True
+    eps2 = tolerance * tolerance
+    # 再帰の代わりに「段」ごとにまとめて処理する：未確定の全点について所属区間の
+    # SED を一度に求め、区間ごとの最大点で分割（分割不要の区間の点は確定）
+    alive = ~kept
+    while True:
+        cand = np.flatnonzero(alive)
+        if not cand.size:
+            break
+        ki = np.flatnonzero(kept)
+        s = np.cumsum(kept)[cand] - 1       # 所属区間の番号（左端の残す点）
+        a, b = ki[s], ki[s + 1]
+        span = tt[b] - tt[a]
+        r = np.divide(tt[cand] - tt[a], span, out=np.zeros(cand.size), where=span > 0)
+        ex = xx[cand] - (xx[a] + (xx[b] - xx[a]) * r)
+        ey = yy[cand] - (yy[a] + (yy[b] - yy[a]) * r)
+        d = ex * ex + ey * ey
+        starts = np.flatnonzero(np.concatenate(([True], s[1:] != s[:-1])))
+        mx = np.maximum.reduceat(d, starts)
+        counts = np.diff(np.append(starts, cand.size))
+        # 区間ごとの最初の最大点
+        hits = np.flatnonzero(d == np.repeat(mx, counts))
+        hs = s[hits]
+        first = hits[np.concatenate(([True], hs[1:] != hs[:-1]))]
+        split = mx > eps2
+        kept[cand[first[split]]] = True
+        alive[cand[first[split]]] = False
+        # 分割しない区間の点は確定（落とす）
+        done = np.repeat(~split, counts)
+        alive[cand[done]] = False
+    keep[idx[kept]] = True
+    return keep
+
+
+def _simplify_run_py(t, x, y, tolerance):
+    n = len(t)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    if n <= 2:
+        return keep
+    idx = [0]
+    for i in range(1, n - 1):
+        if not (x[i] == x[i - 1] == x[i + 1] and y[i] == y[i - 1] == y[i + 1]):
+            idx.append(i)
+    idx.append(n - 1)
+    tt = [t[i] for i in idx]
+    xx = [x[i] for i in idx]
+    yy = [y[i] for i in idx]
+    kept = [False] * len(idx)
+    eps2 = tolerance * tolerance
+    for w0 in range(0, len(idx) - 1, WINDOW):
+        w1 = min(w0 + WINDOW, len(idx) - 1)
+        kept[w0] = kept[w1] = True
+        stack = [(w0, w1)]
+        while stack:
+            a, b = stack.pop()
+            if b - a < 2:
+                continue
+            ta, xa, ya = tt[a], xx[a], yy[a]
+            span = tt[b] - ta
+            vx, vy = xx[b] - xa, yy[b] - ya
+            best, m = -1.0, a
+            for i in range(a + 1, b):
+                r = (tt[i] - ta) / span if span > 0 else 0.0
+                ex = xx[i] - (xa + vx * r)
+                ey = yy[i] - (ya + vy * r)
+                d = ex * ex + ey * ey
+                if d > best:
+                    best, m = d, i
+            if best > eps2:
+                kept[m] = True
+                stack.append((a, m))
+                stack.append((m, b))
+    for j, k in enumerate(kept):
+        if k:
+            keep[idx[j]] = True
+    return keep
+
+
+def simplify_moves(t, x, y, tolerance: float = DEFAULT_TOLERANCE):
+    """1本の移動列（時刻, x, y）の残す点のマスク。始点・終点は必ず残す"""
+    if np is not None:
+        return _simplify_run_np(np.asarray(t, dtype=np.float64), np.asarray(x), np.asarray(y), tolerance)
+    return _simplify_run_py(t, x, y, tolerance)
+
+
+def simplify_columns(t, kind, x, y, tolerance: float = DEFAULT_TOLERANCE):
+    """
+    全イベントの残すマスク。移動以外は全部残し、移動は連続区間ごとに簡略化する。
+    戻り値: (マスク, 重複除去・簡略化前の移動数)
+    """
+    n = len(t)
+    if np is not None:
+        t, x, y = np.asarray(t, dtype=np.float64), np.asarray(x), np.asarray(y)
+        is_move = np.asarray(kind) == tf.MOVE
+        keep = ~is_move
+        # 移動の連続区間の [開始, 終了)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], is_move.view(np.int8), [0]))))
+        for s, e in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+            keep[s:e] = _simplify_run_np(t[s:e], x[s:e], y[s:e], tolerance)
+        return keep, int(is_move.sum())
+    keep = [True] * n
+    moves = 0
+    i = 0
+    while i < n:
+        if kind[i] != tf.MOVE:
+            i += 1
+            continue
+        j = i
+        while j < n and kind[j] == tf.MOVE:
+            j += 1
+        keep[i:j] = _simplify_run_py(t[i:j], x[i:j], y[i:j], tolerance)
+        moves += j - i
+        i = j
+    return keep, moves
+
+
+# ======================== 出力 ========================
+def _kept_rows(cols, keep):
+    """残すレコードを (t, kind, button, x, y, code) で順に返す"""
+    if np is not None:
+        sel = np.flatnonzero(keep)
+        return zip(*(c[sel].tolist() for c in cols))
+    return (tuple(c[i] for c in cols) for i, k in enumerate(keep) if k)
+
+
+def simplify_trace(src, dst, tolerance: float = DEFAULT_TOLERANCE, rate: float = 0.0) -> dict:
+    """
+    src のトレースを簡略化して dst へ書く。
+    rate > 0 なら残した移動点の間を rate Hz で直線補間した点も書く（再生を滑らかにする）。
+    """
+    t0 = time.perf_counter()
+    cols = _read_columns(src)
+    t, kind, button, x, y, code = cols
+    keep, moves_in = simplify_columns(t, kind, x, y, tolerance)
+    period = 1.0 / rate if rate > 0 else 0.0
+    out = moves_out = vertices = 0
+    # TraceWriter は既存ファイルへ追記するので、一時ファイルへ書いてから置き換える
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with tf.TraceWriter(tmp) as w:
+        prev = None         # 直前に書いた移動点（移動以外を挟んだら補間しない）
+        for (rt, rk, rb, rx, ry, rc) in _kept_rows(cols, keep):
+            if rk == tf.MOVE:
+                vertices += 1
+                if period and prev is not None:
+                    pt, px, py = prev
+                    steps = int((rt - pt) / period)
+                    for k in range(1, steps):
+                        u = k * period / (rt - pt)
+                        w.write(pt + k * period, tf.MOVE, int(round(px + (rx - px) * u)),
+                                int(round(py + (ry - py) * u)))
+                        out += 1
+                        moves_out += 1
+                prev = (rt, rx, ry)
+                moves_out += 1
+            else:
+                prev = None
+            w.write(rt, rk, rx, ry, code=rc, button=rb)
+            out += 1
+    os.replace(tmp, dst)
+    n = len(t)
+    return {
+        'events_in': n, 'events_out': out,
+        'moves_in': moves_in, 'moves_out': moves_out, 'vertices': vertices,
+        'ratio': n / out if out else 0.0,
+        'move_ratio': moves_in / vertices if vertices else 0.0,
+        'tolerance': tolerance,
+        'seconds': time.perf_counter() - t0,
+        'backend': "numpy" if np is not None else "python",
+    }
+
+
+def move_segments(path, tolerance: float = DEFAULT_TOLERANCE):
+    """
+    簡略化した移動を [(x, y, 所要秒), ...] で返す（マウス移動ブロックの並び）。
+    移動以外のイベントは含めない。戻り値: (区間リスト, 読み飛ばした移動以外の件数)
+    """
+    cols = _read_columns(path)
+    t, kind, button, x, y, code = cols
+    keep, _ = simplify_columns(t, kind, x, y, tolerance)
+    segs = []
+    skipped = 0
+    prev_t = None
+    for (rt, rk, _, rx, ry, _) in _kept_rows(cols, keep):
+        if rk != tf.MOVE:
+            skipped += 1
+            continue
+        segs.append((rx, ry, 0.0 if prev_t is None else rt - prev_t))
+        prev_t = rt
+    return segs, skipped
+
+
+def to_macro(segments) -> dict:
+    """区間の列 → 絶対座標・直線のマウス移動ブロックを順につないだマクロ(dict)"""
+    from layout import layered_layout
+    from macro_engine import MACRO_FORMAT, default_config
+    bids = [f"block_{i + 1}" for i in range(len(segments))]
+    conns = list(zip(bids, bids[1:]))
+    pos = layered_layout(bids, conns)
+    blocks = {}
+    for bid, (x, y, dur) in zip(bids, segments):
+        cfg = default_config()
+        cfg.update(action="マウス移動", move_mode="絶対座標", move_x=int(x), move_y=int(y),
+                   move_time=round(float(dur), 6), move_curve="直線")
+        blocks[bid] = {"x": pos[bid][0], "y": pos[bid][1], "config": cfg}
+    return {"format": MACRO_FORMAT, "blocks": blocks, "connections": [list(c) for c in conns]}
+
+
+def format_stats(st: dict) -> str:
+    return (f"{st['events_in']} → {st['events_out']} イベント（{st['ratio']:.1f}倍圧縮）, "
+            f"移動 {st['moves_in']} → 頂点 {st['vertices']}（{st['move_ratio']:.1f}倍）, "
+            f"許容 {st['tolerance']}px, {st['seconds']:.2f}s [{st['backend']}]")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="記録したマウス移動の簡略化")
+    ap.add_argument("trace", help="入力トレース(.agt)")
+    ap.add_argument("-o", "--output", help="簡略化したトレースの出力先")
+    ap.add_argument("--macro", help="マウス移動ブロックの列としてマクロ(JSON)へ出力")
+    ap.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="許容誤差(px)")
+    ap.add_argument("--rate", type=float, default=0.0, help="頂点の間を補間するレート(Hz)。0=頂点のみ")
+    args = ap.parse_args(argv)
+    if not args.output and not args.macro:
+        ap.error("-o か --macro を指定してください")
+
+    if args.output:
+        print(format_stats(simplify_trace(args.trace, args.output, args.tolerance, args.rate)))
+    if args.macro:
+        segs, skipped = move_segments(args.trace, args.tolerance)
+        with open(args.macro, "w", encoding="utf-8") as f:
+            json.dump(to_macro(segs), f, ensure_ascii=False, indent=2)
+        print(f"{len(segs)} ブロックを書き出しました: {args.macro}"
+              + (f"（移動以外の {skipped} 件は含みません）" if skipped else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+# plan_cache.py
+"""
+コンパイル済みプランのディスクキャッシュ（内容アドレス方式）
+キー = sha256(エンジン版 + マクロファイルの中身)。一度コンパイルしたマクロは、
+次回から検証・グラフ解析・コンパイルを丸ごと省いてプランを読み出す。
+
+- 1エントリ1ファイル（<キー>.json）。書き込みは一時ファイル → os.replace で原子的に
+  行うため、複数のランナープロセスが同時に読み書きしても壊れたエントリは見えない
+- 合計サイズが上限を超えたら最終利用時刻（mtime）の古い順に削除（LRU）
+- ヒット / ミス等の統計はプロセスごとに数える
+
+保存先は環境変数 AUTERGUI_PLAN_CACHE（未設定なら ~/.autergui/plan_cache）
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from macro_engine import ENGINE_VERSION, compile_plan, load_macro
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".autergui", "plan_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SUFFIX = ".json"
+
+
+def content_key(raw: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(f"engine={ENGINE_VERSION}\n".encode("ascii"))
+    h.update(raw)
+    return h.hexdigest()
+
+
+class PlanCache:
+    def __init__(self, directory=None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = os.path.abspath(directory or os.environ.get("AUTERGUI_PLAN_CACHE") or DEFAULT_DIR)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._stats[name] += n
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    # ==== 取得 / 保存 ====
+    def get(self, key: str):
+        """キャッシュ済みプランを返す。無ければ None"""
+        path = self._entry(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if entry.get("engine") != ENGINE_VERSION:
+                raise ValueError("engine version")
+            plan = [(bid, cfg) for bid, cfg in entry["plan"]]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            # 壊れた / 古いエントリは捨ててミス扱い
+            self._count("errors")
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)      # LRU 用に最終利用時刻を更新
+        except OSError:
+            pass
+        return plan
+
+    def put(self, key: str, plan: list):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=SUFFIX, dir=self.directory)
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"engine": ENGINE_VERSION, "plan": plan}, f, ensure_ascii=False)
+                os.replace(tmp, self._entry(key))
+            except BaseException:
+                self._remove(tmp)
+                raise
+        except OSError as e:
+            # キャッシュに書けなくても実行は続ける
+            print("プランキャッシュ書き込み失敗:", e)
+            self._count("errors")
+            return
+        self._count("stores")
+        self.evict()
+
+    def load_plan(self, path) -> list:
+        """マクロファイルを読み、キャッシュにあればそれを、無ければコンパイルして保存"""
+        with open(path, "rb") as f:
+            raw = f.read()
+        key = content_key(raw)
+        plan = self.get(key)
+        if plan is not None:
+            self._count("hits")
+            return plan
+        self._count("misses")
+        plan = compile_plan(load_macro(path))
+        self.put(key, plan)
+        return plan
+
+    # ==== 容量管理 ====
+    def evict(self) -> int:
+        """合計サイズが上限以下になるまで古いエントリを消す。削除数を返す"""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            if not name.endswith(SUFFIX) or name.startswith("."):
+                continue
+            p = os.path.join(self.directory, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue        # 他プロセスが先に消した
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        removed = 0
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(p):
+                    removed += 1
+                total -= size
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def clear(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+        looked = st["hits"] + st["misses"]
+        st["hit_rate"] = st["hits"] / looked if looked else 0.0
+        return st
+
+
+_default = None
+
+
+def default_cache() -> PlanCache:
+    global _default
+    if _default is None:
+        _default = PlanCache()
+    return _default
+
+
+def load_plan(path) -> list:
+    return default_cache().load_plan(path)
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="AuterGUI プランキャッシュ")
+    ap.add_argument("command", choices=("info", "clear"))
+    ap.add_argument("--dir", default=None, help="キャッシュの場所")
+    args = ap.parse_args(argv)
+    cache = PlanCache(args.dir)
+    if args.command == "clear":
+        cache.clear()
+        print("削除しました:", cache.directory)
+        return 0
+    try:
+        names = [n for n in os.listdir(cache.directory) if n.endswith(SUFFIX)]
+    except OSError:
+        names = []
+    size = sum(os.path.getsize(os.path.join(cache.directory, n)) for n in names)
+    print(f"{cache.directory}: {len(names)} 件 / {size / 1024:.1f} KiB（上限 {cache.max_bytes // (1024 * 1024)} MiB）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+# run_console.py
+"""
+実行ログのコンソール（Finder / デスクトップから起動して標準出力が見えなくても確認できるように）
+- RingLog       : 固定長のリングバッファ。書き込み側（ワーカースレッド）はロックを取らず、
+                  番号付きのスロットへ上書きするだけ。読み出し側は番号で続きを拾い、
+                  上書きされて読めなかった行は「省略」として数える
+- ConsoleStream : sys.stdout / sys.stderr の差し替え。元の出力へもそのまま流す（tee）。
+                  print は本文と改行を別々に write するため、スレッドごとに行を組み立てる
+- RunConsole    : 「ログ」タブ。FLUSH_MS ごとに after でまとめて描画するので、
+                  1ms 間隔の連打が毎回 print しても GUI は詰まらない
+"""
+import itertools
+import sys
+import threading
+import time
+
+import customtkinter as ctk
+
+CAPACITY = 4096         # リングバッファの行数
+FLUSH_MS = 100          # 描画の最短間隔
+MAX_LINES = 2000        # テキストボックスに残す行数
+
+ring = None             # install() 後の RingLog
+
+
+class RingLog:
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self._buf = [None] * capacity     # (番号, 時刻, 本文, stderr か)
+        self._seq = itertools.count()     # next() は GIL 下で不可分
+
+    def write_line(self, text: str, err: bool = False):
+        seq = next(self._seq)
+        self._buf[seq % self.capacity] = (seq, time.time(), text, err)
+
+    def read_since(self, seq: int):
+        """
+        seq 番以降で書き終わっている行。
+        戻り値: (行のリスト, 次に読む番号, 上書きされて読めなかった行数)
+        """
+        out = []
+        dropped = 0
+        cap = self.capacity
+        while len(out) < cap:
+            e = self._buf[seq % cap]
+            if e is None or e[0] < seq:
+                break           # まだ書かれていない（書き込み途中を含む）
+            if e[0] > seq:
+                # 一周以上追い越された。残っている最古の番号まで進める
+                nxt = max(seq + 1, e[0] - cap + 1)
+                dropped += nxt - seq
+                seq = nxt
+                continue
+            out.append(e)
+            seq += 1
+        return out, seq, dropped
+
+
+class ConsoleStream:
+    """write された文字列を行ごとに RingLog へ入れ、元のストリームにも書く"""
+    def __init__(self, log: RingLog, orig, err: bool = False):
+        self.log = log
+        self.orig = orig        # pythonw / Finder 起動では None のことがある
+        self.err = err
+        self._partial = {}      # スレッド ID -> 改行待ちの断片
+
+    def write(self, s):
+        if not s:
+            return 0
+        tid = threading.get_ident()
+        lines = (self._partial.pop(tid, "") + s).split("\n")
+        for line in lines[:-1]:
+            self.log.write_line(line, self.err)
+        if lines[-1]:
+            self._partial[tid] = lines[-1]
+        if self.orig is not None:
+            try:
+                self.orig.write(s)
+            except Exception:
+                pass
+        return len(s)
+
+    def flush(self):
+        if self.orig is not None:
+            try:
+                self.orig.flush()
+            except Exception:
+                pass
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.orig, name)
+
+
+def install(capacity: int = CAPACITY) -> RingLog:
+    """stdout / stderr をリングバッファへ流す（2回目以降は同じ RingLog を返す）"""
+    global ring
+    if ring is None:
+        ring = RingLog(capacity)
+        sys.stdout = ConsoleStream(ring, sys.stdout)
+        sys.stderr = ConsoleStream(ring, sys.stderr, err=True)
+    return ring
+
+
+# ======================== 表示 ========================
+class RunConsole(ctk.CTkFrame):
+    """「ログ」タブ：RingLog を FLUSH_MS ごとにまとめて描画"""
+    def __init__(self, master, log: RingLog = None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.log = log or install()
+        self._seq = 0
+        self._lines = 0
+        self._dropped = 0
+
+        bar = ctk.CTkFrame(self); bar.pack(fill="x", padx=8, pady=(8, 4))
+        ctk.CTkButton(bar, text="クリア", width=70, command=self.clear).pack(side="left", padx=6, pady=6)
+        self.chk_follow = ctk.CTkCheckBox(bar, text="自動スクロール"); self.chk_follow.select()
+        self.chk_follow.pack(side="left", padx=6, pady=6)
+        self.lbl_status = ctk.CTkLabel(bar, text="", text_color="gray")
+        self.lbl_status.pack(side="right", padx=8, pady=6)
+
+        self.text = ctk.CTkTextbox(self, wrap="none")
+        self.text.pack(fill="both", expand=True, padx=8, pady=(0, 8))
+        self.text.tag_config("err", foreground="#F7768E")
+        self.text.tag_config("note", foreground="gray")
+        self.text.configure(state="disabled")
+        self.after(0, self._flush)
+
+    def clear(self):
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.configure(state="disabled")
+        self._lines = 0
+        self._dropped = 0
+        self._update_status()
+
+    def _update_status(self):
+        self.lbl_status.configure(
+            text=f"{self._lines} 行" + (f" / 省略 {self._dropped} 行" if self._dropped else ""))
+
+    def _flush(self):
+        try:
+            if not self.winfo_exists():
+                return
+        except Exception:
+            return
+        entries, self._seq, dropped = self.log.read_since(self._seq)
+        if entries or dropped:
+            self.text.configure(state="normal")
+            if dropped:
+                self._dropped += dropped
+                self.text.insert("end", f"…（{dropped} 行を省略）\n", "note")
+                self._lines += 1
+            # 連続する同種の行はまとめて1回で insert する
+            chunk, err = [], None
+            for _, t, line, is_err in entries:
+                if chunk and is_err != err:
+                    self.text.insert("end", "".join(chunk), "err" if err else None)
+                    chunk = []
+                err = is_err
+                chunk.append(f"{time.strftime('%H:%M:%S', time.localtime(t))}.{int(t * 1000) % 1000:03d} {line}\n")
+            if chunk:
+                self.text.insert("end", "".join(chunk), "err" if err else None)
+            self._lines += len(entries)
+            if self._lines > MAX_LINES:
+                excess = self._lines - MAX_LINES
+                self.text.delete("1.0", f"{excess + 1}.0")
+                self._lines = MAX_LINES
+            self.text.configure(state="disabled")
+            if self.chk_follow.get():
+                self.text.see("end")
+            self._update_status()
+        self.after(FLUSH_MS, self._flush)
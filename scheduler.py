@@ -0,0 +1,119 @@
+# scheduler.py
+"""
+繰り返し実行（短押し連打）のスケジューラ。
+n 回目を「開始時刻 + n × 間隔」の絶対期限で実行するため、
+クリック/キー送出にかかった時間が間隔に加算されずドリフトしない。
+
+遅延（前の送出が次の期限を過ぎた）時の方針:
+    追いつく: 遅れた分は間を空けずに送出し、予定の総時間に戻す
+    スキップ: 過ぎた枠は捨て、次の枠（格子上）まで待つ
+    延長    : 遅れた時点を新しい基準にして以降をずらす（従来に近い挙動）
+    適応    : 送達の遅れを測って上限レートを上下させ（pacing.Pacer）、遅れたら延長と同じくずらす。
+              入力キューを溢れさせず、まとめ撃ちもしない
+
+cost には calibration で計測した1回の送出コストを渡す。絶対期限なので送出時間は毎回
+自動的に差し引かれるが、間隔が送出コスト以下だと期限はそもそも守れない（送出律速）。
+その場合は結果の 'cost_bound' を立て、format_stats で知らせる。
+"""
+import time
+
+import metrics
+import pacing
+from utils import sleep_until
+
+OVERRUN_POLICIES = ("追いつく", "スキップ", "延長", "適応")
+DEFAULT_POLICY = "追いつく"
+
+
+def run_repeating(count: int, interval: float, fire, stop, policy: str = DEFAULT_POLICY,
+                  cost: float = 0.0, pacer=None) -> dict:
+    """
+    fire() を count 回、interval 間隔で呼ぶ。最後の送出後も1間隔分待つ（ブロック長 = 回数 × 間隔）。
+    戻り値: {'fired', 'overruns', 'skipped', 'elapsed', 'drift', 'cancelled', 'cost', 'cost_bound'}
+        drift = 実際の終了時刻 - 予定の終了時刻（秒）
+        cost_bound = 複数回の送出で、間隔が送出コスト以下だった
+    適応のときは 'paced'（Pacer.stats()）も返す。pacer を渡さなければ往復なしの Pacer を使う
+    """
+    count = max(1, int(count))
+    interval = max(0.0, float(interval))
+    cost = max(0.0, float(cost))
+    cost_bound = count > 1 and cost > 0 and interval <= cost
+    if cost_bound:
+        metrics.inc(metrics.COST_BOUND, (policy,))
+    fired = overruns = skipped = 0
+    cancelled = False
+
+    if policy == "適応" and pacer is None:
+        pacer = pacing.Pacer(interval)
+    elif policy != "適応":
+        pacer = None
+    itv = interval          # 現在の間隔（適応では Pacer に合わせて変わる）
+
+    t0 = time.perf_counter()
+    base = t0               # 延長・スキップ・適応で動く基準時刻
+    slot = 0                # base からの枠番号
+    for n in range(count):
+        if n:
+            if pacer is not None:
+                want = max(interval, pacer.interval())
+                if want != itv:
+                    # 直前の枠を基準に、新しい間隔で格子を張り直す
+                    base, slot, itv = base + (slot - 1) * itv, 1, want
+            deadline = base + slot * itv
+            now = time.perf_counter()
+            if now > deadline and itv > 0:
+                overruns += 1
+                if policy == "スキップ":
+                    missed = int((now - deadline) / itv) + 1
+                    skipped += missed
+                    slot += missed
+                    deadline = base + slot * itv
+                elif policy in ("延長", "適応"):
+                    base, slot = now, 0
+                    deadline = now
+            if sleep_until(deadline, stop):
+                cancelled = True
+                break
+        elif stop():
+            cancelled = True
+            break
+        if pacer is not None:
+            t = time.perf_counter()
+            fire()
+            pacer.after_fire(time.perf_counter() - t)
+        else:
+            fire()
+        fired += 1
+        slot += 1
+
+    if not cancelled:
+        if sleep_until(base + slot * itv, stop):
+            cancelled = True
+    end = time.perf_counter()
+    if pacer is not None:
+        pacer.finish()
+    if overruns:
+        metrics.inc(metrics.OVERRUNS, (policy,), overruns)
+    return {
+        'fired': fired,
+        'overruns': overruns,
+        'skipped': skipped,
+        'elapsed': end - t0,
+        'drift': (end - t0) - count * interval,
+        'cancelled': cancelled,
+        'cost': cost,
+        'cost_bound': cost_bound,
+        'paced': pacer.stats() if pacer is not None else None,
+    }
+
+
+def format_stats(st: dict) -> str:
+    return (f"{st['fired']}回 / {st['elapsed']:.3f}s, ドリフト {st['drift'] * 1000:+.2f}ms, "
+            f"遅延 {st['overruns']}回" + (f"（{st['skipped']}枠スキップ）" if st['skipped'] else "")
+            + (f" ※間隔が送出コスト {st['cost'] * 1000:.2f}ms 以下（送出律速）" if st.get('cost_bound') else "")
+            + (_format_paced(st['paced']) if st.get('paced') else ""))
+
+
+def _format_paced(p: dict) -> str:
+    return (f", 適応 実績 {p['achieved']:.0f}Hz / 上限 {p['cap']:.0f}Hz（最低 {p['min_cap']:.0f}Hz）"
+            f" / 滞留 {p['backlog']:.1f} / 減速 {p['backoffs']}回")
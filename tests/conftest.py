@@ -0,0 +1,6 @@
+# conftest.py
+"""モジュールはリポジトリ直下に平置きなので、テストからはそのまま import できるようにする"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
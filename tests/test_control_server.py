@@ -0,0 +1,141 @@
+# test_control_server.py
+"""制御API をループバックで起動し、一覧・読込・起動・進捗ストリーム・キャンセル・実行中の 409 を確かめる"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import control_server
+import plan_cache
+from macro_engine import save_macro
+
+
+class FakeBackend:
+    """送出を数えるだけのバックエンド"""
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def position(self):
+        return (0, 0)
+
+    def __getattr__(self, name):
+        def _call(*a, **k):
+            with self._lock:
+                self.calls.append(name)
+        return _call
+
+
+def _macro(**cfg) -> dict:
+    return {"blocks": {"b0": {"x": 0, "y": 0, "config": dict({"action": "左クリック"}, **cfg)}},
+            "connections": []}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("AUTERGUI_PLAN_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(plan_cache, "_default", None)
+    macros = tmp_path / "macros"
+    macros.mkdir()
+    save_macro(str(macros / "quick.json"), _macro(repeat_count=3, repeat_interval=0.0))
+    save_macro(str(macros / "long.json"), _macro(repeat_count=100000, repeat_interval=0.01))
+    backend = FakeBackend()
+    svc = control_server.MacroService(str(macros), backend=backend)
+    httpd = control_server.serve_in_thread(svc, port=0)
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield base, svc, backend
+    svc.cancel()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _req(base, method, path):
+    req = urllib.request.Request(base + path, method=method, data=b"" if method == "POST" else None)
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return r.status, json.loads(r.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def _progress(base) -> list:
+    with urllib.request.urlopen(base + "/progress", timeout=10) as r:
+        return [json.loads(line) for line in r if line.strip()]
+
+
+def test_list_and_load(server):
+    base, _, _ = server
+    code, body = _req(base, "GET", "/macros")
+    assert code == 200
+    assert body == {"available": ["long", "quick"], "loaded": []}
+
+    code, body = _req(base, "POST", "/macros/quick/load")
+    assert (code, body) == (200, {"macro": "quick", "steps": 1})
+    assert _req(base, "GET", "/macros")[1]["loaded"] == ["quick"]
+
+    assert _req(base, "POST", "/macros/missing/load")[0] == 404
+    assert _req(base, "POST", "/macros/..%2Fx/load")[0] == 404
+
+
+def test_start_and_progress(server):
+    base, _, backend = server
+    code, body = _req(base, "POST", "/macros/quick/start")
+    assert code == 202
+    events = _progress(base)
+    assert [ev["event"] for ev in events] == ["start", "step", "done"]
+    assert all(ev["run"] == body["run"] for ev in events)
+    assert _req(base, "GET", "/status")[1]["state"] == "done"
+    assert backend.calls.count("click") == 3
+
+
+def test_busy_and_cancel(server):
+    base, _, _ = server
+    assert _req(base, "POST", "/macros/long/start")[0] == 202
+
+    # 実行中の start は並行して来ても全部 409（キャンセル要求も消さない）
+    codes = []
+    threads = [threading.Thread(target=lambda: codes.append(_req(base, "POST", "/macros/quick/start")[0]))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert codes == [409] * 8
+
+    assert _req(base, "POST", "/cancel") == (200, {"cancelled": True})
+    events = _progress(base)
+    assert events[0]["event"] == "start" and events[-1]["event"] == "cancelled"
+    assert _req(base, "GET", "/status")[1]["state"] == "cancelled"
+
+    # 終わったあとは次の start を受け付ける
+    assert _req(base, "POST", "/macros/quick/start")[0] == 202
+    assert _progress(base)[-1]["event"] == "done"
+
+
+def test_concurrent_starts_from_idle(server):
+    base, svc, _ = server
+    svc.load("long")
+    codes = []
+    barrier = threading.Barrier(8)
+
+    def _start():
+        barrier.wait()
+        codes.append(_req(base, "POST", "/macros/long/start")[0])
+
+    threads = [threading.Thread(target=_start) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(codes) == [202] + [409] * 7
+    assert _req(base, "POST", "/cancel")[1]["cancelled"] is True
+    assert _progress(base)[-1]["event"] == "cancelled"
+
+
+def test_metrics(server):
+    base, _, _ = server
+    with urllib.request.urlopen(base + "/metrics", timeout=10) as r:
+        assert r.status == 200
+        assert r.headers["Content-Type"].startswith("text/plain")
@@ -0,0 +1,98 @@
+# test_export_roundtrip.py
+"""書き出したスクリプトとエンジンのイベント列（種類・引数・時刻）が一致すること"""
+import pytest
+
+import export_script
+import motion
+import scheduler
+import trace_format as tf
+
+
+def _chain(*configs) -> dict:
+    bids = [f"block_{i}" for i in range(len(configs))]
+    return {
+        "blocks": {b: {"x": 0, "y": 0, "config": cfg} for b, cfg in zip(bids, configs)},
+        "connections": [[f, t] for f, t in zip(bids, bids[1:])],
+    }
+
+
+def _assert_roundtrip(data):
+    res = export_script.verify(data)
+    assert res["ok"], res["mismatches"]
+    assert res["events"] > 0
+    return res
+
+
+@pytest.mark.parametrize("policy", scheduler.OVERRUN_POLICIES)
+@pytest.mark.parametrize("action", ["左クリック", "右クリック", "ダブルクリック", "キー入力"])
+def test_repeat(action, policy):
+    _assert_roundtrip(_chain({"action": action, "key": "a", "repeat_count": 5,
+                              "repeat_interval": 0.02, "overrun_policy": policy}))
+
+
+@pytest.mark.parametrize("action", ["左クリック", "キー入力"])
+def test_hold(action):
+    _assert_roundtrip(_chain({"action": action, "key": "shift", "press_type": "長押し", "seconds": 0.3}))
+
+
+@pytest.mark.parametrize("method", ["1文字ずつ", "一括入力"])
+def test_text(method):
+    _assert_roundtrip(_chain({"action": "文字入力", "text": "abc {{x}} あ", "text_method": method,
+                              "text_interval": 0.01}))
+
+
+@pytest.mark.parametrize("curve", motion.CURVES)
+def test_glide(curve):
+    _assert_roundtrip(_chain(
+        {"action": "マウス移動", "move_x": 300, "move_y": 200, "move_time": 0.2, "move_curve": curve},
+        {"action": "マウス移動", "move_mode": "相対座標", "move_x": -40, "move_y": 15, "move_time": 0.1,
+         "move_curve": curve},
+    ))
+
+
+def test_instant_moves():
+    _assert_roundtrip(_chain(
+        {"action": "マウス移動", "move_x": 10, "move_y": 20},
+        {"action": "マウス移動", "move_mode": "相対座標", "move_x": 5, "move_y": -5},
+    ))
+
+
+def test_trace_replay(tmp_path):
+    path = str(tmp_path / "rec.agt")
+    with tf.TraceWriter(path, chunk_records=4) as w:
+        w.write(0.00, tf.MOVE, 10, 10)
+        w.write(0.05, tf.DOWN, 10, 10, button=tf.LEFT)
+        w.write(0.10, tf.UP, 12, 11, button=tf.LEFT)
+        w.write(0.12, tf.KEY_DOWN, code=tf.key_code("a"))
+        w.write(0.20, tf.KEY_UP, code=tf.key_code("a"))
+        w.write(0.25, tf.SCROLL, 12, 11, code=-3)
+    _assert_roundtrip(_chain({"action": "記録再生", "trace_path": path, "trace_speed": 2.0}))
+
+
+def test_waits(tmp_path):
+    present = tmp_path / "ready"
+    present.write_text("")
+    _assert_roundtrip(_chain(
+        {"action": "左クリック"},
+        {"action": "条件待ち", "wait_kind": "時間経過", "wait_timeout": 0.25},
+        {"action": "左クリック"},
+        {"action": "条件待ち", "wait_kind": "ファイル出現", "wait_path": str(present), "wait_timeout": 1.0},
+        {"action": "右クリック"},
+        {"action": "条件待ち", "wait_kind": "ファイル出現", "wait_path": str(tmp_path / "missing"),
+         "wait_timeout": 0.1},
+        {"action": "ダブルクリック"},
+    ))
+
+
+def test_mixed_macro_is_deterministic():
+    data = _chain(
+        {"action": "左クリック", "repeat_count": 3, "repeat_interval": 0.05},
+        {"action": "キー入力", "key": "a", "press_type": "長押し", "seconds": 0.2},
+        {"action": "マウス移動", "move_x": 100, "move_y": 80, "move_time": 0.1},
+        {"action": "文字入力", "text": "hi", "text_method": "1文字ずつ", "text_interval": 0.02},
+        {"action": "条件待ち", "wait_kind": "時間経過", "wait_timeout": 0.1},
+        {"action": "右クリック", "press_type": "長押し", "seconds": 0.1},
+    )
+    first = _assert_roundtrip(data)
+    second = _assert_roundtrip(data)
+    assert (first["events"], first["max_skew"]) == (second["events"], second["max_skew"])
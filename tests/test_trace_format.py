@@ -0,0 +1,72 @@
+# test_trace_format.py
+"""トレースのキーのコードが UI の KEY_LIST に依らず保存・再生されること"""
+import struct
+
+import pytest
+
+import path_simplify
+import trace_format as tf
+import utils
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.keys = []
+
+    def keyDown(self, name, **_):
+        self.keys.append(("down", name))
+
+    def keyUp(self, name, **_):
+        self.keys.append(("up", name))
+
+
+def _write_keys(path, names):
+    with tf.TraceWriter(path) as w:
+        for i, name in enumerate(names):
+            w.write(i * 0.001, tf.KEY_DOWN, code=tf.key_code(name))
+
+
+def _replayed(path):
+    inj = RecordingBackend()
+    tf.replay(path, lambda: False, inj, speed=100.0)
+    return [name for _, name in inj.keys]
+
+
+@pytest.mark.parametrize("name", ["a", "A", "あ", "é", "\n", "enter", "shiftleft", "f24", "optionright"])
+def test_key_code_round_trip(name):
+    assert tf.key_name(tf.key_code(name)) == name
+
+
+def test_unknown_key():
+    assert tf.key_code("no_such_key") == -1
+    assert tf.key_code("") == -1
+    assert tf.key_name(-1) is None
+
+
+def test_codes_do_not_follow_key_list(tmp_path, monkeypatch):
+    path = str(tmp_path / "k.agt")
+    _write_keys(path, ["a", "Z", "ä", "enter"])
+    monkeypatch.setattr(utils, "KEY_LIST", ["enter", "a"] + list(reversed(utils.KEY_LIST)))
+    assert _replayed(path) == ["a", "Z", "ä", "enter"]
+
+
+def test_reads_version_1(tmp_path):
+    path = str(tmp_path / "v1.agt")
+    with tf.TraceWriter(path) as w:
+        w.write(0.0, tf.KEY_DOWN, code=tf._V1_KEYS.index("b"))
+        w.write(0.001, tf.KEY_DOWN, code=tf._V1_KEYS.index("enter"))
+    with open(path, "r+b") as f:
+        f.seek(8)
+        f.write(struct.pack("<H", 1))
+    with tf.TraceReader(path) as r:
+        assert r.version == 1
+    assert _replayed(path) == ["b", "enter"]
+    with pytest.raises(ValueError):
+        tf.TraceWriter(path)
+
+    # 簡略化の書き出しは現行形式へ変換する
+    out = str(tmp_path / "v2.agt")
+    path_simplify.simplify_trace(path, out)
+    with tf.TraceReader(out) as r:
+        assert r.version == tf.VERSION
+    assert _replayed(out) == ["b", "enter"]
@@ -0,0 +1,120 @@
+# text_input.py
+"""
+文字入力ブロックの送出。方式によって送出回数（=1回ごとの固定コスト）が大きく違う:
+    1文字ずつ: 1文字 = 1送出。間隔は「開始時刻 + i × 間隔」の絶対期限
+    一括入力  : write をまとめて呼ぶ（CHUNK 文字ごとに停止を確認）
+    貼り付け  : クリップボードへ入れて Ctrl/Cmd+V を1回（非 ASCII・長文向け。元の内容は戻す）
+    自動      : 非 ASCII を含む or PASTE_THRESHOLD 文字以上 → 貼り付け、それ以外 → 一括入力
+結果として方式・文字数・送出回数・所要時間・文字/秒を返す。
+"""
+import time
+
+try:
+    import pyperclip
+except Exception:
+    pyperclip = None
+
+from utils import sleep_until, IS_MAC
+
+TEXT_METHODS = ("自動", "1文字ずつ", "一括入力", "貼り付け")
+DEFAULT_METHOD = "自動"
+
+CHUNK = 64                  # 一括入力で1回の write に渡す文字数
+PASTE_THRESHOLD = 200       # 自動でこの文字数以上は貼り付け
+PASTE_SETTLE = 0.05         # 貼り付け先が読み取るまで元のクリップボードを戻さない
+PASTE_KEYS = ("command", "v") if IS_MAC else ("ctrl", "v")
+
+
+def typable(text: str) -> bool:
+    """キー送出で打てる文字だけか（pyautogui は非 ASCII を黙って捨てる）"""
+    return all(" " <= c <= "~" or c in "\n\t" for c in text)
+
+
+def resolve_method(text: str, method: str = DEFAULT_METHOD) -> str:
+    """自動 を実際の方式へ解決"""
+    if method != "自動":
+        return method
+    if not typable(text) or len(text) >= PASTE_THRESHOLD:
+        return "貼り付け"
+    return "一括入力"
+
+
+def type_text(text: str, method: str, stop, inj, interval: float = 0.0, clipboard=None) -> dict:
+    """
+    text を method で送出。
+    clipboard: (copy(text), paste() -> str) の差し替え（既定は pyperclip）
+    戻り値: {'method', 'chars', 'calls', 'elapsed', 'cps', 'cancelled'}
+    """
+    method = resolve_method(text, method)
+    if method != "貼り付け" and not typable(text):
+        print(f"※ {method} では入力できない文字を含みます（貼り付けを使ってください）")
+    sent = calls = 0
+    cancelled = False
+    restore = None
+    t0 = time.perf_counter()
+
+    if method == "1文字ずつ":
+        interval = max(0.0, float(interval))
+        for i, ch in enumerate(text):
+            if interval > 0 and i:
+                if sleep_until(t0 + i * interval, stop):
+                    cancelled = True
+                    break
+            elif stop():
+                cancelled = True
+                break
+            inj.write(ch)
+            sent += 1
+            calls += 1
+
+    elif method == "一括入力":
+        for i in range(0, len(text), CHUNK):
+            if stop():
+                cancelled = True
+                break
+            part = text[i:i + CHUNK]
+            inj.write(part)
+            sent += len(part)
+            calls += 1
+
+    elif method == "貼り付け":
+        copy, paste = clipboard or (
+            (pyperclip.copy, pyperclip.paste) if pyperclip is not None else (None, None))
+        if copy is None:
+            print("※ 貼り付け入力には pyperclip が必要です: pip install pyperclip")
+        elif stop():
+            cancelled = True
+        else:
+            try:
+                old = paste()
+            except Exception:
+                old = None      # テキスト以外（画像など）は戻さない
+            copy(text)
+            inj.hotkey(*PASTE_KEYS)
+            sent, calls = len(text), 1
+            if old is not None:
+                restore = lambda: copy(old)
+
+    else:
+        raise ValueError(f"不明な入力方式: {method}")
+
+    elapsed = time.perf_counter() - t0
+    if restore is not None:
+        # 元のクリップボードへ戻す（送出の所要時間には含めない）
+        time.sleep(PASTE_SETTLE)
+        restore()
+    return {
+        'method': method,
+        'chars': sent,
+        'calls': calls,
+        'elapsed': elapsed,
+        'cps': sent / elapsed if elapsed > 0 else float("inf"),
+        'cancelled': cancelled,
+    }
+
+
+def format_stats(st: dict) -> str:
+    cps = "∞" if st['cps'] == float("inf") else f"{st['cps']:.0f}"
+    return (f"{st['method']} {st['chars']}文字 / {st['calls']}回送出 / "
+            f"{st['elapsed']:.3f}s ({cps}文字/s)"
+            + (" 停止" if st['cancelled'] else ""))
@@ -0,0 +1,444 @@
+# trace_format.py
+"""
+入力イベント列のストリーミング記録形式（追記専用バイナリ）と mmap リーダ。
+長時間の記録でもメモリに全件載せずに書き出し・シーク・再生できる。
+
+ファイル構成（リトルエンディアン）:
+    ヘッダ   "<8sHHI"   magic "AGTRACE1", version, record_size, 予約
+    チャンク "<4sIdd"   magic "CHNK", 件数, 先頭時刻, 末尾時刻  + 固定長レコード × 件数
+    ...
+    索引     "<QI4xdd"  チャンクごとの (オフセット, 件数, 先頭時刻, 末尾時刻)
+    末尾     "<QI4s"    索引オフセット, チャンク数, magic "AGIX"
+
+レコード "<dBBxxiii": 時刻(秒), 種別, ボタン, x, y, コード
+キーのコードは version 2 から UI の KEY_LIST に依らない固定の表（1文字は Unicode の符号位置、
+名前付きキーは _NAMED_BASE + _NAMED_KEYS の添字）。version 1（KEY_LIST の添字）も読める。
+索引が無い（記録中に落ちた）ファイルはチャンク見出しを辿って復元する。
+"""
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+
+from utils import sleep_until
+
+MAGIC = b"AGTRACE1"
+VERSION = 2     # 1: キーのコードが KEY_LIST の添字
+
+_HEADER = struct.Struct("<8sHHI")
+_CHUNK = struct.Struct("<4sIdd")
+_RECORD = struct.Struct("<dBBxxiii")
+_INDEX = struct.Struct("<QI4xdd")
+_TRAILER = struct.Struct("<QI4s")
+_T = struct.Struct("<d")
+
+# 種別
+MOVE, DOWN, UP, KEY_DOWN, KEY_UP, SCROLL = 1, 2, 3, 4, 5, 6
+KIND_NAMES = {MOVE: "move", DOWN: "down", UP: "up", KEY_DOWN: "key_down", KEY_UP: "key_up", SCROLL: "scroll"}
+# ボタン
+LEFT, RIGHT, MIDDLE = 1, 2, 3
+_BUTTON_NAMES = {LEFT: "left", RIGHT: "right", MIDDLE: "middle"}
+
+DEFAULT_CHUNK = 4096    # 1チャンクのレコード数（= 書込みバッファの上限）
+
+
+# ==== キーのコード ====
+# version 1 を書いた時点の utils.KEY_LIST（旧ファイルの読込み専用。変更しない）
+_V1_KEYS = (
+    '\t', '\n', '\r', ' ', '!', '"', '#', '$', '%', '&', "'", '(',
+    ')', '*', '+', ',', '-', '.', '/', '0', '1', '2', '3', '4', '5', '6', '7',
+    '8', '9', ':', ';', '<', '=', '>', '?', '@', '[', '\\', ']', '^', '_', '`',
+    'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o',
+    'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z', '{', '|', '}', '~',
+    'accept', 'add', 'alt', 'altleft', 'altright', 'apps', 'backspace',
+    'browserback', 'browserfavorites', 'browserforward', 'browserhome',
+    'browserrefresh', 'browsersearch', 'browserstop', 'capslock', 'clear',
+    'convert', 'ctrl', 'ctrlleft', 'ctrlright', 'decimal', 'del', 'delete',
+    'divide', 'down', 'end', 'enter', 'esc', 'escape', 'execute', 'f1', 'f10',
+    'f11', 'f12', 'f13', 'f14', 'f15', 'f16', 'f17', 'f18', 'f19', 'f2', 'f20',
+    'f21', 'f22', 'f23', 'f24', 'f3', 'f4', 'f5', 'f6', 'f7', 'f8', 'f9',
+    'final', 'fn', 'hanguel', 'hangul', 'hanja', 'help', 'home', 'insert', 'junja',
+    'kana', 'kanji', 'launchapp1', 'launchapp2', 'launchmail',
+    'launchmediaselect', 'left', 'modechange', 'multiply', 'nexttrack',
+    'nonconvert', 'num0', 'num1', 'num2', 'num3', 'num4', 'num5', 'num6',
+    'num7', 'num8', 'num9', 'numlock', 'pagedown', 'pageup', 'pause', 'pgdn',
+    'pgup', 'playpause', 'prevtrack', 'print', 'printscreen', 'prntscrn',
+    'prtsc', 'prtscr', 'return', 'right', 'scrolllock', 'select', 'separator',
+    'shift', 'shiftleft', 'shiftright', 'sleep', 'space', 'stop', 'subtract', 'tab',
+    'up', 'volumedown', 'volumemute', 'volumeup', 'win', 'winleft', 'winright', 'yen',
+    'command', 'option', 'optionleft', 'optionright',
+)
+# 名前付きキーの固定表（version 2）。コードは添字なので、増やすときは末尾に足すだけにする
+_NAMED_KEYS = tuple(k for k in _V1_KEYS if len(k) > 1)
+_NAMED_BASE = 0x110000  # Unicode の範囲外から
+_NAMED_INDEX = {k: i for i, k in enumerate(_NAMED_KEYS)}
+
+
+def key_code(name: str) -> int:
+    """キー名 → コード（1文字は符号位置、名前付きキーは固定表。未知は -1）"""
+    if not name:
+        return -1
+    if len(name) == 1:
+        return ord(name)
+    i = _NAMED_INDEX.get(name)
+    return -1 if i is None else _NAMED_BASE + i
+
+
+def key_name(code: int, version: int = VERSION):
+    """コード → キー名（未知は None）。version はファイルの形式"""
+    if version == 1:
+        return _V1_KEYS[code] if 0 <= code < len(_V1_KEYS) else None
+    if 0 <= code < _NAMED_BASE:
+        return chr(code)
+    i = code - _NAMED_BASE
+    return _NAMED_KEYS[i] if 0 <= i < len(_NAMED_KEYS) else None
+
+
+def upgrade_code(kind: int, code: int, version: int) -> int:
+    """version の形式で書かれたコードを現行形式にする（キー以外はそのまま）"""
+    if version == VERSION or kind not in (KEY_DOWN, KEY_UP):
+        return code
+    return key_code(key_name(code, version))
+
+
+# ======================== 書込み ========================
+class TraceWriter:
+    """
+    バッファが chunk_records 件に達するたびにチャンクとして追記する。
+    close() で索引を書く。既存ファイルを開くと末尾の索引を外して追記を続ける。
+    時刻は単調（前回以上）でなければならない。追記では last_t（既存の末尾時刻）より後を書く。
+    キーのコードが違うので、古い形式のファイルには追記しない（ValueError）。
+    """
+    def __init__(self, path, chunk_records: int = DEFAULT_CHUNK):
+        self.path = path
+        self.chunk_records = max(1, int(chunk_records))
+        self._buf = []
+        self._index = []        # (offset, count, t_first, t_last)
+        self._lock = threading.Lock()
+        self.last_t = None      # 最後に書いた時刻（追記なら既存の末尾時刻）
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with TraceReader(path) as r:
+                if r.version != VERSION:
+                    raise ValueError(f"古い形式（version {r.version}）のトレースには追記できません: {path}")
+                self._index = list(r.chunks)
+                end = r.data_end
+            if self._index:
+                self.last_t = self._index[-1][3]
+            self._f = open(path, "r+b")
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            self._f = open(path, "wb")
+            self._f.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, 0))
+
+    def write(self, t: float, kind: int, x: int = 0, y: int = 0, code: int = 0, button: int = 0):
+        with self._lock:
+            if self.last_t is not None and t < self.last_t:
+                raise ValueError(f"時刻が前後しています: {t} < {self.last_t}")
+            self.last_t = t
+            self._buf.append((t, kind, button, x, y, code))
+            if len(self._buf) >= self.chunk_records:
+                self._flush_chunk()
+
+    def _flush_chunk(self):
+        if not self._buf:
+            return
+        buf, self._buf = self._buf, []
+        off = self._f.tell()
+        parts = [_CHUNK.pack(b"CHNK", len(buf), buf[0][0], buf[-1][0])]
+        parts.extend(_RECORD.pack(*r) for r in buf)
+        self._f.write(b"".join(parts))
+        self._f.flush()
+        self._index.append((off, len(buf), buf[0][0], buf[-1][0]))
+
+    def flush(self):
+        with self._lock:
+            self._flush_chunk()
+
+    def close(self):
+        with self._lock:
+            if self._f.closed:
+                return
+            self._flush_chunk()
+            idx_off = self._f.tell()
+            self._f.write(b"".join(_INDEX.pack(*c) for c in self._index))
+            self._f.write(_TRAILER.pack(idx_off, len(self._index), b"AGIX"))
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================== 読込み ========================
+class TraceReader:
+    """mmap で開き、全件を読み込まずに添字/時刻でアクセスする"""
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        if size < _HEADER.size:
+            self._f.close()
+            raise ValueError(f"トレースファイルではありません: {path}")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ver, rsize, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or rsize != _RECORD.size:
+            self.close()
+            raise ValueError(f"トレースファイルではありません: {path}")
+        if not 1 <= ver <= VERSION:
+            self.close()
+            raise ValueError(f"未対応のトレース形式です（version {ver}）: {path}")
+        self.version = ver
+        self.chunks, self.data_end = self._read_index(size)
+        # 累積件数（添字 → チャンクの二分探索用）
+        self._starts = []
+        n = 0
+        for (_, count, _, _) in self.chunks:
+            self._starts.append(n)
+            n += count
+        self._len = n
+        self._t_last = [c[3] for c in self.chunks]
+
+    def _read_index(self, size):
+        if size >= _HEADER.size + _TRAILER.size:
+            idx_off, n, magic = _TRAILER.unpack_from(self._mm, size - _TRAILER.size)
+            if magic == b"AGIX" and idx_off + n * _INDEX.size == size - _TRAILER.size:
+                chunks = [_INDEX.unpack_from(self._mm, idx_off + i * _INDEX.size) for i in range(n)]
+                return chunks, idx_off
+        # 索引なし：チャンク見出しを辿る（途中で切れたチャンクは捨てる）
+        chunks, off = [], _HEADER.size
+        while off + _CHUNK.size <= size:
+            magic, count, t0, t1 = _CHUNK.unpack_from(self._mm, off)
+            end = off + _CHUNK.size + count * _RECORD.size
+            if magic != b"CHNK" or end > size:
+                break
+            chunks.append((off, count, t0, t1))
+            off = end
+        return chunks, off
+
+    def __len__(self):
+        return self._len
+
+    def key_name(self, code: int):
+        """このファイルの形式でコードをキー名にする"""
+        return key_name(code, self.version)
+
+    @property
+    def duration(self) -> float:
+        if not self.chunks:
+            return 0.0
+        return self.chunks[-1][3] - self.chunks[0][2]
+
+    def _offset(self, i: int) -> int:
+        ci = bisect.bisect_right(self._starts, i) - 1
+        off, _, _, _ = self.chunks[ci]
+        return off + _CHUNK.size + (i - self._starts[ci]) * _RECORD.size
+
+    def record(self, i: int):
+        """i 番目のレコード (t, kind, button, x, y, code)"""
+        if not 0 <= i < self._len:
+            raise IndexError(i)
+        return _RECORD.unpack_from(self._mm, self._offset(i))
+
+    def seek(self, t: float) -> int:
+        """時刻 t 以降の最初のレコードの添字（O(log n)）"""
+        ci = bisect.bisect_left(self._t_last, t)
+        if ci >= len(self.chunks):
+            return self._len
+        off, count, _, _ = self.chunks[ci]
+        base = off + _CHUNK.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _T.unpack_from(self._mm, base + mid * _RECORD.size)[0] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self._starts[ci] + lo
+
+    def iter_from(self, index: int = 0):
+        """index 番目から順にレコードを返す（チャンク単位で mmap から直接読む）"""
+        if index >= self._len:
+            return
+        ci = bisect.bisect_right(self._starts, index) - 1
+        first = index - self._starts[ci]
+        for (off, count, _, _) in self.chunks[ci:]:
+            base = off + _CHUNK.size
+            for j in range(first, count):
+                yield _RECORD.unpack_from(self._mm, base + j * _RECORD.size)
+            first = 0
+
+    def close(self):
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ======================== 再生 ========================
+def replay(path, stop, backend, start: float = 0.0, speed: float = 1.0) -> dict:
+    """
+    トレースをファイルから逐次読みしながら再生する。
+    start: 開始位置（トレース先頭からの秒）, speed: 再生倍率
+    """
+    speed = max(0.01, float(speed))
+    sent = 0
+    late_max = 0.0
+    cancelled = False
+    with TraceReader(path) as r:
+        if not len(r):
+            return {"events": 0, "elapsed": 0.0, "late_max": 0.0, "cancelled": False}
+        t_base = r.record(0)[0] + start
+        t0 = time.perf_counter()
+        for (t, kind, button, x, y, code) in r.iter_from(r.seek(t_base)):
+            deadline = t0 + (t - t_base) / speed
+            if sleep_until(deadline, stop):
+                cancelled = True
+                break
+            late_max = max(late_max, time.perf_counter() - deadline)
+            _inject(backend, kind, button, x, y, code, r.version)
+            sent += 1
+    return {"events": sent, "elapsed": time.perf_counter() - t0, "late_max": late_max,
+            "cancelled": cancelled}
+
+
+def _inject(inj, kind, button, x, y, code, version=VERSION):
+    if kind == MOVE:
+        inj.moveTo(x, y, _pause=False)
+    elif kind == DOWN:
+        inj.mouseDown(x, y, button=_BUTTON_NAMES.get(button, "left"), _pause=False)
+    elif kind == UP:
+        inj.mouseUp(x, y, button=_BUTTON_NAMES.get(button, "left"), _pause=False)
+    elif kind == SCROLL:
+        inj.scroll(code, x, y, _pause=False)
+    elif kind in (KEY_DOWN, KEY_UP):
+        name = key_name(code, version)
+        if name:
+            (inj.keyDown if kind == KEY_DOWN else inj.keyUp)(name, _pause=False)
+
+
+# ======================== 記録 ========================
+# pynput のキー名 → pyautogui のキー名（違うものだけ）
+_PYNPUT_KEYS = {
+    'alt_l': 'altleft', 'alt_r': 'altright', 'alt_gr': 'altright',
+    'ctrl_l': 'ctrlleft', 'ctrl_r': 'ctrlright',
+    'shift_l': 'shiftleft', 'shift_r': 'shiftright',
+    'cmd': 'command', 'cmd_l': 'command', 'cmd_r': 'command',
+    'page_up': 'pageup', 'page_down': 'pagedown', 'caps_lock': 'capslock',
+    'num_lock': 'numlock', 'scroll_lock': 'scrolllock', 'print_screen': 'printscreen',
+    'media_play_pause': 'playpause', 'media_next': 'nexttrack', 'media_previous': 'prevtrack',
+    'media_volume_up': 'volumeup', 'media_volume_down': 'volumedown', 'media_volume_mute': 'volumemute',
+}
+
+
+class TraceRecorder:
+    """
+    pynput でマウス/キーボードを監視し、TraceWriter へ流し込む。
+    既存ファイルへの追記では、時刻を既存の末尾時刻の続きから数える（seek / replay が時刻順を前提にするため）
+    """
+    def __init__(self, path, chunk_records: int = DEFAULT_CHUNK):
+        self.writer = TraceWriter(path, chunk_records)
+        self._listeners = []
+        self._t0 = None
+        self._base = self.writer.last_t or 0.0
+        self._lock = threading.Lock()   # マウスとキーのリスナーで時刻の順と書込みの順を揃える
+
+    def _now(self) -> float:
+        return self._base + (time.perf_counter() - self._t0)
+
+    def _emit(self, kind, x=0, y=0, code=0, button=0):
+        with self._lock:
+            self.writer.write(self._now(), kind, x, y, code, button)
+
+    def _key(self, key) -> int:
+        name = getattr(key, "char", None)
+        if name is None:
+            name = getattr(key, "name", None) or ""
+            name = _PYNPUT_KEYS.get(name, name)
+        return key_code(name)
+
+    def start(self):
+        from pynput import mouse, keyboard
+        self._t0 = time.perf_counter()
+        emit = self._emit
+        buttons = {mouse.Button.left: LEFT, mouse.Button.right: RIGHT, mouse.Button.middle: MIDDLE}
+
+        def on_move(x, y):
+            emit(MOVE, int(x), int(y))
+
+        def on_click(x, y, button, pressed):
+            emit(DOWN if pressed else UP, int(x), int(y), button=buttons.get(button, LEFT))
+
+        def on_scroll(x, y, dx, dy):
+            emit(SCROLL, int(x), int(y), code=int(dy))
+
+        def on_press(key):
+            emit(KEY_DOWN, code=self._key(key))
+
+        def on_release(key):
+            emit(KEY_UP, code=self._key(key))
+
+        self._listeners = [
+            mouse.Listener(on_move=on_move, on_click=on_click, on_scroll=on_scroll),
+            keyboard.Listener(on_press=on_press, on_release=on_release),
+        ]
+        for li in self._listeners:
+            li.start()
+
+    def stop(self):
+        for li in self._listeners:
+            try:
+                li.stop()
+            except Exception:
+                pass
+        self._listeners = []
+        self.writer.close()
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="AuterGUI 入力トレース")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("record", help="記録（Ctrl+C で終了）"); p.add_argument("path")
+    p = sub.add_parser("info", help="概要表示"); p.add_argument("path")
+    p = sub.add_parser("replay", help="再生")
+    p.add_argument("path"); p.add_argument("--start", type=float, default=0.0)
+    p.add_argument("--speed", type=float, default=1.0)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "record":
+        rec = TraceRecorder(args.path)
+        rec.start()
+        print("<< 記録中（Ctrl+C で終了） >>")
+        try:
+            while True:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            rec.stop()
+    elif args.cmd == "info":
+        with TraceReader(args.path) as r:
+            counts = {}
+            for rec in r.iter_from(0):
+                name = KIND_NAMES.get(rec[1], str(rec[1]))
+                counts[name] = counts.get(name, 0) + 1
+            print(f"{len(r)} events, {len(r.chunks)} chunks, {r.duration:.3f}s", counts)
+    else:
+        import pyautogui as pag
+        print(replay(args.path, lambda: False, pag, args.start, args.speed))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,12 @@ import pyautogui as pag
 IS_WIN = platform.system() == "Windows"
 IS_MAC = platform.system() == "Darwin"
 
+# 送出ごとの自動待機（既定 0.1 秒）は使わない。間隔は scheduler / busy_wait 側で管理する
+pag.PAUSE = 0.0
+
+# sleep_until が停止を確認する間隔（停止の反応時間の上限）。実行専用プロセスでは短くする
+SLEEP_SLICE = 0.01
+
 # mac の ESC ポーリング用
 if IS_MAC:
     try:
@@ -62,18 +68,19 @@ def modifiers_still_down() -> bool:
                     (_user32.GetAsyncKeyState(VK_MENU)  & 0x8000))
     return False
 
-def flush_modifiers(timeout=1.5):
+def flush_modifiers(timeout=1.5, backend=None):
     """修飾キーが離れるのを待ち、最後に保険で keyUp を送る（対策）"""
+    inj = backend or pag
     t0 = time.time()
     while time.time() - t0 < timeout and modifiers_still_down():
         time.sleep(0.02)
     try:
-        pag.keyUp('shift')
+        inj.keyUp('shift')
     except Exception:
         pass
     for alt_name in ('option', 'alt'):
         try:
-            pag.keyUp(alt_name)
+            inj.keyUp(alt_name)
         except Exception:
             pass
 
@@ -97,4 +104,20 @@ def busy_wait(seconds: float, stop_flag_getter) -> bool:
         if IS_MAC and esc_pressed():
             return True
     return False
-    
\ No newline at end of file
+    
+def sleep_until(deadline: float, stop_flag_getter, spin: float = 0.001) -> bool:
+    """
+    perf_counter 基準の絶対時刻 deadline まで待機。
+    直前 spin 秒だけビジーウェイトし、それ以前は SLEEP_SLICE 秒ずつ sleep して停止を確認する。
+    戻り値: True=中断/停止, False=予定どおり完了
+    """
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return False
+        if stop_flag_getter():
+            return True
+        if IS_MAC and esc_pressed():
+            return True
+        if remaining > spin:
+            time.sleep(min(remaining - spin, SLEEP_SLICE))
@@ -0,0 +1,249 @@
+# wait_reactor.py
+"""
+条件待ち（ピクセル色 / ファイル出現 / クリップボード / 時間）の共有ポーリング。
+待ちごとにループを回すのではなく、1本のリアクタースレッドが登録中の待ちを
+プローブ種別ごとにまとめて処理する。
+- ピクセル：全ピクセル待ちを囲む範囲を1回だけスクリーンショット
+- ファイル：同じパスは1回だけ確認
+- クリップボード：1回だけ読む
+ポーリング間隔は変化があれば最短に戻し、変化がなければ徐々に伸ばす。
+"""
+import os
+import threading
+import time
+
+try:
+    import pyperclip
+except Exception:
+    pyperclip = None
+
+import metrics
+import utils
+from utils import esc_pressed, IS_MAC
+
+WAIT_KINDS = ("色一致", "色変化", "ファイル出現", "クリップボード一致", "時間経過")
+
+MIN_INTERVAL = 0.005
+MAX_INTERVAL = 0.1
+
+
+def parse_color(text: str):
+    """'#RRGGBB' → (r, g, b)"""
+    t = (text or "").strip().lstrip("#")
+    if len(t) != 6:
+        raise ValueError(f"色は #RRGGBB で指定してください: {text}")
+    return tuple(int(t[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _color_close(a, b, tol: int) -> bool:
+    return all(abs(int(p) - int(q)) <= tol for p, q in zip(a[:3], b[:3]))
+
+
+class _Wait:
+    __slots__ = ("kind", "cfg", "stop", "deadline", "done", "result", "initial")
+
+    def __init__(self, kind, cfg, stop, deadline):
+        self.kind = kind
+        self.cfg = cfg
+        self.stop = stop
+        self.deadline = deadline    # None = 無期限
+        self.done = threading.Event()
+        self.result = None          # True=成立, False=タイムアウト/停止
+        self.initial = None         # 色変化の基準色
+
+
+class WaitReactor:
+    def __init__(self, screenshot=None, clipboard=None,
+                 min_interval: float = MIN_INTERVAL, max_interval: float = MAX_INTERVAL):
+        self._screenshot = screenshot   # (left, top, w, h) -> 画像（getpixel を持つ）
+        self._clipboard = clipboard     # () -> str
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._waits = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last = {}                 # プローブ値（変化検出用）
+        self.ticks = 0
+
+    # ==== 登録 ====
+    def wait(self, kind: str, cfg: dict, stop, timeout: float = 0.0) -> bool:
+        """条件が成立したら True。timeout 秒（0 は無期限）経過・停止で False"""
+        w = self._new_wait(kind, cfg, stop, timeout)
+        with self._cond:
+            self._waits.append(w)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        # リアクターは変化が無いとき最長 max_interval 眠るので、停止は待つ側で
+        # SLEEP_SLICE ごとに見て、停止ならリアクターを起こして処理させる
+        while not w.done.wait(utils.SLEEP_SLICE):
+            if stop():
+                with self._cond:
+                    self._cond.notify()
+        return w.result
+
+    def _new_wait(self, kind, cfg, stop, timeout):
+        if kind not in WAIT_KINDS:
+            raise ValueError(f"不明な待ち条件: {kind}")
+        if kind == "時間経過":
+            deadline = time.perf_counter() + max(0.0, timeout)
+        else:
+            deadline = time.perf_counter() + timeout if timeout > 0 else None
+        return _Wait(kind, cfg, stop, deadline)
+
+    # ==== ループ ====
+    def _loop(self):
+        interval = self.min_interval
+        while True:
+            with self._cond:
+                if not self._waits:
+                    self._thread = None
+                    return
+                waits = list(self._waits)
+            changed = self._tick(waits)
+            self.ticks += 1
+            interval = self.min_interval if changed else min(self.max_interval, interval * 1.5)
+
+            with self._cond:
+                self._waits = [w for w in self._waits if not w.done.is_set()]
+                if not self._waits:
+                    continue
+                # 期限の近い待ちがあればそれまでに起きる
+                now = time.perf_counter()
+                sleep = interval
+                for w in self._waits:
+                    if w.deadline is not None:
+                        sleep = min(sleep, max(0.0, w.deadline - now))
+                self._cond.wait(timeout=sleep)
+
+    def _finish(self, w, result, outcome=None):
+        w.result = result
+        w.done.set()
+        metrics.inc(metrics.WAITS, (w.kind, outcome or ("ok" if result else "timeout")))
+
+    def _tick(self, waits) -> bool:
+        now = time.perf_counter()
+        esc = IS_MAC and esc_pressed()
+        live = []
+        for w in waits:
+            if esc or w.stop():
+                self._finish(w, False, "cancelled")
+            elif w.kind == "時間経過":
+                if now >= w.deadline:
+                    metrics.observe(metrics.WAIT_LATENESS, now - w.deadline, (w.kind,))
+                    self._finish(w, True)
+            elif w.deadline is not None and now >= w.deadline:
+                metrics.observe(metrics.WAIT_LATENESS, now - w.deadline, (w.kind,))
+                self._finish(w, False)
+            else:
+                live.append(w)
+
+        changed = False
+        pixels = [w for w in live if w.kind in ("色一致", "色変化")]
+        if pixels:
+            changed |= self._probe_pixels(pixels)
+        files = [w for w in live if w.kind == "ファイル出現"]
+        if files:
+            changed |= self._probe_files(files)
+        clips = [w for w in live if w.kind == "クリップボード一致"]
+        if clips:
+            changed |= self._probe_clipboard(clips)
+        return changed
+
+    # ==== プローブ ====
+    def _grab(self, region):
+        if self._screenshot:
+            return self._screenshot(region)
+        import pyautogui as pag
+        return pag.screenshot(region=region)
+
+    def _probe_pixels(self, waits) -> bool:
+        xs = [int(w.cfg.get('wait_x', 0)) for w in waits]
+        ys = [int(w.cfg.get('wait_y', 0)) for w in waits]
+        left, top = min(xs), min(ys)
+        region = (left, top, max(xs) - left + 1, max(ys) - top + 1)
+        try:
+            img = self._grab(region)
+        except Exception as e:
+            print("スクリーンショット失敗:", e)
+            return False
+        changed = False
+        for w, x, y in zip(waits, xs, ys):
+            px = img.getpixel((x - left, y - top))[:3]
+            key = ("pixel", x, y)
+            if self._last.get(key) != px:
+                changed = True
+                self._last[key] = px
+            tol = int(w.cfg.get('wait_tolerance', 0))
+            if w.kind == "色一致":
+                if _color_close(px, parse_color(w.cfg.get('wait_color', '#000000')), tol):
+                    self._finish(w, True)
+            else:
+                if w.initial is None:
+                    w.initial = px
+                elif not _color_close(px, w.initial, tol):
+                    self._finish(w, True)
+        return changed
+
+    def _probe_files(self, waits) -> bool:
+        seen = {}
+        changed = False
+        for w in waits:
+            path = os.path.expanduser(str(w.cfg.get('wait_path', '')))
+            if path not in seen:
+                seen[path] = bool(path) and os.path.exists(path)
+                key = ("file", path)
+                if self._last.get(key) != seen[path]:
+                    changed = True
+                    self._last[key] = seen[path]
+            if seen[path]:
+                self._finish(w, True)
+        return changed
+
+    def _probe_clipboard(self, waits) -> bool:
+        try:
+            if self._clipboard:
+                text = self._clipboard()
+            elif pyperclip is not None:
+                text = pyperclip.paste()
+            else:
+                print("※ クリップボード待ちには pyperclip が必要です: pip install pyperclip")
+                for w in waits:
+                    self._finish(w, False)
+                return False
+        except Exception as e:
+            print("クリップボード取得失敗:", e)
+            return False
+        changed = self._last.get("clipboard") != text
+        self._last["clipboard"] = text
+        for w in waits:
+            if text == str(w.cfg.get('wait_text', '')):
+                self._finish(w, True)
+        return changed
+
+
+class InlineReactor(WaitReactor):
+    """
+    待ちを呼び出し元のスレッドで処理する（スレッドを立てない）。
+    時刻を差し替えた往復チェック（export_script.verify）で、待ちの終わる時刻を決定的にする
+    """
+    def wait(self, kind: str, cfg: dict, stop, timeout: float = 0.0) -> bool:
+        w = self._new_wait(kind, cfg, stop, timeout)
+        while True:
+            self._tick([w])
+            if w.done.is_set():
+                return w.result
+            sleep = self.min_interval
+            if w.deadline is not None:
+                sleep = min(sleep, max(0.0, w.deadline - time.perf_counter()))
+            time.sleep(sleep)
+
+
+# プロセス内で共有するリアクター
+reactor = WaitReactor()
+
+
+def wait_for(cfg: dict, stop) -> bool:
+    """ブロック設定(cfg)の条件待ち。成立で True、タイムアウト/停止で False"""
+    return reactor.wait(cfg.get('wait_kind', "時間経過"), cfg, stop, float(cfg.get('wait_timeout', 0.0)))